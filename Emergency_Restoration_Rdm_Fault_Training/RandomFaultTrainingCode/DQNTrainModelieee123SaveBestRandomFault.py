@@ -44,12 +44,15 @@ class SaveOnBestTrainingRewardCallback(BaseCallback):
     :param check_freq: (int)
     :param log_dir: (str) Path to the folder where the model will be saved.
       It must contains the file created by the ``Monitor`` wrapper.
+    :param monitor: (EpisodeMonitor) in-memory episode statistics of the training env,
+      None re-reads the ``Monitor`` file at every check
     :param verbose: (int)
     """
-    def __init__(self, check_freq, log_dir, verbose=1):
+    def __init__(self, check_freq, log_dir, monitor=None, verbose=1):
         super(SaveOnBestTrainingRewardCallback, self).__init__(verbose)
         self.check_freq = check_freq
         self.log_dir = log_dir
+        self.monitor = monitor
         self.save_path = os.path.join(log_dir, 'best_model')
         self.best_mean_reward = -np.inf
 
@@ -62,7 +65,12 @@ class SaveOnBestTrainingRewardCallback(BaseCallback):
         if self.n_calls % self.check_freq == 0:
 
           # Retrieve training reward
-          x, y = ts2xy(load_results(self.log_dir), 'timesteps')
+          if self.monitor is not None:
+              # ring buffer of the last 100 episodes, x: timesteps at the last episode end
+              x = [self.monitor.stats.timesteps] if self.monitor.stats.episodes else []
+              y = self.monitor.stats.recent()[0]
+          else:
+              x, y = ts2xy(load_results(self.log_dir), 'timesteps')
           if len(x) > 0:
               # Mean training reward over the last 100 episodes
               mean_reward = np.mean(y[-100:])
@@ -81,6 +89,10 @@ class SaveOnBestTrainingRewardCallback(BaseCallback):
 
         return True
 
+    def _on_training_end(self) -> None:
+        if self.monitor is not None:
+            self.monitor.flush() # write the buffered episodes to monitor.csv
+
 
 
 
@@ -121,14 +133,26 @@ actionHuman=[[9],[7],[7],[9],[7],[7],[7],[7,10],[10],[10],[10],[7]]
 # rewardHuman=[3090.98, 3168.24,3070.79,3053.43,3086.45, 3066.03,3046.85, 3036.55, 3075.18, 3093.83, 2918.83]
 
 env = rlEnv(SwitchOpenNoList)
-env = Monitor(env, log_dir)
+# memoized topology outcomes, solve each (fault case, switch states) once (optionally pre-enumerated offline):
+# from IEEE123TransitionCache import TransitionCache
+# cache = TransitionCache() # or TransitionCache.load(os.path.join(log_dir, 'outcomes.npz'))
+# env = rlEnv(SwitchOpenNoList, cache=cache)
+# cache.precompute(env); cache.save(os.path.join(log_dir, 'outcomes.npz'))
+# env = rlEnv(SwitchOpenNoList, topology_check=True) # refuse loop closing actions, no Solve for no-op/dead area switching
+# env = Monitor(env, log_dir)
+# keep every transition as compressed shards (offline training, replay pre-filled from earlier runs):
+# from IEEE123TransitionRecorder import TransitionRecorder, fillReplayBuffer
+# recorder = env = TransitionRecorder(env, os.path.join(log_dir, 'transitions'))
+# episode returns/lengths kept in memory for the callback, monitor.csv appended every 100 episodes
+from IEEE123EpisodeMonitor import EpisodeMonitor
+env = EpisodeMonitor(env, log_dir)
 os.makedirs(log_dir, exist_ok=True)
 # env = MyMonitorWrapper(env)
 # env = DummyVecEnv([lambda: env])
 
 
 # Create Callback
-callback = SaveOnBestTrainingRewardCallback(check_freq=1000, log_dir=log_dir, verbose=1)
+callback = SaveOnBestTrainingRewardCallback(check_freq=1000, log_dir=log_dir, monitor=env, verbose=1)
 # callbackEveryStep = 
 # Create environment
 # env = rlEnv
@@ -140,8 +164,10 @@ MlpPolicy.net_arch = [64,64] #action duplicate and no optimal for all
 
 # Instantiate the agent #linear_schedule(0.0002)
 model = DQN(MlpPolicy, env, learning_rate=0.0001, buffer_size=20000, learning_starts=1, gamma=1.0, target_update_interval=1000,exploration_final_eps=0.05,verbose=1)
+# fillReplayBuffer(model.replay_buffer, os.path.join(log_dir, 'transitions')) # pre-fill replay with recorded transitions
 # Train the agent
 model.learn(total_timesteps=30000, callback=callback, log_interval=100)
+# recorder.writer.flush() # write the last (partial) shard of transitions
 
 
 # # Instantiate the agent Best settings for random fault case
@@ -159,7 +185,12 @@ model.learn(total_timesteps=30000, callback=callback, log_interval=100)
 # NOTE: If you use wrappers with your environment that modify rewards,
 #       this will be reflected here. To evaluate with original rewards,
 #       wrap environment in a "Monitor" wrapper before other wrappers.
-mean_reward, std_reward = evaluate_policy(model, model.get_env(), n_eval_episodes=1000)
+# mean_reward, std_reward = evaluate_policy(model, model.get_env(), n_eval_episodes=1000)
+# parallel evaluation: 4 worker envs, batched predict, fault cases round robin (stratified), per case results
+from IEEE123ParallelEval import evaluateParallel, caseTable
+eval_results = evaluateParallel(model, SwitchOpenNoList, n_eval_episodes=1000, n_workers=4)
+print(caseTable(eval_results))
+mean_reward, std_reward = eval_results['mean_reward'], eval_results['std_reward']
 print(f"mean_reward:{mean_reward:.2f} +/- {std_reward:.2f}")
 
 
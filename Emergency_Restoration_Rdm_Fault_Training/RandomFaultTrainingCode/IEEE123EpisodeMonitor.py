@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory episode statistics for training the IEEE123 random fault environment.
+SaveOnBestTrainingRewardCallback used to re-read the whole monitor.csv (load_results, pandas) every check_freq steps,
+a cost growing with the training length.  EpisodeMonitor keeps the statistics in memory instead:
+--> ring buffer of the last window episode returns + lengths, running best episode return, total steps/episodes
+--> callback checks read the buffer (constant cost however long training runs)
+--> monitor.csv (SB3 Monitor format, load_results/plot_results keep working) is appended in batches of
+    flush_every episodes and on flush()/close()
+
+    env = EpisodeMonitor(rlEnv(SwitchOpenNoList), log_dir)
+    callback = SaveOnBestTrainingRewardCallback(check_freq=1000, log_dir=log_dir, monitor=env)
+"""
+
+import json
+import os
+import time
+import numpy as np
+import gym
+
+
+class EpisodeStats:
+    def __init__(self, window=100):
+        """
+        :param window: number of recent episodes kept (mean reward of the last window episodes)
+        """
+        self.window = window
+        self.returns = np.zeros(window)
+        self.lengths = np.zeros(window, dtype=np.int64)
+        self.pos = 0  # ring buffer slot of the next episode
+        self.episodes = 0
+        self.timesteps = 0  # steps of the finished episodes
+        self.best_return = -np.inf
+
+    def add(self, episode_return, episode_length):
+        self.returns[self.pos] = episode_return
+        self.lengths[self.pos] = episode_length
+        self.pos = (self.pos + 1) % self.window
+        self.episodes += 1
+        self.timesteps += episode_length
+        self.best_return = max(self.best_return, episode_return)
+
+    def size(self):
+        return min(self.episodes, self.window)
+
+    def meanReturn(self):
+        """mean return of the last window episodes (nan before the first episode)"""
+        return float(np.mean(self.returns[:self.size()])) if self.episodes else np.nan
+
+    def meanLength(self):
+        return float(np.mean(self.lengths[:self.size()])) if self.episodes else np.nan
+
+    def recent(self):
+        """returns, lengths of the last window episodes, oldest first"""
+        order = (np.arange(self.size()) + (self.pos if self.episodes >= self.window else 0)) % self.window
+        return self.returns[order], self.lengths[order]
+
+
+class EpisodeMonitor(gym.Wrapper):
+    def __init__(self, env, log_dir=None, window=100, flush_every=100):
+        """
+        :param env: environment (gym step API: obs, reward, done, info)
+        :param log_dir: folder of monitor.csv (None: statistics in memory only)
+        :param window: episodes kept by the ring buffer
+        :param flush_every: episodes buffered before appending them to monitor.csv
+        """
+        super().__init__(env)
+        self.stats = EpisodeStats(window)
+        self.flush_every = flush_every
+        self.t_start = time.time()
+        self.rows = []  # finished episodes not yet written
+        self.path = None
+        if log_dir is not None:
+            os.makedirs(log_dir, exist_ok=True)
+            self.path = os.path.join(log_dir, 'monitor.csv')
+            with open(self.path, 'w') as f:
+                f.write('#' + json.dumps({'t_start': self.t_start, 'env_id': type(env.unwrapped).__name__}) + '\n')
+                f.write('r,l,t\n')
+        self.episode_return = 0.0
+        self.episode_length = 0
+
+    def reset(self, **kwargs):
+        self.episode_return = 0.0
+        self.episode_length = 0
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        ob, reward, done, info = self.env.step(action)
+        self.episode_return += reward
+        self.episode_length += 1
+        if done:
+            elapsed = round(time.time() - self.t_start, 6)
+            self.stats.add(self.episode_return, self.episode_length)
+            info['episode'] = {'r': round(self.episode_return, 6), 'l': self.episode_length, 't': elapsed}
+            if self.path is not None:
+                self.rows.append('%s,%d,%s\n' % (round(self.episode_return, 6), self.episode_length, elapsed))
+                if len(self.rows) >= self.flush_every:
+                    self.flush()
+        return ob, reward, done, info
+
+    def flush(self):
+        """append the buffered episodes to monitor.csv"""
+        if self.rows:
+            with open(self.path, 'a') as f:
+                f.writelines(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        return self.env.close()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Batched measurement layer for the IEEE123 restoration environment.
+Element positions inside the whole-circuit result arrays are resolved once after the circuit is compiled, so each
+step reads every quantity with a single OpenDSSDirect call instead of one SetActiveElement + Powers() per element:
+--> feeder head + switch line powers: dss.PDElements.AllPowers()
+--> node voltages: dss.Circuit.AllBusMagPu()
+--> load powers: AltDSS batch Load.Powers() (altdss, see requirements.txt)
+Rebuild the layer after every Compile/ClearAll (element order may change).
+"""
+
+import numpy as np
+import opendssdirect as dss
+
+
+def elementOffsets(sizes):
+    """start position of each element's block in a flattened whole-circuit array"""
+    sizes = np.asarray(sizes, dtype=np.int64)
+    return np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+
+def powerSliceIndex(starts, lengths, picks=(0, 2, 4)):
+    """
+    index matrix + mask reproducing Powers()[0:5:2] (real power of first 3 values) for every element block
+    :param starts: block start of each element in the flat [P1, Q1, P2, Q2, ...] array
+    :param lengths: block length (2 x conductors x terminals)
+    :return: idx (elements x picks), mask (elements x picks)
+    """
+    picks = np.asarray(picks, dtype=np.int64)
+    mask = picks[None, :] < np.asarray(lengths)[:, None]
+    idx = np.where(mask, np.asarray(starts)[:, None] + picks[None, :], 0)
+    return idx, mask
+
+
+class MeasurementLayer:
+    def __init__(self, feeder_name, switch_names):
+        """
+        resolve feeder head + switch positions in PDElements.AllPowers() and load positions in Load.Powers()
+        :param feeder_name: full name of feeder head branch i.e. 'Line.L115'
+        :param switch_names: full names of switch lines in observation order i.e. ['Line.Sw1', ..., 'Line.L105']
+        """
+        pd_names = [name.lower() for name in dss.PDElements.AllNames()]
+        pd_sizes = 2 * np.asarray(dss.PDElements.AllNumConductors()) * np.asarray(dss.PDElements.AllNumTerminals())
+        pd_starts = elementOffsets(pd_sizes)
+        feeder = pd_names.index(feeder_name.lower())
+        switches = [pd_names.index(name.lower()) for name in switch_names]
+        self.feeder_idx, self.feeder_mask = powerSliceIndex(pd_starts[[feeder]], pd_sizes[[feeder]])
+        self.feeder_idx = self.feeder_idx[0][self.feeder_mask[0]]
+        self.switch_idx, self.switch_mask = powerSliceIndex(pd_starts[switches], pd_sizes[switches])
+
+        # loads: first conductor (phase) of each load, as read by Powers()[0:2]
+        self.alt = dss.to_altdss()
+        load_sizes = np.asarray(self.alt.Load.NumConductors()) * np.asarray(self.alt.Load.NumTerminals())
+        self.load_idx = elementOffsets(load_sizes)
+        self.num_loads = len(self.load_idx)
+
+    def branchPowers(self):
+        """feeder head phase powers P (kW) + switch line powers |sum P| (kW) from one AllPowers call"""
+        allpowers = np.asarray(dss.PDElements.AllPowers())
+        feeder = allpowers[self.feeder_idx]
+        switches = np.abs(np.where(self.switch_mask, allpowers[self.switch_idx], 0.0).sum(axis=1))
+        return feeder, switches
+
+    def nodeVoltages(self):
+        """per-unit voltage magnitude of all nodes"""
+        return np.asarray(dss.Circuit.AllBusMagPu())
+
+    def voltageRange(self, threshold=0.1):
+        """lowest + highest energized node voltage (pu), de-energized nodes below threshold are filtered"""
+        vmag = self.nodeVoltages()
+        vmag = vmag[vmag > threshold]
+        return vmag.min(), vmag.max()
+
+    def loadPowers(self):
+        """first phase P, Q (kW, kvar) of every load, (num_loads x 2)"""
+        powers = np.asarray(self.alt.Load.Powers())[self.load_idx]
+        return np.column_stack((powers.real, powers.imag))
+
+    def totalLoad(self):
+        """total served load P (kW)"""
+        return np.asarray(self.alt.Load.Powers())[self.load_idx].real.sum()
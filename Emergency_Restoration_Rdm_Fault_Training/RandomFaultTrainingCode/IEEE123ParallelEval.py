@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel policy evaluation for the IEEE123 random fault environment (replaces SB3 evaluate_policy on one rlEnv).
+Episodes run on n_workers rlEnv copies, each in its own worker process and OpenDSS engine (dss_async_pool.AsyncEnvPool):
+--> policy inference is batched: one model.predict() per round on the observations of every running episode
+--> stratified: fault cases are assigned round robin over SwitchOpenNoList (n_eval_episodes / 12 episodes per case),
+    or drawn at random per episode as in training (stratified=False)
+--> reports mean/std episode reward (as evaluate_policy) and per fault case the mean/std episode reward and the final
+    step reward = served load normalized by rewardHuman (1.0 = load restored by the human switching sequence)
+
+    from IEEE123ParallelEval import evaluateParallel, caseTable
+    results = evaluateParallel(model, SwitchOpenNoList, n_eval_episodes=1000, n_workers=4)
+    print(caseTable(results))
+
+Worker processes are forked where available (training scripts without a __main__ guard would be re-run by spawn).
+"""
+
+import asyncio
+import multiprocessing as mp
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # repo root shared modules
+from dss_async_pool import AsyncEnvPool
+from IEEE123nodeRandomFaultSWpwrsENV0912 import rlEnv
+
+
+def caseSchedule(num_cases, n_eval_episodes, stratified=True):
+    """fault case No. of every episode, round robin over the cases (None: random case drawn by the env)"""
+    if not stratified:
+        return [None] * n_eval_episodes
+    return [k % num_cases for k in range(n_eval_episodes)]
+
+
+def caseStats(SwitchOpenNoList, episode_cases, episode_rewards, final_rewards):
+    """per fault case: episodes, mean/std episode reward, mean final step reward (normalized served load)"""
+    episode_cases = np.asarray(episode_cases)
+    stats = {}
+    for case, switches in enumerate(SwitchOpenNoList):
+        mask = episode_cases == case
+        if not mask.any():
+            continue
+        stats[case] = {'switches_open': list(switches), 'episodes': int(mask.sum()),
+                       'mean_reward': float(np.mean(episode_rewards[mask])),
+                       'std_reward': float(np.std(episode_rewards[mask])),
+                       'final_reward': float(np.mean(final_rewards[mask]))}
+    return stats
+
+
+async def evaluateAsync(model, SwitchOpenNoList, n_eval_episodes=1000, n_workers=4, deterministic=True,
+                        stratified=True, seed=0, env_kwargs=None, start_method=None):
+    """
+    evaluate model on n_eval_episodes rlEnv episodes spread over n_workers worker processes
+    :param model: SB3 model (or any object with predict(observations, deterministic=...))
+    :param SwitchOpenNoList: fault cases (switches opened to isolate each fault)
+    :param deterministic: deterministic actions (as evaluate_policy)
+    :param stratified: round robin fault cases, else random cases drawn by the workers
+    :param seed: base seed of the workers (random fault cases)
+    :param env_kwargs: more rlEnv keyword arguments (i.e. cache, topology_check, case_path)
+    :param start_method: multiprocessing start method, default fork (spawn where not available)
+    :return: dict of mean_reward, std_reward, episode_rewards, episode_lengths, episode_cases, cases (caseStats)
+    """
+    if start_method is None:
+        start_method = 'fork' if 'fork' in mp.get_all_start_methods() else 'spawn'
+    schedule = caseSchedule(len(SwitchOpenNoList), n_eval_episodes, stratified)
+    env_kwargs = dict(env_kwargs or {}, SwitchOpenNoList=SwitchOpenNoList)
+    n_workers = max(min(n_workers, n_eval_episodes), 1)
+    episode_rewards, episode_lengths, episode_cases, final_rewards = [], [], [], []
+    obs, returns, lengths, cases = {}, {}, {}, {}
+    started = 0
+
+    async with AsyncEnvPool(rlEnv, n_workers, seeds=seed, env_kwargs=env_kwargs, start_method=start_method) as pool:
+        async def begin(env_id, episode):
+            await pool.call(env_id, 'setFaultCase', schedule[episode])
+            obs[env_id] = await pool.reset(env_id)
+            returns[env_id], lengths[env_id] = 0.0, 0
+
+        active = list(range(min(n_workers, n_eval_episodes)))
+        await asyncio.gather(*[begin(env_id, env_id) for env_id in active])
+        started = len(active)
+        while active:
+            actions, _ = model.predict(np.stack([obs[env_id] for env_id in active]), deterministic=deterministic)
+            results = await pool.stepMany(active, [int(action) for action in np.ravel(actions)])
+            finished = []
+            for env_id, (ob, reward, done, info) in zip(active, results):
+                obs[env_id] = ob
+                returns[env_id] += reward
+                lengths[env_id] += 1
+                cases[env_id] = info['SW Status'][0]
+                if done:
+                    episode_rewards.append(returns[env_id])
+                    episode_lengths.append(lengths[env_id])
+                    episode_cases.append(cases[env_id])
+                    final_rewards.append(reward)
+                    finished.append(env_id)
+            restart = []
+            for env_id in finished:
+                if started < n_eval_episodes:
+                    restart.append((env_id, started))
+                    started += 1
+            active = [env_id for env_id in active if env_id not in finished] + [env_id for env_id, _ in restart]
+            await asyncio.gather(*[begin(env_id, episode) for env_id, episode in restart])
+
+    episode_rewards = np.asarray(episode_rewards)
+    return {'mean_reward': float(np.mean(episode_rewards)), 'std_reward': float(np.std(episode_rewards)),
+            'episode_rewards': episode_rewards, 'episode_lengths': np.asarray(episode_lengths),
+            'episode_cases': np.asarray(episode_cases),
+            'cases': caseStats(SwitchOpenNoList, episode_cases, episode_rewards, np.asarray(final_rewards))}
+
+
+def evaluateParallel(model, SwitchOpenNoList, **kwargs):
+    """blocking evaluateAsync() (runs its own event loop), same arguments"""
+    return asyncio.run(evaluateAsync(model, SwitchOpenNoList, **kwargs))
+
+
+def caseTable(results):
+    lines = ['%-5s %-12s %8s %12s %12s %12s' % ('case', 'switches', 'episodes', 'mean reward', 'std reward',
+                                                'final/human')]
+    for case, s in results['cases'].items():
+        lines.append('%-5d %-12s %8d %12.3f %12.3f %12.3f' % (case, s['switches_open'], s['episodes'], s['mean_reward'],
+                                                              s['std_reward'], s['final_reward']))
+    return '\n'.join(lines)
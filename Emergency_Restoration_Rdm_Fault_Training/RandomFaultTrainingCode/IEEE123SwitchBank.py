@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Switch bank of the IEEE123 restoration case: SwtControl state batch read and index writes without name lookups.
+Positions of the switches in the SwtControl collection and their switched line terminals are resolved once after the
+circuit is compiled:
+--> states(): all switch states (1 open, 2 closed) from one AltDSS batch read of SwtControl.State
+--> setActions(): queue open/close actions on switches with per-switch index writes (Idx activation, no name lookup),
+    executed by the next Solve like SwtControl.<name>.Action=...
+--> operate(): put switches in a state without a solve, per-switch index writes (SwtControl state + switched terminal
+    opened/closed)
+Switches are numbered as SWnum (switch k = switch_names[k-1], 0 is the no action switch).
+Rebuild the bank after every Compile/ClearAll (like MeasurementLayer).
+"""
+
+import numpy as np
+import opendssdirect as dss
+
+
+class SwitchBank:
+    def __init__(self, switch_names):
+        """
+        :param switch_names: SwtControl names of switches 1, 2, ... i.e. ['Sw1', ..., 'Sw23']
+        """
+        names = [name.lower() for name in dss.SwtControls.AllNames()]
+        self.num_switches = len(switch_names)
+        self.idx = np.array([0] + [names.index(name.lower()) for name in switch_names])  # position of switch k
+        self.alt = dss.to_altdss()
+        self.switched = [None]  # (switched object, terminal) of switch k
+        for k in range(1, self.num_switches + 1):
+            self.activate(k)
+            self.switched.append((dss.SwtControls.SwitchedObj(), dss.SwtControls.SwitchedTerm()))
+
+    def activate(self, k):
+        """make switch k the active SwtControl"""
+        dss.SwtControls.Idx(int(self.idx[k]) + 1)
+
+    def states(self, out=None):
+        """state of every switch, (num_switches + 1) vector with out[k] of switch k (out[0] unchanged or 0)"""
+        if out is None:
+            out = np.zeros(self.num_switches + 1)
+        out[1:] = np.asarray(self.alt.SwtControl.State)[self.idx[1:]]
+        return out
+
+    def delays(self):
+        return np.asarray(self.alt.SwtControl.Delay)[self.idx[1:]]
+
+    def setActions(self, switches, actions, delay=0):
+        """
+        queue actions on switches (one index write per switch), executed by the next Solve
+        :param switches: switch numbers
+        :param actions: action of every switch or one action for all (1 open, 2 close)
+        :param delay: action delay (s) of every switch or one delay for all, None keeps the present delays
+        """
+        actions = np.broadcast_to(actions, np.shape(switches))
+        delays = np.broadcast_to(np.nan if delay is None else delay, np.shape(switches))
+        for k, action, delay in zip(switches, actions, delays):
+            self.activate(k)
+            dss.SwtControls.Action(int(action))
+            if not np.isnan(delay):
+                dss.SwtControls.Delay(float(delay))
+
+    def operate(self, switches, states):
+        """
+        put switches in states (1 open, 2 closed) without a solve, per switch: index write of the state, switched
+        terminal opened/closed directly
+        """
+        states = np.broadcast_to(states, np.shape(switches))
+        for k, state in zip(switches, states):
+            self.activate(k)
+            dss.SwtControls.State(int(state))
+            # SwtControl state does not operate the line, open/close the switched terminal directly
+            obj, term = self.switched[k]
+            dss.Circuit.SetActiveElement(obj)
+            if state == 1:
+                dss.CktElement.Open(term, 0)
+            else:
+                dss.CktElement.Close(term, 0)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Topology index of the IEEE123 restoration case for switching decisions without a power flow.
+Nodes (bus phases) joined by non-switch PD elements (lines, transformers, regulators) are merged once into zones, so a
+switch state is a graph of a few zones with the 23 switches as the only edges:
+--> energized zones/buses: zones galvanically connected to the source nodes through closed switches (dead phases may
+    still show a small coupled voltage in the power flow)
+--> loops: closed switches joining zones that are already connected, a radial feeder has none
+--> islands: de-energized zones/groups of zones
+--> load bound: first-phase load (kW) of the energized zones at the highest voltage, an upper bound of LoadsMeasure()
+Rebuild the index after every Compile/ClearAll (like MeasurementLayer).
+"""
+
+import numpy as np
+import opendssdirect as dss
+
+load_exponent = {1: 0, 2: 2, 5: 1}  # load model -> voltage exponent of P (constant PQ, Z, I)
+
+
+def busName(bus):
+    """bus name without node numbers, i.e. '150r.1.2.3' -> '150r'"""
+    return bus.split('.')[0].lower()
+
+
+def elementNodes(node_idx):
+    """node index of every conductor of the active circuit element, (terminals x conductors), -1 for ground"""
+    terminals = dss.CktElement.NumTerminals()
+    conductors = dss.CktElement.NumConductors()
+    buses = [busName(bus) for bus in dss.CktElement.BusNames()]
+    order = np.reshape(dss.CktElement.NodeOrder(), (terminals, conductors))
+    return np.array([[node_idx.get((bus, node), -1) for node in nodes] for bus, nodes in zip(buses, order)])
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        """merge the sets of i and j, False if they were already joined (the edge closes a loop)"""
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return False
+        self.parent[rj] = ri
+        return True
+
+
+class TopologyIndex:
+    def __init__(self, switch_names, vmax=1.1):
+        """
+        merge nodes connected by non-switch PD elements into zones, index switch ends + load bound by zone
+        :param switch_names: full names of switch lines in SWnum order (switch 1 first) i.e. ['Line.Sw1', ..., 'Line.L105']
+        :param vmax: highest expected load voltage (pu) for the load bound of voltage dependent loads
+        """
+        node_names = dss.Circuit.AllNodeNames()
+        node_idx = {(busName(node), int(node.split('.')[1])): i for i, node in enumerate(node_names)}
+        self.bus_names = [busName(bus) for bus in dss.Circuit.AllBusNames()]
+        bus_pos = {bus: i for i, bus in enumerate(self.bus_names)}
+        self.node_bus = np.array([bus_pos[busName(node)] for node in node_names])
+        switch_pos = {name.lower(): k for k, name in enumerate(switch_names)}
+        switch_ends = [[] for _ in switch_names]  # (node, node) pairs of every switch phase
+        nodes = UnionFind(len(node_names))
+        i = dss.PDElements.First()
+        while i:
+            ends = elementNodes(node_idx)
+            name = dss.PDElements.Name().lower()
+            for phase in ends.T:  # conductors of single terminal elements (capacitors) have no edge
+                for end in phase[1:]:
+                    if phase[0] < 0 or end < 0:
+                        continue
+                    if name in switch_pos:
+                        switch_ends[switch_pos[name]].append((phase[0], end))
+                    else:
+                        nodes.union(phase[0], end)
+            i = dss.PDElements.Next()
+
+        roots = [nodes.find(n) for n in range(len(node_names))]
+        zone_of_root = {root: z for z, root in enumerate(sorted(set(roots)))}
+        self.node_zone = np.array([zone_of_root[root] for root in roots])
+        self.num_zones = len(zone_of_root)
+        self.switch_zones = [[(self.node_zone[a], self.node_zone[b]) for a, b in ends] for ends in switch_ends]
+        dss.Vsources.First()
+        self.source_zones = np.unique(elementNodes(node_idx)[0])
+        self.source_zones = self.node_zone[self.source_zones[self.source_zones >= 0]]
+
+        # first-phase load of each zone at vmax, LoadsMeasure() reads the first phase of every load
+        self.zone_load = np.zeros(self.num_zones)
+        i = dss.Loads.First()
+        while i:
+            zone = self.node_zone[elementNodes(node_idx)[0, 0]]
+            exponent = load_exponent.get(dss.Loads.Model(), 2)  # other models treated as constant Z
+            self.zone_load[zone] += dss.Loads.kW() / dss.CktElement.NumPhases() * vmax**exponent
+            i = dss.Loads.Next()
+        self.memo = {}  # closed switch mask -> evaluate() result
+
+    def evaluate(self, SWstates):
+        """
+        topology of a switch state vector (1 closed, 0 open, index 0 is the no action switch)
+        :return: dict with 'energized' zone mask, 'loops', 'islands' and 'load_bound' (kW)
+        """
+        closed = np.asarray(SWstates[1:]) == 1
+        key = closed.tobytes()
+        if key in self.memo:
+            return self.memo[key]
+        zones = UnionFind(self.num_zones)
+        loops = 0
+        for k in np.flatnonzero(closed):
+            joined = [zones.union(a, b) for a, b in self.switch_zones[k]]
+            loops += not all(joined)  # count switches closing a loop, not phases
+        roots = np.array([zones.find(z) for z in range(self.num_zones)])
+        energized = np.isin(roots, roots[self.source_zones])
+        topo = {'energized': energized, 'loops': loops, 'islands': len(set(roots[~energized])),
+                'load_bound': self.zone_load[energized].sum()}
+        self.memo[key] = topo
+        return topo
+
+    def energizedBuses(self, SWstates):
+        """names of buses with at least one energized node"""
+        energized = self.evaluate(SWstates)['energized'][self.node_zone]
+        return [self.bus_names[b] for b in np.unique(self.node_bus[energized])]
+
+    def closesLoop(self, SWstates, k):
+        """True if closing open switch k joins two zones that are already connected"""
+        if SWstates[k] == 1:
+            return False
+        closed = np.array(SWstates, copy=True)
+        closed[k] = 1
+        return self.evaluate(closed)['loops'] > self.evaluate(SWstates)['loops']
+
+    def isDeadToggle(self, SWstates, k):
+        """True if toggling switch k changes no energized zone and switch k stays de-energized on both sides"""
+        toggled = np.array(SWstates, copy=True)
+        toggled[k] = 1 - toggled[k]
+        before, after = self.evaluate(SWstates)['energized'], self.evaluate(toggled)['energized']
+        ends = [zone for phase in self.switch_zones[k-1] for zone in phase]
+        return np.array_equal(before, after) and not before[ends].any()
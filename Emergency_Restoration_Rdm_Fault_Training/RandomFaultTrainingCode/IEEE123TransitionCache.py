@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Memoized restoration outcomes for the IEEE123 random fault environment.
+With 12 fault cases and 23 switches the environment only ever visits a few thousand distinct topologies, so each
+(fault case, switch states) pair is solved once and its observation vector + served load (LoadsMeasure) are reused:
+--> key: fault case No. + switch states packed into a 24 bit integer (bit k = switch k closed)
+--> online: rlEnv(SwitchOpenNoList, cache=TransitionCache()) solves on a cache miss only
+--> offline: cache.precompute(env) enumerates every topology reachable within maxStep switch actions
+--> cache.save(path) / TransitionCache.load(path) reuse a table across training runs
+"""
+
+import numpy as np
+
+switch_bits = np.left_shift(1, np.arange(24, dtype=np.int64))  # SWstates[0] (no action) is always 0
+
+
+def topologyKey(case_no, SWstates):
+    """(fault case No., 24 bit switch state integer)"""
+    return int(case_no), int(np.asarray(SWstates, dtype=np.int64) @ switch_bits)
+
+
+def keyStates(bits):
+    """unpack a 24 bit switch state integer to the SWstates vector (1 closed, 0 open)"""
+    return ((int(bits) & switch_bits) > 0).astype(np.float64)
+
+
+class TransitionCache:
+    def __init__(self):
+        self.table = {}  # (case No., switch bits) -> (observation, total served load)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.table)
+
+    def get(self, key):
+        """cached (observation, total load) or None"""
+        outcome = self.table.get(key)
+        if outcome is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return outcome
+
+    def put(self, key, ob, total_load):
+        self.table[key] = (np.array(ob, dtype=np.float32), float(total_load))
+
+    def precompute(self, env, depth=None, cases=None):
+        """
+        offline mode: solve every topology reachable from the post-fault switch states of each fault case within depth
+        switch actions (default env.maxStep), breadth-first so each topology is solved once
+        ** leaves the circuit in the last enumerated topology, reset() the environment afterwards **
+        :param env: rlEnv instance (compiled on first use)
+        :param depth: number of switch actions after the fault is isolated
+        :param cases: fault case Nos. to enumerate, default all cases of env.SwitchOpenNoList
+        :return: number of newly solved topologies
+        """
+        if not env.compiled:
+            env.reset()
+        depth = env.maxStep if depth is None else depth
+        cases = range(len(env.SwitchOpenNoList)) if cases is None else cases
+        added = 0
+        for case_no in cases:
+            fault_switches = env.SwitchOpenNoList[case_no]
+            actions = [k for k in env.SWnum[1:] if k not in fault_switches]
+            states = env.initialSwitchStates()
+            states[fault_switches] = 0
+            frontier = [topologyKey(case_no, states)]
+            visited = set(frontier)
+            for level in range(depth + 1):
+                next_frontier = []
+                for key in frontier:
+                    if key not in self.table:
+                        env.SWstates = keyStates(key[1])
+                        ob, total_load = env.solveOutcome()
+                        self.put(key, ob, total_load)
+                        added += 1
+                    if level == depth:
+                        continue
+                    for k in actions:
+                        child = (case_no, key[1] ^ int(switch_bits[k]))
+                        if child not in visited:
+                            visited.add(child)
+                            next_frontier.append(child)
+                frontier = next_frontier
+        return added
+
+    def save(self, path):
+        """store the table as a .npz file"""
+        keys = np.array(list(self.table.keys()), dtype=np.int64).reshape(-1, 2)
+        obs = np.array([ob for ob, _ in self.table.values()], dtype=np.float32)
+        loads = np.array([total for _, total in self.table.values()], dtype=np.float64)
+        np.savez(path, keys=keys, obs=obs, loads=loads)
+
+    @classmethod
+    def load(cls, path):
+        """table stored with save()"""
+        cache = cls()
+        with np.load(path) as data:
+            for (case_no, bits), ob, total_load in zip(data['keys'], data['obs'], data['loads']):
+                cache.table[(int(case_no), int(bits))] = (ob, float(total_load))
+        return cache
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Transition recorder of the IEEE123 random fault environment (gym step API: obs, reward, done, info).
+Every switching transition of training is kept as compressed shards of the repo root dss_recorder.py (same columns and
+loaders as the gymnasium environments), so that the DQN replay buffer can be pre-filled from earlier runs:
+
+    env = TransitionRecorder(rlEnv(SwitchOpenNoList), os.path.join(log_dir, 'transitions'))
+    ...
+    fillReplayBuffer(model.replay_buffer, os.path.join(log_dir, 'transitions'))
+"""
+
+import os
+import sys
+import numpy as np
+import gym
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # repo root shared modules
+from dss_recorder import TransitionWriter, fillReplayBuffer, loadTransitions
+
+
+class TransitionRecorder(gym.Wrapper):
+    def __init__(self, env, path, shard_size=10000, info_keys=None):
+        """
+        :param env: environment (gym step API: obs, reward, done, info)
+        :param path: folder of the shards
+        :param shard_size: transitions per shard = size of the write buffer
+        :param info_keys: info values recorded as info_<key> columns, None: the numeric values of the first step info
+        """
+        super().__init__(env)
+        self.writer = TransitionWriter(path, shard_size, info_keys)
+        self.last_obs = None
+
+    def reset(self, **kwargs):
+        obs = self.env.reset(**kwargs)
+        self.last_obs = np.array(obs)
+        return obs
+
+    def step(self, action):
+        obs, reward, done, info = self.env.step(action)
+        truncated = bool(info.get('TimeLimit.truncated', False))
+        self.writer.add(self.last_obs, action, reward, obs, done and not truncated, truncated, info)
+        self.last_obs = np.array(obs)
+        return obs, reward, done, info
+
+    def close(self):
+        self.writer.flush()
+        return self.env.close()
@@ -21,6 +21,10 @@ Created on Thu Jun 10 10:56:40 2021
 
 import opendssdirect as dss 
 from opendssdirect.utils import run_command
+from IEEE123Measurements import MeasurementLayer
+from IEEE123TransitionCache import topologyKey
+from IEEE123Topology import TopologyIndex
+from IEEE123SwitchBank import SwitchBank
 # import win32com.client
 import numpy as np
 from random import randint
@@ -41,9 +45,17 @@ actionHuman=[[9],[7],[7],[9],[7],[7],[7],[7,10],[10],[10],[10],[7]]
 # the Env class to be used for Gym-like packages
 class rlEnv(gym.Env):
     # initialize training environment
-    def __init__(self, SwitchOpenNoList):
+    def __init__(self, SwitchOpenNoList, recompile=False, cache=None, topology_check=False, case_path=None,
+                 copy_obs=True):
         "SwtichOpenNo is a list  of switches to open due to fault"
+        "recompile=True compiles the case on every reset(), otherwise the compiled circuit is restored"
+        "cache=TransitionCache() reuses the outcome of every (fault case, switch states) already solved"
+        "topology_check=True refuses loop closing actions and skips the Solve of actions that change no energized area"
+        "case_path overrides the input DSS case below (i.e. the bundled IEEE123MasterMultiSW.dss)"
+        "copy_obs=False returns the observation buffer itself (overwritten by the next step) instead of a copy"
         self.case_path = r'/home/IEEE123/IEEE123MasterMultiSW.dss' # Input DSS case, Change to your local folder path
+        if case_path is not None:
+            self.case_path = case_path
         # initialize OpenDSS
         # self.dssObj = win32com.client.Dispatch("OpenDSSEngine.DSS")
         # self.dssText = self.dssObj.Text
@@ -68,18 +80,37 @@ class rlEnv(gym.Env):
         self.actNum = 23 + 1               # 1~23 switches on/off changes 0 means no switch action
         self.svNum = 5 + self.actNum + 23              # Observation states number P for three phases
         self.SWnum = np.array(range(23+1)) # Switch No from 0 to 23, switch 0 is for no action
-        self.SWstates = np.concatenate((np.zeros(1),np.ones(6),np.zeros(4),np.ones(13))) #Initial status
+        self.SWstates = self.initialSwitchStates() #Initial status
         self.SWnamesAdd = ["L13","L19","L24","L36","L45","L53","L67","L68","L77","L88","L92","L101","L105"]
         self.SWstatesRd = np.zeros(self.actNum)
         self.done = bool(0)
         self.Reward = 0
-        self.state = np.zeros(self.svNum)#RingBuffer(capacity=self.svNum-1, dtype=np.float64)
+        # observation buffer, float32 as observation_space, filled in place every step:
+        # [0:3] feeder head P, [3:5] lowest/highest node voltage, [5:28] switch flows, [28:52] switch states (0 unused)
+        self.obs = np.zeros(self.svNum, dtype=np.float32)
+        self.obs_feeder = self.obs[0:3]
+        self.obs_voltage = self.obs[3:5]
+        self.obs_flows = self.obs[5:5+23]
+        self.obs_switches = self.obs[5+23:]
+        self.copy_obs = copy_obs
+        self.state = self.obs[:5+23] # measurements part of the observation (view) #RingBuffer(capacity=self.svNum-1, dtype=np.float64)
         # for i in range(self.svNum-1):
         #     self.state.append(0)
         self.RandomNo = 0# randint(0,len(SwitchOpenNoList)-1) #Random case No.
+        self.fault_case = None # fixed fault case No. of the next episodes (stratified evaluation), None is random
         self.action_space = spaces.Discrete(self.actNum) #[0,1] if discrete(2)
         self.observation_space = spaces.Box(low=-1.0, high=20000, shape=(self.svNum, ), dtype=np.float32)
         self.brnName = "Line.L115"
+        self.SWlineNames = ['Line.Sw' + str(swn) if swn <= 10 else 'Line.' + self.SWnamesAdd[swn-11] for swn in self.SWnum[1:]]
+        self.measure = MeasurementLayer(self.brnName, self.SWlineNames) # element indices resolved after compile
+        self.topology = TopologyIndex(self.SWlineNames)
+        self.bank = SwitchBank(['Sw' + str(swn) for swn in self.SWnum[1:]]) # SwtControl positions resolved after compile
+        self.topology_check = topology_check
+        self.lastLoad = None # total load of the last step, reused with the observation buffer when a Solve is skipped
+        self.recompile = recompile
+        self.compiled = False # case is compiled on first reset(), later resets restore its initial state
+        self.SwitchOpenNoList = SwitchOpenNoList
+        self.cache = cache # with a cache, every topology is solved from the initial regulator taps (path independent)
         self.rewardHuman=[3090.98, 3168.24,3070.79,3053.43,3086.45, 3066.03,3046.85, 3036.55, 2629.48, 3075.18, 3093.83, 2918.83]
         #Get Random Fault Switches open
         # self.SwitchOpenNo = 0 #SwitchOpenNoList[self.RandomSW]
@@ -94,61 +125,77 @@ class rlEnv(gym.Env):
          
     # get system state from OpenDSS
     def takeSample(self):
-        # voltage
-        # self.dssCircuit.SetActiveBus(self.busName)
-        # ob_volt = list(self.dssCircuit.ActiveBus.Voltages)
-        # current Power
-        
-        self.dssCircuit.SetActiveElement(self.brnName)
-        ob_powers = list(self.dssElem.Powers()[0:5:2])
-        ob_powersSW=[]
-        #Monitor all switches power flow
-        for swn in self.SWnum[1:]:
-            if swn<=10:
-                SWName = 'Line.Sw' + str(self.SWnum[swn])
-            else:
-                SWName= 'Line.' + self.SWnamesAdd[swn-11]
-            self.dssCircuit.SetActiveElement(SWName)
-            ob_powersSW.append(np.abs(sum(self.dssElem.Powers()[0:5:2])))
-                
-        # Monitor all available voltages
-        AllNodesVmagPU = np.asarray(self.dssCircuit.AllBusMagPu())
-        #Filter out non energized nodes
-        NodesVmagPU =  AllNodesVmagPU[AllNodesVmagPU > 0.1] #Threshold 0.1 pu 
-        LowestV = min(NodesVmagPU)
-        HighV = max(NodesVmagPU)
-        ob_powers.extend([LowestV,HighV])
-        ob_powers.extend(ob_powersSW)
-        return ob_powers
+        """feeder head P (3 phases), lowest/highest energized node voltage, switch power flows into the observation buffer"""
+        self.obs_feeder[:], self.obs_flows[:] = self.measure.branchPowers()
+        self.obs_voltage[:] = self.measure.voltageRange(0.1) #Filter out non energized nodes, threshold 0.1 pu 
     
+    def measureOutcome(self):
+        """read switch states + sample of the solved circuit, return (observation buffer, total served load)"""
+        self.bank.states(self.SWstatesRd)
+        self.takeSample()
+        self.obs_switches[:] = self.SWstatesRd
+        return self.obs, self.LoadsMeasure()
+
+    def solveOutcome(self):
+        """solve the SWstates topology from the initial regulator taps and a zero-load start, so the outcome only
+        depends on (fault case, switch states) and not on the order the switches were operated"""
+        self.setSwitchStates(self.SWstates) # operate pending switch actions before regulators see the old topology
+        self.restoreTaps()
+        dss.YMatrix.SolutionInitialized(False)
+        self.Command("Solve")
+        return self.measureOutcome()
+
+    def cachedOutcome(self):
+        """outcome of the present topology from the transition cache, solved on a miss only"""
+        key = topologyKey(self.RandomNo, self.SWstates)
+        outcome = self.cache.get(key)
+        if outcome is None:
+            ob_tmp, TotalLoad = self.solveOutcome()
+            self.cache.put(key, ob_tmp, TotalLoad)
+        else:
+            self.setSwitchStates(self.SWstates) # keep the circuit topology in step for later misses
+            self.obs[:] = outcome[0]
+            ob_tmp, TotalLoad = self.obs, outcome[1]
+            self.SWstatesRd[:] = self.obs_switches
+        return ob_tmp, TotalLoad
+
+    def reuseOutcome(self):
+        """last outcome (still in the observation buffer) with the present switch states, for actions that leave the
+        energized area unchanged"""
+        self.SWstatesRd[1:] = np.where(self.SWstates[1:] == 1, 2, 1) # SwtControl state 1 open, 2 closed
+        self.obs_switches[:] = self.SWstatesRd
+        return self.obs, self.lastLoad
+
 
     # obtain next system state using action vector
     def step(self, action):
         # action is the number of switch selected to change its state
         #First step is open the switch or switches to islolate the fault
+        skipSolve = False # answered from the topology index, no power flow needed
+        loopRejected = False
         if self.currStep == 0:
               #Get Random Fault Switches open
-            self.RandomNo = randint(0,len(SwitchOpenNoList)-1)
-            SwitchOpenNo = SwitchOpenNoList[self.RandomNo ]
+            if self.fault_case is None:
+                self.RandomNo = randint(0,len(self.SwitchOpenNoList)-1)
+            else:
+                self.RandomNo = self.fault_case
+            SwitchOpenNo = self.SwitchOpenNoList[self.RandomNo ]
             self.SwitchOpenNo = SwitchOpenNo # Switch number 4 is open at 1st step to isolate the fault
             # print("Switch open number " + str(SwitchOpenNo ))
-            for SwNo in SwitchOpenNo:
-                SwitchOpen = 'SwtControl.Sw' + str(SwNo)
-                self.Command(SwitchOpen + ".Action = Open")
+            self.bank.setActions(SwitchOpenNo, 1, delay=None) # SwtControl.Sw<No>.Action = Open, per-switch index writes
             self.SWstates[SwitchOpenNo] = 0
             # self.run_command = "set mode=daily stepsize=1h number=1"
             done = bool(0)
             # # Read switches states
-       
-            for k in self.SWnum:
-                if k !=0:
-                    SwctrlName = "SwtControl.Sw"+str(self.SWnum[k]) 
-                    dss.SwtControls.Name(SwctrlName.split(".")[1])
-                    self.SWstatesRd[k] = dss.SwtControls.State()
+            self.bank.states(self.SWstatesRd)
         else:   # Action starts at step 2 
             # modify the case object according to action 
             if action == 0 or action in self.SwitchOpenNo:
                 done = bool(0) # if action is 8, that means no action neededN()
+                skipSolve = self.topology_check
+            elif self.topology_check and self.topology.closesLoop(self.SWstates, action):
+                done = bool(0) # closing the switch would mesh the feeder, the switch is not operated
+                skipSolve = loopRejected = True
             elif action <= len(self.SWnum)-1:
                 # self.dssCircuit.SetActiveElement(self.brnName)
                 # self.dssCircuit.ActiveCktElement.Open
@@ -157,7 +204,11 @@ class rlEnv(gym.Env):
                 else:
                     CloseAction = 0
                 k=action
+                deadToggle = self.topology_check and self.topology.isDeadToggle(self.SWstates, k)
                 self.SWstates =self.SwitchAction(self.SWnum, CloseAction, k, self.SWstates)
+                if deadToggle:
+                    self.setSwitchStates(self.SWstates) # operate now, the Solve that would do it is skipped
+                    skipSolve = True
                 done = bool(0)
                 # # Read switches states
        
@@ -175,19 +226,21 @@ class rlEnv(gym.Env):
             #     done = bool(0)
          # advance and take new sample
         
-        self.Command("Solve")
-        #After solve check if any loops in feeders
-        # DSSTopology = self.dssCircuit.Topology
-        # numLoops = DSSTopology.NumLoops        
-        # if numLoops == 0:
-        
-        # Read switches states
-       
-        for k in self.SWnum:
-            if k !=0:
-                SwctrlName = "SwtControl.Sw"+str(self.SWnum[k]) 
-                dss.SwtControls.Name( SwctrlName.split(".")[1])
-                self.SWstatesRd[k] =dss.SwtControls.State()
+        if skipSolve:
+            ob_tmp, TotalLoad = self.reuseOutcome()
+        elif self.cache is None:
+            self.Command("Solve")
+            #After solve check if any loops in feeders
+            # DSSTopology = self.dssCircuit.Topology
+            # numLoops = DSSTopology.NumLoops        
+            # if numLoops == 0:
+            
+            # Read switches states
+            ob_tmp, TotalLoad = self.measureOutcome()
+        else:
+            ob_tmp, TotalLoad = self.cachedOutcome()
+        self.lastLoad = TotalLoad
+        topo = self.topology.evaluate(self.SWstates)
         # check for max simulation time
         if self.currStep == self.maxStep:
             done = bool(1)
@@ -195,44 +248,99 @@ class rlEnv(gym.Env):
         # print('Current Step =', self.currStep)      
         # if self.currStep == 1:
         #     self.run_command = self.SwitchOpen +".Lock = Yes"
-        ob = self.takeSample()
-        for i in range(len(ob)):
-            self.state[i]=ob[i]
+        # self.state is a view of the measurements in the observation buffer
         # for val in ob:
         #     self.state.append(val)
         # ob_tmp = np.array(self.state).reshape(1,self.svNum-1)
-        ob_tmp = np.append(ob, self.SWstatesRd)
         # np.insert(ob_tmp, [0], self.SwitchOpenNo) # Observation Length may change if we add switch open numbers
-        Reward = self.LoadsMeasure()/self.rewardHuman[self.RandomNo] #Normalized rewards
+        Reward = TotalLoad/self.rewardHuman[self.RandomNo] #Normalized rewards
         self.currStep += 1
-        np.set_printoptions(precision=3)
-        return ob_tmp, Reward, done, {"SW Status":[self.RandomNo, self.SwitchOpenNo, self.currStep-1]} #{"SW Status":[self.SWstates, self.SwitchOpenNo]}
+        info = {"SW Status":[self.RandomNo, self.SwitchOpenNo, self.currStep-1], #{"SW Status":[self.SWstates, self.SwitchOpenNo]}
+                "Loops":topo['loops'], "Islands":topo['islands'], "Load Bound":topo['load_bound'],
+                "Solve Skipped":skipSolve, "Loop Rejected":loopRejected}
+        if self.copy_obs:
+            ob_tmp = ob_tmp.copy()
+        return ob_tmp, Reward, done, info
         
 
     # reset the environment and return initial observation
     def reset(self):
-        dss.Basic.ClearAll()
         self.currStep = 0 
         self.done = False
-        # load case file
-        run_command("compile " + self.case_path )
+        if self.recompile or not self.compiled:
+            # load case file
+            dss.Basic.ClearAll()
+            run_command("compile " + self.case_path )
+            self.measure = MeasurementLayer(self.brnName, self.SWlineNames)
+            self.topology = TopologyIndex(self.SWlineNames)
+            self.bank = SwitchBank(['Sw' + str(swn) for swn in self.SWnum[1:]])
+            self.snapshotCircuit()
+            self.compiled = True
+        else:
+            # reuse compiled case, put back switch topology + regulator taps
+            self.restoreCircuit()
 
         # solve the case
         run_command("set maxcontroliter=50")
         run_command("Solve")
-        self.SWstates = np.concatenate((np.zeros(1),np.ones(6),np.zeros(4),np.ones(13))) #Initial status
+        self.SWstates = self.initialSwitchStates() #Initial status
         
         # set measurement bus to recloser location
         # self.dssCircuit.SetActiveBus(self.busName)
         
         # get initial observation
         ob0, R, done, _ = self.step(0)
-        np.set_printoptions(precision=3)
         # ob = ob0.astype(int)
         return ob0
 
     
 
+    def setFaultCase(self, case):
+        """fault case No. (index of SwitchOpenNoList) of the following episodes, None draws a random case per episode"""
+        self.fault_case = case
+
+    # record and restore initial state of the compiled case
+    def initialSwitchStates(self):
+        """SWstates before the fault, 1 closed 0 open (index 0 is the no action switch)"""
+        return np.concatenate((np.zeros(1),np.ones(6),np.zeros(4),np.ones(13)))
+
+    def snapshotCircuit(self):
+        """Switch states/actions/delays and transformer winding taps right after compile"""
+        actions = []
+        for k in self.SWnum[1:]:
+            self.bank.activate(k)
+            actions.append(dss.SwtControls.Action())
+        self.SWinit = (self.bank.states()[1:], np.array(actions), self.bank.delays())
+        self.TapInit = []
+        for name in dss.Transformers.AllNames():
+            dss.Transformers.Name(name)
+            for w in range(1, dss.Transformers.NumWindings()+1):
+                dss.Transformers.Wdg(w)
+                self.TapInit.append((name, w, dss.Transformers.Tap()))
+
+    def restoreCircuit(self):
+        """Set all SwtControls back to their initial (SWstates) position, reset taps, pending controls and solution"""
+        dss.CtrlQueue.ClearQueue()
+        states, actions, delays = self.SWinit
+        self.bank.operate(self.SWnum[1:], states)
+        self.bank.setActions(self.SWnum[1:], actions, delays)
+        self.restoreTaps()
+        dss.YMatrix.SolutionInitialized(False) # start next solve from the same zero-load solution as a fresh compile
+
+    def restoreTaps(self):
+        """Transformer (regulator) winding taps back to their value right after compile"""
+        for name, w, tap in self.TapInit:
+            dss.Transformers.Name(name)
+            dss.Transformers.Wdg(w)
+            dss.Transformers.Tap(tap)
+
+    def setSwitchStates(self, SWstates):
+        """Operate every switch whose position differs from SWstates (1 closed, 0 open), pending actions are cleared"""
+        target = np.where(np.asarray(SWstates[1:]) == 1, 2, 1)
+        changed = self.bank.states()[1:] != target
+        self.bank.operate(self.SWnum[1:][changed], target[changed])
+        self.bank.setActions(self.SWnum[1:], target, delay=None)
+
     # def render(self, mode):
 
     #     return
@@ -248,8 +356,7 @@ class rlEnv(gym.Env):
         " CloseAction = 0               # 0 for open 1 for close"
         "k=4 # number of Switch % switch 4 for 60-160"
         
-        SwctrlName = "SwtControl.Sw"+str(SWnum[k]) 
-        dss.SwtControls.Name(SwctrlName.split(".")[1])
+        self.bank.activate(SWnum[k]) # SwtControl.Sw<k>
         if CloseAction==0:
         # Open the switch
             # self.Command(SwctrlName + ".Action = Open")
@@ -347,19 +454,8 @@ class rlEnv(gym.Env):
                 self.run_command("Load."+self.LoadNames[ConnectLoadIndex[CLI]]+".enabled=true")
                 
     def LoadsMeasure(self): 
-        """ LoadNames: Current actiave loads names. Loads names may changes after sheding or connecting actions.
-        LoadStates: ON/OFF of the loads after step action"""
-        LoadNames = dss.Loads.AllNames()
-        LoadsNum = len(LoadNames)
-        LoadPQt = np.zeros((LoadsNum, 2))
-        m=0
-        for loadName in LoadNames:
-            # loadName = "Load.s24c" #s68a
-            dss.Loads.Name(loadName)
-            self.dssCircuit.SetActiveElement(loadName)
-            LoadPQt[m,:] = self.dssElem.Powers()[0:2]
-            m += 1
-        TotalLoadPt= sum(LoadPQt[:,0])
+        """ Total served load P (first phase of each load) from one batched read of all load powers"""
+        TotalLoadPt = self.measure.totalLoad()
         return TotalLoadPt   
     
 
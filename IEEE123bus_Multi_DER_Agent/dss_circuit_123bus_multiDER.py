@@ -0,0 +1,89 @@
+"""
+openDSSDirect circuit import IEEE 123bus test system with N PV systems / storage units placed from a config
+feeder, loadshapes, irradiance and temperature shapes (fixed or streamed) of dss_circuit_123bus_singlePV, the single
+pv71 is replaced by the DERs of der_config:
+--> der_config None: num_pvs PVs + num_storages storage units spread evenly over the load buses (placeDERs)
+--> der_config list: one dict per DER, as placeDERs() returns
+All PVs follow the irrad/Temp shapes, storage units are dispatched by the agent (kW setpoint every step).
+** Edit the circuit and data paths in dss_circuit_123bus_singlePV.py **
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'IEEE123bus_Single_PV_Agent'))  # 123 bus feeder + data of the single PV example
+import dss_circuit_123bus_singlePV as feeder
+import numpy as np
+from opendssdirect import dss
+
+num_pvs = 20  # PVs placed over the load buses
+num_storages = 0  # storage units placed over the load buses
+pv_kva = 150  # PV rating, Q limit = 44% * S_rated (IEEE 1547)
+storage_kw = 100  # storage kW rating
+storage_kwh = 400  # storage kWh rating
+der_config = None  # explicit DER list, None: placeDERs(num_pvs, num_storages)
+
+
+def numDERs():
+    """DERs of the config (spaces before the circuit is built)"""
+    return len(der_config) if der_config is not None else num_pvs + num_storages
+
+
+def placeDERs(pvs, storages):
+    """
+    spread PVs and storage units evenly over the load buses (round robin when there are more DERs than loads),
+    each DER connected as its load (bus, phases, kV, conn)
+    :return: list of DER dicts: type, name, bus1, phases, kv, conn and kva (PV) or kw, kwh (storage)
+    """
+    loads = dss.to_altdss().Load.batch()
+    connections = list(zip(loads.Bus1, np.asarray(loads.Phases), np.asarray(loads.kV), loads.Conn_str))
+    config = []
+    for kind, count in (('pv', pvs), ('bess', storages)):
+        for k in range(count):
+            position = k * len(connections) // count if count <= len(connections) else k % len(connections)
+            bus1, phases, kv, conn = connections[position]
+            der = {'type': 'PVSystem' if kind == 'pv' else 'Storage', 'name': kind + '_' + str(k + 1), 'bus1': bus1,
+                   'phases': int(phases), 'kv': float(kv), 'conn': conn}
+            der.update({'kva': pv_kva} if kind == 'pv' else {'kw': storage_kw, 'kwh': storage_kwh})
+            config.append(der)
+    return config
+
+
+def buildDERs(config):
+    """
+    No inverter control implemented with the DERs.  Agent will access PVSystems/Storages directly (DERBank).
+    """
+    for der in config:
+        connection = ' phases=%d bus1=%s kV=%s conn=%s' % (der['phases'], der['bus1'], der['kv'], der['conn'])
+        if der['type'] == 'PVSystem':
+            qlim = 0.44 * der['kva']
+            dss.Command('New PVSystem.' + der['name'] + connection + ' kVA=%s irrad=1 Pmpp=%s' % (der['kva'], der['kva'])
+                        + ' temperature=25 effcurve=PV_eff P-TCurve=PV_temp Daily=irrad TDaily=temp'
+                        ' %%cutin=0.05 %%cutout=0.05 kvarMax=%s kvarMaxAbs=%s' % (qlim, qlim))
+        else:
+            qlim = 0.44 * der['kw']
+            dss.Command('New Storage.' + der['name'] + connection + ' kWrated=%s kVA=%s kWhrated=%s %%stored=50'
+                        ' kvarMax=%s kvarMaxAbs=%s' % (der['kw'], der['kw'], der['kwh'], qlim, qlim))
+
+
+def run123busCircuit():
+    """build the circuit, returns the ShapeStream of streamed shapes (None with fixed date slice shapes)"""
+    stream = None
+    if feeder.stream_steps is not None:
+        feeder.load123bus()
+        feeder.buildXYs()
+        stream = feeder.buildStream()
+        feeder.assignLoadShapes()
+    else:
+        pv_data = feeder.importPVData()
+        feeder.load123bus()
+        feeder.buildXYs()
+        feeder.buildLoadshapes(pv_data)
+        feeder.assignLoadShapes()
+        feeder.buildTempCurves()
+    buildDERs(der_config if der_config is not None else placeDERs(num_pvs, num_storages))
+    return stream
+
+
+if __name__ == '__main__':
+    run123busCircuit()
@@ -0,0 +1,174 @@
+"""
+Multi DER agent IEEE 123bus voltage deviation minimization with N PV systems / storage units
+Build gymnasium environment class to run dss circuit 'dss_circuit_123bus_multiDER.py'
+Actions and observations are vectors over the DERs (PVSystems first, then Storages, see der_bank.py), every step
+writes all setpoints and reads all DER powers + PCC voltages in a fixed number of batch calls, the rewards of
+SinglePV_Agent are computed on the whole DER arrays
+Observations are the PCC voltage magnitudes p.u. (first node of every DER bus)
+"""
+
+import dss_circuit_123bus_multiDER
+import gymnasium as gym
+from gymnasium.spaces import Box
+import opendssdirect as dss
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root shared modules
+from der_bank import DERBank
+import dss_rewards
+from step_solver import StepSolver
+data_path = os.getcwd()
+
+
+class MultiDER_Agent(gym.Env):
+    def __init__(self, render_mode=None, skip_unchanged=False):
+        """
+        :param skip_unchanged: no power flow for steps with the setpoints + multipliers of the last solve
+        """
+        super().__init__()
+        # folder of the recorded transition shards (dss_recorder.TransitionRecorder)
+        self.output_path = os.path.join(data_path, 'data', 'train_agent_multiDER_123bus')
+
+        # dss direct cmds to subclass (optional)
+        self.Circuit = dss.Circuit
+        self.Command = dss.Command
+        self.Solution = dss.Solution
+
+        # set params for circuit
+        self.num_ders = dss_circuit_123bus_multiDER.numDERs()  # spaces from the config, circuit built by reset()
+        self.ders = DERBank()  # setpoints + measurements of all DERs, bound to every newly built circuit
+        self.current_step = 1
+        self.max_step = 2016  # set episodes at 24 hrs x 7 days: 5 min steps
+        self.total_steps = 8640  # 30 days
+        self.stream = None  # ShapeStream of the circuit when its shapes are streamed (dss_circuit_123bus_singlePV)
+        self.solver = StepSolver(skip_unchanged)  # Solve() + FinishTimeStep() of a step, solve statistics for info
+        self.setpoints = np.zeros(self.num_ders)  # kvar (PVs) / kW (storages) of the next solve
+        self.der_rewards = np.zeros(self.num_ders)  # reward of every DER at the last step (violations counted once)
+        self.Terminated = False
+
+        # sim limits on voltage
+        self.Vpu_max = 1.05
+        self.Vpu_min = 0.95
+        self.voltage_violation_count = 0
+        self.q_violation_count = 0
+
+        # configure action and observation spaces
+        # PV kvar p.u. of kVA nameplate (kvarMax = 44% kVA), storage kW p.u. of kW rating (+ discharging)
+        self.action_space = Box(low=-1.0, high=1.0, shape=(self.num_ders,), dtype=np.float64)
+        # PCC voltage of every DER
+        self.observation_space = Box(low=0.9, high=1.1, shape=(self.num_ders,), dtype=np.float64)
+
+
+    # dss solve params
+    def sysFlatStart(self):
+        self.stream = dss_circuit_123bus_multiDER.run123busCircuit()
+        self.ders.bind()
+        if self.ders.num_ders != self.num_ders:
+            raise ValueError('circuit has %d DERs, spaces sized for %d' % (self.ders.num_ders, self.num_ders))
+
+
+    def setSolutionParams(self):
+        """ set voltage bases for circuit and apply random seed to episode starting point"""
+        self.Command('Set voltagebases=[4.16 0.48]')
+        self.Command('calc')
+        self.Command('Set mode=daily number=1')
+        self.Solution.StepSizeMin(5)
+        if self.stream is not None:
+            # any point of the streamed series (whole year), episode inside it: 2 solution steps per env step
+            starting_point = int(self.np_random.integers(0, self.stream.total_steps - 2 * self.max_step + 1))
+            print('starting_5min_point:', starting_point)
+            self.stream.seek(starting_point)
+            return starting_point
+        starting_point = int(self.np_random.integers(0, self.total_steps - self.max_step + 1))  # randomize starting point
+        print('starting_5min_point:', starting_point)
+        self.Command('Set hour=' + str(starting_point))
+        return starting_point
+
+
+    def get_info(self):
+        """ add any relavant observable local data - DER powers p.u. of rating"""
+        ders = self.ders
+        return {"real_power": np.round(ders.p / ders.kva, 5), "reactive_power": np.round(ders.q / ders.kva, 5)}
+
+
+    def applySetpoints(self, action):
+        self.setpoints = np.ravel(action) * self.ders.rating  # take pu of nameplate
+        self.ders.apply(self.setpoints)
+
+
+    # reward function(s), arrays over the DERs (dss_rewards.py)
+    def checkQNameplate(self, s, p, q):
+        """validate available Q_pv """
+        return dss_rewards.qNameplate(s, p, q)
+
+
+    def checkQ1547(self, s, q):
+        """validate Q_pv IEEE 1547 limits"""
+        penalty = dss_rewards.q1547(s, q)
+        self.q_violation_count += int(np.count_nonzero(penalty < 0))
+        return penalty
+
+
+    def checkBusVoltage(self, vbus):
+        """check for voltage deviation from 1pu + penalty for operational violation"""
+        self.voltage_violation_count += int(np.count_nonzero(dss_rewards.voltageViolations(vbus, self.Vpu_min,
+                                                                                            self.Vpu_max)))
+        return dss_rewards.voltageDeviation(vbus) + dss_rewards.voltageBand(vbus, self.Vpu_min, self.Vpu_max)
+
+
+    def derRewards(self):
+        """reward of every DER: voltage deviation + operational voltage violation at its PCC + pv_nameplate_check"""
+        ders = self.ders
+        pv = ders.is_pv
+        rewards = self.checkBusVoltage(ders.vpu)
+        rewards[pv] += self.checkQNameplate(ders.kva[pv], ders.p[pv], ders.q[pv])
+        rewards[pv] += self.checkQ1547(ders.kva[pv], ders.q[pv])
+        return rewards
+
+
+    def reward(self):
+        """sum of the DER rewards, kept per DER in self.der_rewards"""
+        self.der_rewards = self.derRewards()
+        return float(np.sum(self.der_rewards))
+
+
+    def step(self, action):
+        self.applySetpoints(action)
+        solve_info = self.solver.solve(self.setpoints.tobytes())  # (streamed shapes) + Solve() + FinishTimeStep()
+        self.ders.update()
+        obs = self.ders.vpu.copy()
+        info = self.get_info()
+        info.update(solve_info)  # iterations, control_iterations, converged, solve_skipped
+        reward = self.reward()
+        if self.current_step == self.max_step:
+            self.Terminated = True
+        else:
+            self.Terminated = False
+            self.current_step += 1
+        return obs, reward, self.Terminated, False, info  # no truncation
+
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)  # seeds self.np_random (episode starting point)
+        print('Resetting DSS environment')
+        self.sysFlatStart()
+        self.setSolutionParams()
+        self.solver.bind(self.stream)
+        self.setpoints = self.ders.setpoints()
+        self.ders.update()
+        obs = self.ders.vpu.copy()
+        info = self.get_info()
+        self.current_step = 0
+        self.Terminated = False
+        return obs, info
+
+
+    def render(self):
+        # add if necessary
+        pass
+
+
+    def close(self):
+        # n/a
+        pass
@@ -0,0 +1,44 @@
+#%%
+"""import Stable Baselines3 DRL algo Advantage Actor-Critic with MLP policy for agent training
+one centralized agent dispatching the kvar/kW setpoints of every DER of dss_circuit_123bus_multiDER
+"""
+from gymnasium_env_123bus_multiDER import MultiDER_Agent
+from stable_baselines3 import A2C
+from stable_baselines3.common.logger import configure
+from stable_baselines3.common.env_checker import check_env
+import os
+import sys
+sys.path.append(os.path.dirname(os.getcwd()))  # repo root shared modules
+from dss_vec_env import make_dss_vec_env
+log_path = os.getcwd() + r'\a2c_multiDER_agent'
+num_envs = 4  # parallel training envs, one OpenDSS engine (process) each; 1 = single env in this process
+
+# NN hyperparameters
+timesteps = 100800   # 2016 steps x 50 episodes
+lr = 0.00005
+gamma = 0.989
+
+if __name__ == '__main__':  # required for worker processes
+    new_logger = configure(log_path, ["stdout", "csv", "tensorboard"])  # save progress metrics
+
+    # environment check (uncomment to run test)
+    # check_env(MultiDER_Agent(), warn=True)
+    # seeds randomize the episode starting point of each worker independently
+    if num_envs > 1:
+        my_env = make_dss_vec_env(MultiDER_Agent, n_envs=num_envs, seeds=0)
+    else:
+        my_env = MultiDER_Agent()
+
+    # select Actor-Critic algo
+    model = A2C('MlpPolicy', env=my_env, gamma=gamma, learning_rate=lr, tensorboard_log=log_path, verbose=1)
+    model.set_logger(new_logger)
+
+    # train agent
+    model.learn(total_timesteps=timesteps, progress_bar=True)
+    print('model training complete')
+    new_logger.close()
+    # save trained model
+    print('saving trained agent')
+    model.save(log_path + r'/a2c.zip')
+    print('model saved in local path, enjoy trained agent!')
+    my_env.close()
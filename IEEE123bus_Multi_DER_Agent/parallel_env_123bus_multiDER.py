@@ -0,0 +1,100 @@
+"""
+Multi-agent (one agent per DER) parallel environment on the IEEE 123bus feeder of MultiDER_Agent
+Every DER is a local Q controller as SinglePV_Agent: action = own kvar setpoint p.u. of kVA (storage: kW p.u.),
+observation = own PCC voltage p.u. + own P, Q p.u. of rating, reward = own voltage deviation/violation + nameplate and
+IEEE 1547 checks.  All agents share one power flow per step, the local observations/rewards are rows of the DER arrays
+read once per step (der_bank.py), so adding agents costs array slicing and no extra solves.
+The PettingZoo ParallelEnv API is followed (no pettingzoo import needed):
+
+    env = MultiDER_ParallelEnv()
+    observations, infos = env.reset(seed=0)
+    while env.agents:
+        actions = {agent: policy(observations[agent]) for agent in env.agents}
+        observations, rewards, terminations, truncations, infos = env.step(actions)
+
+resetArray()/stepArray() take and return (num_agents, ...) arrays in possible_agents order (no dicts), used by the SB3
+adapter of dss_agent_vec_env.py to train one shared policy on the agent batch.
+"""
+
+import numpy as np
+from gymnasium.spaces import Box
+from gymnasium_env_123bus_multiDER import MultiDER_Agent
+
+
+class MultiDER_ParallelEnv:
+    metadata = {'name': 'multiDER_123bus_v0', 'render_modes': []}
+
+    def __init__(self, render_mode=None, **env_kwargs):
+        """
+        :param env_kwargs: MultiDER_Agent keyword arguments (i.e. skip_unchanged)
+        """
+        self.env = MultiDER_Agent(**env_kwargs)  # shared feeder, power flow and DER arrays
+        self.render_mode = render_mode
+        self.num_agents = self.env.num_ders
+        self.possible_agents = ['der_' + str(k) for k in range(self.num_agents)]  # agent k = DER k (env.ders.names)
+        self.agents = []
+        self.observation_spaces = {agent: Box(low=np.array([0.9, -1.0, -1.0]), high=np.array([1.1, 1.0, 1.0]),
+                                              dtype=np.float64) for agent in self.possible_agents}
+        self.action_spaces = {agent: Box(low=-1.0, high=1.0, shape=(1,), dtype=np.float64)
+                              for agent in self.possible_agents}
+        self.obs = np.zeros((self.num_agents, 3))  # local observations, row k of agent k
+
+    def observation_space(self, agent):
+        return self.observation_spaces[agent]
+
+    def action_space(self, agent):
+        return self.action_spaces[agent]
+
+    def observe(self):
+        """local observations of every agent from the DER arrays: PCC voltage, P, Q p.u. of rating"""
+        ders = self.env.ders
+        self.obs[:, 0] = ders.vpu
+        np.divide(ders.p, ders.kva, out=self.obs[:, 1])
+        np.divide(ders.q, ders.kva, out=self.obs[:, 2])
+        return self.obs.copy()
+
+    def resetArray(self, seed=None, options=None):
+        """reset the feeder, return observations (num_agents x 3) + shared info"""
+        _, info = self.env.reset(seed=seed, options=options)
+        return self.observe(), info
+
+    def stepArray(self, actions):
+        """
+        apply the actions of all agents, one shared power flow
+        :param actions: (num_agents,) or (num_agents x 1) setpoints p.u.
+        :return: observations (num_agents x 3), rewards (num_agents,), terminated, truncated, shared info
+        """
+        _, _, terminated, truncated, info = self.env.step(np.ravel(actions))
+        return self.observe(), self.env.der_rewards, terminated, truncated, info  # DER rewards of step()
+
+    def agentInfos(self, info):
+        """per agent info: own P, Q p.u. + the shared solve statistics"""
+        shared = {key: value for key, value in info.items() if key not in ('real_power', 'reactive_power')}
+        return {agent: dict(shared, real_power=info['real_power'][k], reactive_power=info['reactive_power'][k])
+                for k, agent in enumerate(self.possible_agents)}
+
+    def reset(self, seed=None, options=None):
+        obs, info = self.resetArray(seed=seed, options=options)
+        self.agents = self.possible_agents[:]
+        return dict(zip(self.possible_agents, obs)), self.agentInfos(info)
+
+    def step(self, actions):
+        """PettingZoo parallel step on the dict of agent actions (agents without an action keep their setpoint)"""
+        setpoints = self.env.setpoints / self.env.ders.rating
+        for k, agent in enumerate(self.possible_agents):
+            if agent in actions:
+                setpoints[k] = np.ravel(actions[agent])[0]
+        obs, rewards, terminated, truncated, info = self.stepArray(setpoints)
+        agents = self.possible_agents
+        observations = dict(zip(agents, obs))
+        terminations = dict.fromkeys(agents, terminated)
+        truncations = dict.fromkeys(agents, truncated)
+        if terminated or truncated:
+            self.agents = []
+        return observations, dict(zip(agents, rewards.tolist())), terminations, truncations, self.agentInfos(info)
+
+    def render(self):
+        pass
+
+    def close(self):
+        self.env.close()
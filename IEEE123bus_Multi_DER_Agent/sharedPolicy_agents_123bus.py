@@ -0,0 +1,39 @@
+#%%
+"""import Stable Baselines3 DRL algo Proximal Policy Optimization with MLP policy for multi-agent training
+every DER of dss_circuit_123bus_multiDER is a local agent (own PCC voltage, P, Q), all agents share one policy
+"""
+from parallel_env_123bus_multiDER import MultiDER_ParallelEnv
+from stable_baselines3 import PPO
+from stable_baselines3.common.logger import configure
+from stable_baselines3.common.vec_env import VecMonitor
+import os
+import sys
+sys.path.append(os.path.dirname(os.getcwd()))  # repo root shared modules
+from dss_agent_vec_env import AgentVecEnv
+log_path = os.getcwd() + r'\ppo_sharedPolicy_agents'
+
+# NN hyperparameters
+timesteps = 2016 * 20 * 10   # 2016 steps x 20 agents x 10 episodes (samples of all agents)
+lr = 0.0003
+gamma = 0.989
+
+if __name__ == '__main__':
+    new_logger = configure(log_path, ["stdout", "csv", "tensorboard"])  # save progress metrics
+
+    # agents of one feeder, one shared power flow per step
+    my_env = VecMonitor(AgentVecEnv(MultiDER_ParallelEnv(), seed=0))
+
+    # shared policy trained on the agent batch
+    model = PPO('MlpPolicy', env=my_env, gamma=gamma, learning_rate=lr, n_steps=256, tensorboard_log=log_path,
+                verbose=1)
+    model.set_logger(new_logger)
+
+    # train agents
+    model.learn(total_timesteps=timesteps, progress_bar=True)
+    print('model training complete')
+    new_logger.close()
+    # save trained model
+    print('saving trained agents')
+    model.save(log_path + r'/ppo.zip')
+    print('model saved in local path, enjoy trained agents!')
+    my_env.close()
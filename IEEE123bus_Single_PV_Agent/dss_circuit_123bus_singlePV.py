@@ -3,10 +3,14 @@ openDSSDirect circuit import IEEE 123bus test system with single PV system
 local voltage deviation minimization via reactive power set point control (no QV-droop)
 """
 
-import pandas as pd
 import numpy as np
 from opendssdirect import dss
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root shared modules
+from timeseries_cache import loadSeries
+from dss_shapes import newLoadshape, newTshape
+from shape_stream import ShapeStream
 
 """EDIT PATHS FOR DSS LOCALLY"""
 # data_path = os.getcwd()  # local dir
@@ -17,10 +21,39 @@ num_steps = 8640  # 30 days
 step_size = 5  # 5 min
 Sbase = 1e6
 num_pvs = 1
+resolution = '5min'
+date_start = '2006-04-01'  # slice 30 days of data April Central TX
+date_end = '2006-04-30'
+
+# streamed shapes (optional): full csv series [stream_start:stream_end] fed into the circuit stream_steps points at a time
+stream_steps = None  # i.e. 2016 = 1 week of 5 min steps, None: fixed shapes of the date slice above
+stream_start = None  # None: from the first / to the last point of the csv files (full or multi-year data)
+stream_end = None
+
+# nodes of IEEE123Master.dss in AllNodeNames order, bus.phases ('25r.13' = 25r.1 + 25r.3, '9' = 9.1): sizes a network
+# observation without compiling the circuit (checked against the compiled circuit by NodeVoltages.bind())
+feeder_nodes = ('150.123 150r.123 149.123 1.123 2.2 3.3 7.123 4.3 5.3 6.3 8.123 12.2 9 13.123 9r 14 34.3 18.123 11 '
+               '10 15.3 16.3 17.3 19 21.123 20 22.2 23.123 24.3 25.123 25r.13 26.13 28.123 27.13 31.3 33 29.123 '
+               '30.123 250.123 32.3 35.123 36.12 40.123 37 38.2 39.2 41.3 42.123 43.2 44.123 45 47.123 46 48.123 '
+               '49.123 50.123 51.123 151.123 52.123 53.123 54.123 55.123 57.123 56.123 58.2 60.123 59.2 61.123 '
+               '62.123 63.123 64.123 65.123 66.123 67.123 68 72.123 97.123 69 70 71 73.3 76.123 74.3 75.3 77.123 '
+               '86.123 78.123 79.123 80.123 81.123 82.123 84.3 83.123 85.3 87.123 88 89.123 90.2 91.123 92.3 93.123 '
+               '94 95.123 96.2 98.123 99.123 100.123 450.123 197.123 101.123 102.3 105.123 103.3 104.3 106.2 '
+               '108.123 107.2 109 300.123 110 111 112 113 114 135.123 152.123 160r.123 160.123 61s.123 300_open.123 '
+               '94_open 610.123')
+
+
+def nodeNames():
+    """node names of the feeder ('150.1', ...) from feeder_nodes"""
+    names = []
+    for bus_phases in feeder_nodes.split():
+        bus, _, phases = bus_phases.partition('.')
+        names.extend(bus + '.' + phase for phase in (phases or '1'))
+    return names
 
 def load123bus():
     dss.Command('ClearAll')
-    dss.Command("Redirect 'https://github.com/dgloves/DSS_Gymnasium/blob/main/123Bus/IEEE123Master.dss'")
+    dss.Command("Redirect '" + dss_path + "'")
     dss.Command('Set Loadmult=1.25')  # set load multiplier at 125%
     dss.Loads.Status(3)  # response to load mult = variable
     dss.Command('set ControlMode=OFF')  # disable voltage regulators, cap banks
@@ -28,17 +61,9 @@ def load123bus():
 
 
 def importPVData():
-    """load hourly PV output time series data from NSRD https://nsrdb.nrel.gov/"""
-    pv_data = pd.read_csv(data_path + r'\pv_profile_60min.csv', parse_dates=['LocalTime'], index_col=['LocalTime'])
-    pv_data = pv_data.resample("5min").asfreq()
-    pv_output = pv_data.interpolate(method='linear')
-    pv_output.drop(pv_output.tail(1).index, inplace=True)
-    data = pv_output['2006-04-01':'2006-04-30']  # slice 30 days of data April Central TX
-    data = data.reset_index(drop=True)
-    df = data.copy()
-    column = 'Power(kW)'
-    df[column] = df[column] / df[column].abs().max()
-    pv_time_series = df[["Power(kW)"]].to_numpy()
+    """load hourly PV output time series data from NSRD https://nsrdb.nrel.gov/ (resampled + normalized, cached)"""
+    pv_time_series = loadSeries(os.path.join(data_path, 'pv_profile_60min.csv'), resolution, date_start, date_end,
+                                columns=['Power(kW)'], normalize=True)
     return pv_time_series
 
 
@@ -60,15 +85,9 @@ def buildXYs():
     dss.XYCurves.YArray(eff_yarr)
 
 
-def resampleDF(df):
-    """ resample loadshapes and temperature curves to match time series"""
-    df['LocalTime'] = pd.to_datetime(df['LocalTime'])
-    df.set_index('LocalTime', inplace=True)
-    df = df.resample('5min').asfreq()
-    df = df.interpolate(method='linear')
-    df = df['2006-04-01':'2006-04-30']
-    df = df.reset_index(drop=True)
-    return df
+def resampleDF(csv_file):
+    """ resample loadshapes and temperature curves to match time series (cached after first call)"""
+    return loadSeries(os.path.join(data_path, csv_file), resolution, date_start, date_end)
 
 
 def assignLoadShapes():
@@ -90,51 +109,20 @@ def assignLoadShapes():
 
 
 def buildLoadshapes(pv_time_series):
-    loadshape1 = pd.read_csv(data_path + r'\Loadshape1.csv', parse_dates=True)
-    loadshape2 = pd.read_csv(data_path + r'\Loadshape2.csv', parse_dates=True)
-    loadshape3 = pd.read_csv(data_path + r'\Loadshape3.csv', parse_dates=True)
-
-    loadshape1_summer = resampleDF(loadshape1)
-    loadshape2_summer = resampleDF(loadshape2)
-    loadshape3_summer = resampleDF(loadshape3)
-
-    loadshape_1 = loadshape1_summer.to_numpy()
-    loadshape_2 = loadshape2_summer.to_numpy()
-    loadshape_3 = loadshape3_summer.to_numpy()
-
-    dss.Command('New Loadshape.lshape_1')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(loadshape_1)
-    dss.LoadShape.QMult(loadshape_1)
-
-    dss.Command('New Loadshape.lshape_2')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(loadshape_2)
-    dss.LoadShape.QMult(loadshape_2)
-
-    dss.Command('New Loadshape.lshape_3')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(loadshape_3)
-    dss.LoadShape.QMult(loadshape_3)
-
-    # PV loadshape
-    dss.Command('New Loadshape.irrad')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(pv_time_series)
+    loadshape_1 = resampleDF('LoadShape1.CSV')
+    loadshape_2 = resampleDF('LoadShape2.CSV')
+    loadshape_3 = resampleDF('LoadShape3.CSV')
+
+    newLoadshape('lshape_1', loadshape_1, loadshape_1, step_size)
+    newLoadshape('lshape_2', loadshape_2, loadshape_2, step_size)
+    newLoadshape('lshape_3', loadshape_3, loadshape_3, step_size)
+    newLoadshape('irrad', pv_time_series, minterval=step_size)  # PV loadshape
 
 
 # import weather temp for PV
 def buildTempCurves():
-    pv_temps_hourly_year = pd.read_csv(data_path + r'\dallas_tx_pv_temp_60min.csv', parse_dates=True)
-    pv_temp_summer = resampleDF(pv_temps_hourly_year)
-    pv_temp = pv_temp_summer.to_numpy()
-    pv_temp = np.transpose(pv_temp).tolist()
-    pv_temp = pv_temp[0]
-    return pv_temp
+    pv_temp = resampleDF('dallas_tx_pv_temp_60min.csv')
+    newTshape('Temp', pv_temp[:, 0], step_size)
 
 
 def buildPV():
@@ -161,16 +149,42 @@ def buildMonitors():
 
 
 
+def buildStream():
+    """
+    load, irradiance and temperature shapes of stream_steps points, refilled chunk by chunk from the whole
+    (memory-mapped) csv series while the solution time runs, see shape_stream.py
+    """
+    stream = ShapeStream(stream_steps, step_size)
+    for k in ('1', '2', '3'):
+        loadshape = loadSeries(os.path.join(data_path, 'LoadShape' + k + '.CSV'), resolution, stream_start, stream_end)
+        stream.addLoadshape('lshape_' + k, loadshape, loadshape)
+    stream.addLoadshape('irrad', loadSeries(os.path.join(data_path, 'pv_profile_60min.csv'), resolution, stream_start,
+                                            stream_end, columns=['Power(kW)'], normalize=True))
+    pv_temp = loadSeries(os.path.join(data_path, 'dallas_tx_pv_temp_60min.csv'), resolution, stream_start, stream_end)
+    stream.addTshape('Temp', pv_temp[:, 0])
+    stream.build()
+    return stream
+
+
 def run123busCircuit():
+    """build the circuit, returns the ShapeStream of streamed shapes (None with fixed date slice shapes)"""
+    if stream_steps is not None:
+        load123bus()
+        buildXYs()
+        stream = buildStream()
+        assignLoadShapes()
+        buildPV()
+        buildMonitors()
+        return stream
     pv_data = importPVData()
     load123bus()
     buildXYs()
     buildLoadshapes(pv_data)
     assignLoadShapes()
-    pv_temp = buildTempCurves()
-    dss.Command('New Tshape.Temp npts=8640 minterval=5 temp='+str(pv_temp))
+    buildTempCurves()
     buildPV()
     buildMonitors()
+    return None
 
 
 if __name__ == '__main__':
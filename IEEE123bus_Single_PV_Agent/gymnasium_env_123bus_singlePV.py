@@ -9,14 +9,26 @@ from gymnasium.spaces import Box, Discrete
 import opendssdirect as dss
 import numpy as np
 import os
-import random as rd
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root shared modules
+import dss_batch
+import dss_rewards
+from step_state import StepState, NodeVoltages
+from step_solver import StepSolver
 data_path = os.getcwd()
 
 
 class SinglePV_Agent(gym.Env):
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, warm_start=False, skip_unchanged=False, obs_mode='bus', obs_nodes=None):
+        """
+        :param warm_start: reset() reuses the compiled circuit and its last solution as initial guess (no rebuild)
+        :param skip_unchanged: no power flow for steps with the Q setpoint + multipliers of the last solve
+        :param obs_mode: 'bus' = bus 71 voltage, 'network' = p.u. voltage of every node (float32, one AllBusMagPu read)
+        :param obs_nodes: 'network' mode subset of node/bus names (i.e. ['71', '72.1']), None: all nodes
+        """
         super().__init__()
-        self.output_path = data_path + r'\data\train_agent_singlePV_123bus.csv'  # write to csv during step()
+        # folder of the recorded transition shards (dss_recorder.TransitionRecorder)
+        self.output_path = os.path.join(data_path, 'data', 'train_agent_singlePV_123bus')
 
         # dss direct cmds to subclass (optional)
         self.Bus = dss.Bus
@@ -37,8 +49,15 @@ class SinglePV_Agent(gym.Env):
         self.current_step = 1
         self.max_step = 2016  # set episodes at 24 hrs x 7 days: 5 min steps
         self.total_steps = 8640  # 30 days
+        self.stream = None  # ShapeStream of the circuit when its shapes are streamed (dss_circuit_123bus_singlePV)
+        self.warm_start = warm_start
+        self.compiled = False
+        self.solver = StepSolver(skip_unchanged)  # Solve() + FinishTimeStep() of a step, solve statistics for info
+        self.kvar_setpoint = None  # PV kVAR setpoint of the next solve
+        self.PV_kVAR_Setpoint_Start = None
         self.begin = True
         self.Terminated = False
+        self.state = StepState(bus=self.mybus, pv_name=self.mypv)  # bus 71 voltage + PV powers, read once per step
 
         # sim limits on voltage, reactive power limits (set on PVSystem)
         self.Vpu_max = 1.05
@@ -52,27 +71,53 @@ class SinglePV_Agent(gym.Env):
         # configure action and observation spaces
         # set action space to 44% kVA nameplate per unit
         self.action_space = Box(low=-1.0, high=1.0, shape=(1,), dtype=np.float64)
-        # local voltage measurement at bus 71
-        self.observation_space = Box(low=0.9, high=1.1, shape=(1,), dtype=np.float64)
+        self.obs_mode = obs_mode
+        if obs_mode == 'bus':
+            # local voltage measurement at bus 71
+            self.observation_space = Box(low=0.9, high=1.1, shape=(1,), dtype=np.float64)
+        elif obs_mode == 'network':
+            # node voltages of the whole network, sized from the feeder node list (circuit compiled by reset())
+            self.network = NodeVoltages(obs_nodes, circuit_nodes=dss_circuit_123bus_singlePV.nodeNames())
+            self.state.addReader('node_vpu', self.network.read)
+            self.observation_space = Box(low=0.9, high=1.1, shape=(self.network.size,), dtype=np.float32)
+        else:
+            raise ValueError("obs_mode must be 'bus' or 'network', got %r" % obs_mode)
 
 
     # dss solve params
     def sysFlatStart(self):
-        dss_circuit_123bus_singlePV.run123busCircuit()
+        self.stream = dss_circuit_123bus_singlePV.run123busCircuit()
 
 
-    def setSolutionParams(self):
+    def setSolutionParams(self, voltage_bases=True):
         """ set voltage bases for circuit and apply random seed to episode starting point"""
-        self.Command('Set voltagebases=[4.16 0.48]')
-        self.Command('calc')
+        if voltage_bases:
+            self.Command('Set voltagebases=[4.16 0.48]')
+            self.Command('calc')
         self.Command('Set mode=daily number=1')
         self.Solution.StepSizeMin(5)
-        starting_point = rd.randint(0, self.total_steps - self.max_step)  # randomize starting point
+        if self.stream is not None:
+            # any point of the streamed series (whole year), episode inside it: 2 solution steps per env step
+            starting_point = int(self.np_random.integers(0, self.stream.total_steps - 2 * self.max_step + 1))
+            print('starting_5min_point:', starting_point)
+            self.stream.seek(starting_point)
+            return starting_point
+        starting_point = int(self.np_random.integers(0, self.total_steps - self.max_step + 1))  # randomize starting point
         print('starting_5min_point:', starting_point)
         self.Command('Set hour=' + str(starting_point))
         return starting_point
 
 
+    def restoreState(self):
+        """warm start: put back PV setpoint, monitors, control queue of the compiled circuit, keep its last solution"""
+        self.PVsystems.Name(self.mypv)
+        self.PVsystems.kvar(self.PV_kVAR_Setpoint_Start)
+        self.kvar_setpoint = self.PV_kVAR_Setpoint_Start
+        dss.Monitors.ResetAll()
+        dss.CtrlQueue.ClearQueue()
+        self.setSolutionParams(voltage_bases=False)  # calc would solve at zero load
+
+
     # observations
     def obsBusV(self):
         self.Circuit.SetActiveBus(self.mybus)
@@ -90,6 +135,13 @@ class SinglePV_Agent(gym.Env):
         return s, p, q, ppu, qpu  # return PV system powers on PV rating base (NOT SYSTEM BASE!!)
 
 
+    def observe(self, state):
+        """observation of the state snapshot: bus 71 voltage or node voltages (obs_mode)"""
+        if self.obs_mode == 'network':
+            return state.node_vpu
+        return np.array([state.vpu]).flatten()
+
+
     def get_info(self, p, q):
         """ add any relavant observable local data - pv71 powers"""
         return {"real_power": p, "reactive_power": q}
@@ -98,47 +150,38 @@ class SinglePV_Agent(gym.Env):
     def applyQSetpoint(self, action):
         self.PVsystems.Name(self.mypv)
         s = self.PVsystems.kVARated()
-        qpu = action * s  # take pu of nameplate
+        qpu = float(np.ravel(action)[0]) * s  # take pu of nameplate (Box(1,) action)
         self.PVsystems.kvar(qpu)
+        self.kvar_setpoint = qpu
 
 
     # reward function(s)
     def checkQNameplate(self, s, p, q):
         """validate available Q_pv """
-        qlim = np.sqrt(s**2 - p**2)
-        penalty = 0 if abs(q) <= abs(qlim) else -1
-        return penalty
+        return float(dss_rewards.qNameplate(s, p, q))
 
 
     def checkQ1547(self, s, q):
         """validate Q_pv IEEE 1547 limits"""
-        qlim = 0.44 * s
-        penalty = 0 if abs(q) <= abs(qlim) else -1 * ((q - qlim)**2)
+        penalty = float(dss_rewards.q1547(s, q))
         if penalty < 0:
             self.q_violation_count += 1
-        else:
-            pass
         return penalty
 
 
     def checkBusVoltage(self):
         """check for voltage deviation from 1pu + penalty for operational violation"""
-        vbus = self.obsBusV()
-        dev_penalty = -1 * ((vbus - 1)**2)
-        if vbus > 1.05 or vbus < 0.95:
-            vlim_penalty = -1
+        vbus = self.state.vpu
+        if dss_rewards.voltageViolations(vbus):
             self.voltage_violation_count += 1
-        else:
-            vlim_penalty = 0
-        penalty = dev_penalty + vlim_penalty
-        return penalty
+        return float(dss_rewards.voltageDeviation(vbus) + dss_rewards.voltageBand(vbus))
 
 
     def reward(self):
-        """voltage deviation + operational voltage violation + pv_nameplate_check"""
-        s, p, q, ppv_pu, qpv_pu = self.obsPVSysPowers()
-        nameplate_penalty = self.checkQNameplate(s, p, q)
-        stds_penalty = self.checkQ1547(s, q)
+        """voltage deviation + operational voltage violation + pv_nameplate_check (measurements of self.state)"""
+        state = self.state
+        nameplate_penalty = self.checkQNameplate(state.s, state.p, state.q)
+        stds_penalty = self.checkQ1547(state.s, state.q)
         voltage_penalty = self.checkBusVoltage()
         reward = nameplate_penalty + stds_penalty + voltage_penalty
         return reward
@@ -146,11 +189,11 @@ class SinglePV_Agent(gym.Env):
 
     def step(self, action):
         self.applyQSetpoint(action)
-        self.Solution.Solve()
-        self.Solution.FinishTimeStep()
-        obs = np.array([self.obsBusV()]).flatten()
-        s, p, q, ppv_pu, qpv_pu = self.obsPVSysPowers()
-        info = self.get_info(ppv_pu, qpv_pu)  # pv power p.u. to dict
+        solve_info = self.solver.solve(self.kvar_setpoint)  # (streamed shapes) + Solve() + FinishTimeStep()
+        state = self.state.update()
+        obs = self.observe(state)
+        info = self.get_info(*state.powersPu(5))  # pv power p.u. to dict
+        info.update(solve_info)  # iterations, control_iterations, converged, solve_skipped
         reward = self.reward()
         if self.current_step == self.max_step:
             self.Terminated = True
@@ -160,13 +203,53 @@ class SinglePV_Agent(gym.Env):
         return obs, reward, self.Terminated, False, info  # no truncation
 
 
+    def runSchedule(self, actions):
+        """
+        open-loop evaluation of a precomputed action array (Q setpoint p.u. of nameplate per step, i.e. rule-based
+        baseline) from the reset() state, solved as one daily-mode batch run instead of a step() loop (see dss_batch.py)
+        ** ends the episode, reset() before stepping again (obs_mode='bus' only: bus 71 monitor) **
+        :param actions: Q setpoint p.u. of every step (up to max_step values)
+        :return: observations (steps x 1), rewards, info dict of arrays (pv power p.u. per step)
+        """
+        if self.obs_mode == 'network':
+            raise ValueError("runSchedule() observes the bus 71 monitor only, use step() with obs_mode='network'")
+        actions = np.asarray(actions, dtype=np.float64).flatten()[:self.max_step - self.current_step + 1]
+        self.PVsystems.Name(self.mypv)
+        s = self.PVsystems.kVARated()
+        vpu, p, q = dss_batch.solveSchedule(self.mypv, actions * s, 'Bus71_voltage', 'PV_sys_power', self.mybus,
+                                            stream=self.stream)
+        # reward() terms per step: nameplate + IEEE 1547 + voltage deviation/violation
+        nameplate_penalty = dss_rewards.qNameplate(s, p, q)
+        stds_penalty = dss_rewards.q1547(s, q)
+        self.q_violation_count += int(np.count_nonzero(stds_penalty < 0))
+        self.voltage_violation_count += int(np.count_nonzero(dss_rewards.voltageViolations(vpu)))
+        voltage_penalty = dss_rewards.voltageDeviation(vpu) + dss_rewards.voltageBand(vpu)
+        rewards = nameplate_penalty + stds_penalty + voltage_penalty
+        info = self.get_info(np.round(p / s, 5), np.round(q / s, 5))  # measured pv terminal power p.u.
+        self.current_step += len(actions) - 1
+        self.Terminated = True
+        return vpu.reshape(-1, 1), rewards, info
+
+
     def reset(self, seed=None, options=None):
+        super().reset(seed=seed)  # seeds self.np_random (episode starting point)
         print('Resetting DSS environment')
-        self.sysFlatStart()
-        self.setSolutionParams()
-        obs = np.array([self.obsBusV()]).flatten()
-        s, p, q, ppv_pu, qpv_pu = self.obsPVSysPowers()
-        info = self.get_info(ppv_pu, qpv_pu)
+        if self.warm_start and self.compiled:
+            self.restoreState()  # observation of the last solution
+            state = self.state.update()
+            state.q = self.PV_kVAR_Setpoint_Start  # PV setpoint is only read back after a solve
+        else:
+            self.sysFlatStart()
+            self.setSolutionParams()
+            self.solver.bind(self.stream)
+            if self.obs_mode == 'network':
+                self.network.bind()  # node order of the new build
+            self.compiled = True
+            state = self.state.update()
+            self.PV_kVAR_Setpoint_Start = state.q
+        self.solver.reset()
+        obs = self.observe(state)
+        info = self.get_info(*state.powersPu(5))
         self.current_step = 0
         self.Terminated = False
         self.begin = True
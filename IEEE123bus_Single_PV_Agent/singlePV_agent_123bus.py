@@ -1,4 +1,3 @@
-
 #%%
 """import Stable Baselines3 DRL algo Advantage Actor-Critic with MLP policy for agent training
 """
@@ -7,28 +6,44 @@ from stable_baselines3 import A2C
 from stable_baselines3.common.logger import configure
 from stable_baselines3.common.env_checker import check_env
 import os
+import sys
+sys.path.append(os.path.dirname(os.getcwd()))  # repo root shared modules
+from dss_vec_env import make_dss_vec_env
+from dss_recorder import TransitionRecorder
 log_path = os.getcwd() + r'\a2c_singlePV_agent'
-new_logger = configure(log_path, ["stdout", "csv", "tensorboard"])  # save progress metrics
-
-# environment check (uncomment to run test)
-my_env = SinglePV_Agent()
-# check_env(my_env, warn=True)
+num_envs = 4  # parallel training envs, one OpenDSS engine (process) each; 1 = single env in this process
+# keep every transition for offline RL (dss_recorder.py), i.e. os.path.join(os.getcwd(), 'data', 'transitions')
+record_path = None
 
 # NN hyperparameters
 timesteps = 100800   # 2016 steps x 50 episodes
 lr = 0.00005
 gamma = 0.989
-# select Actor-Critic algo
-model = A2C('MlpPolicy', env=my_env, gamma=gamma, learning_rate=lr, tensorboard_log=log_path, verbose=1)
-model.set_logger(new_logger)
 
-# train agent
-model.learn(total_timesteps=timesteps, progress_bar=True)
-print('model training complete')
-new_logger.close()
-## check after training before saving
-# save trained model
-print('saving trained agent')
-model.save(log_path + r'/a2c.zip')
-print('model saved in local path, enjoy trained agent!')
+if __name__ == '__main__':  # required for worker processes
+    new_logger = configure(log_path, ["stdout", "csv", "tensorboard"])  # save progress metrics
+
+    # environment check (uncomment to run test)
+    # check_env(SinglePV_Agent(), warn=True)
+    # seeds randomize the episode starting point of each worker independently
+    if num_envs > 1:
+        my_env = make_dss_vec_env(SinglePV_Agent, n_envs=num_envs, seeds=0, record_dir=record_path)
+    else:
+        my_env = SinglePV_Agent()
+        if record_path is not None:
+            my_env = TransitionRecorder(my_env, record_path)
+
+    # select Actor-Critic algo
+    model = A2C('MlpPolicy', env=my_env, gamma=gamma, learning_rate=lr, tensorboard_log=log_path, verbose=1)
+    model.set_logger(new_logger)
 
+    # train agent
+    model.learn(total_timesteps=timesteps, progress_bar=True)
+    print('model training complete')
+    new_logger.close()
+    ## check after training before saving
+    # save trained model
+    print('saving trained agent')
+    model.save(log_path + r'/a2c.zip')
+    print('model saved in local path, enjoy trained agent!')
+    my_env.close()
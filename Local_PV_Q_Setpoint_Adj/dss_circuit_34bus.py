@@ -4,10 +4,14 @@ ieee 34bus test system with single PV system
 single DER, local voltage regulation via reactive power setpoint manipulation (no droop)
 """
 
-import pandas as pd
 import numpy as np
 from opendssdirect import dss
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root shared modules
+from timeseries_cache import loadSeries
+from dss_shapes import newLoadshape, newTshape
+from shape_stream import ShapeStream
 
 # data_path = os.getcwd()  # local dir
 dss_path = r'C:\Users\dglov\OneDrive\Desktop\OpenDSS\34Bus\ieee34Mod1.dss'
@@ -17,28 +21,28 @@ num_steps = 8640  # 60 days (5760), 90 days 8640
 step_size = 15  # 15 min
 Sbase = 1e6
 num_pvs = 1
+resolution = '15min'
+date_start = '2006-06-01'  # slice 90 days of data June-Aug Central TX
+date_end = '2006-08-29'
+
+# streamed shapes (optional): full csv series [stream_start:stream_end] fed into the circuit stream_steps points at a time
+stream_steps = None  # i.e. 2016 = 1 week of 5 min steps, None: fixed shapes of the date slice above
+stream_start = None  # None: from the first / to the last point of the csv files (full or multi-year data)
+stream_end = None
 
 
 def load34bus():
     dss.Command('ClearAll')
-    dss.Command("Redirect 'C:\\Users\\dglov\\OneDrive\\Desktop\\OpenDSS\\34Bus\\ieee34Mod1.dss'")
+    dss.Command("Redirect '" + dss_path + "'")
     dss.Loads.Status(3)  # response to load mult = variable
     dss.Command('set ControlMode=OFF')  # disable voltage regulators for flexibility
     dss.Command('solve')
 
 
 def importPVData():
-    """load hourly PV output time series data from NSRD https://nsrdb.nrel.gov/"""
-    pv_data = pd.read_csv(data_path + r'\pv_profile_60min.csv', parse_dates=['LocalTime'], index_col=['LocalTime'])
-    pv_data = pv_data.resample("15min").asfreq()
-    pv_output = pv_data.interpolate(method='linear')
-    pv_output.drop(pv_output.tail(1).index, inplace=True)
-    data = pv_output['2006-06-01':'2006-08-29']  # slice 90 days of data June-Aug Central TX
-    data = data.reset_index(drop=True)
-    df = data.copy()
-    column = 'Power(kW)'
-    df[column] = df[column] / df[column].abs().max()
-    pv_time_series = df[["Power(kW)"]].to_numpy()
+    """load hourly PV output time series data from NSRD https://nsrdb.nrel.gov/ (resampled + normalized, cached)"""
+    pv_time_series = loadSeries(os.path.join(data_path, 'pv_profile_60min.csv'), resolution, date_start, date_end,
+                                columns=['Power(kW)'], normalize=True)
     return pv_time_series
 
 
@@ -60,15 +64,9 @@ def buildXYs():
     dss.XYCurves.YArray(eff_yarr)
 
 
-def resampleDF(df):
-    """ resample loadshapes and temperature curves to match time series"""
-    df['LocalTime'] = pd.to_datetime(df['LocalTime'])
-    df.set_index('LocalTime', inplace=True)
-    df = df.resample('15min').asfreq()
-    df = df.interpolate(method='linear')
-    df = df['2006-06-01':'2006-08-29']
-    df = df.reset_index(drop=True)
-    return df
+def resampleDF(csv_file):
+    """ resample loadshapes and temperature curves to match time series (cached after first call)"""
+    return loadSeries(os.path.join(data_path, csv_file), resolution, date_start, date_end)
 
 
 def assignLoadShapes():
@@ -90,51 +88,20 @@ def assignLoadShapes():
 
 
 def buildLoadshapes(pv_time_series):
-    loadshape1 = pd.read_csv(data_path + r'\Loadshape1.csv', parse_dates=True)
-    loadshape2 = pd.read_csv(data_path + r'\Loadshape2.csv', parse_dates=True)
-    loadshape3 = pd.read_csv(data_path + r'\Loadshape3.csv', parse_dates=True)
-
-    loadshape1_summer = resampleDF(loadshape1)
-    loadshape2_summer = resampleDF(loadshape2)
-    loadshape3_summer = resampleDF(loadshape3)
-
-    loadshape_1 = loadshape1_summer.to_numpy()
-    loadshape_2 = loadshape2_summer.to_numpy()
-    loadshape_3 = loadshape3_summer.to_numpy()
-
-    dss.Command('New Loadshape.lshape_1')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(loadshape_1)
-    dss.LoadShape.QMult(loadshape_1)
-
-    dss.Command('New Loadshape.lshape_2')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(loadshape_2)
-    dss.LoadShape.QMult(loadshape_2)
-
-    dss.Command('New Loadshape.lshape_3')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(loadshape_3)
-    dss.LoadShape.QMult(loadshape_3)
-
-    # PV loadshape
-    dss.Command('New Loadshape.irrad')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(pv_time_series)
+    loadshape_1 = resampleDF('LoadShape1.CSV')
+    loadshape_2 = resampleDF('LoadShape2.CSV')
+    loadshape_3 = resampleDF('LoadShape3.CSV')
+
+    newLoadshape('lshape_1', loadshape_1, loadshape_1, step_size)
+    newLoadshape('lshape_2', loadshape_2, loadshape_2, step_size)
+    newLoadshape('lshape_3', loadshape_3, loadshape_3, step_size)
+    newLoadshape('irrad', pv_time_series, minterval=step_size)  # PV loadshape
 
 
 # import weather temp for PV
 def buildTempCurves():
-    pv_temps_hourly_year = pd.read_csv(data_path + r'\dallas_tx_pv_temp_60min.csv', parse_dates=True)
-    pv_temp_summer = resampleDF(pv_temps_hourly_year)
-    pv_temp = pv_temp_summer.to_numpy()
-    pv_temp = np.transpose(pv_temp).tolist()
-    pv_temp = pv_temp[0]
-    return pv_temp
+    pv_temp = resampleDF('dallas_tx_pv_temp_60min.csv')
+    newTshape('Temp', pv_temp[:, 0], step_size)
 
 
 def buildPV():  # match load pf, set reactive power limit = 44% * Srated
@@ -161,16 +128,42 @@ def buildMonitors():
 
 
 
+def buildStream():
+    """
+    load, irradiance and temperature shapes of stream_steps points, refilled chunk by chunk from the whole
+    (memory-mapped) csv series while the solution time runs, see shape_stream.py
+    """
+    stream = ShapeStream(stream_steps, step_size)
+    for k in ('1', '2', '3'):
+        loadshape = loadSeries(os.path.join(data_path, 'LoadShape' + k + '.CSV'), resolution, stream_start, stream_end)
+        stream.addLoadshape('lshape_' + k, loadshape, loadshape)
+    stream.addLoadshape('irrad', loadSeries(os.path.join(data_path, 'pv_profile_60min.csv'), resolution, stream_start,
+                                            stream_end, columns=['Power(kW)'], normalize=True))
+    pv_temp = loadSeries(os.path.join(data_path, 'dallas_tx_pv_temp_60min.csv'), resolution, stream_start, stream_end)
+    stream.addTshape('Temp', pv_temp[:, 0])
+    stream.build()
+    return stream
+
+
 def run34busCircuit():
+    """build the circuit, returns the ShapeStream of streamed shapes (None with fixed date slice shapes)"""
+    if stream_steps is not None:
+        load34bus()
+        buildXYs()
+        stream = buildStream()
+        assignLoadShapes()
+        buildPV()
+        buildMonitors()
+        return stream
     pv_data = importPVData()
     load34bus()
     buildXYs()
     buildLoadshapes(pv_data)
     assignLoadShapes()
-    pv_temp = buildTempCurves()
-    dss.Command('New Tshape.Temp npts=8640 minterval=15 temp='+str(pv_temp))
+    buildTempCurves()
     buildPV()
     buildMonitors()
+    return None
 
 
 if __name__ == '__main__':
@@ -10,13 +10,24 @@ import numpy as np
 import pandas as pd
 import csv
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root shared modules
+import dss_batch
+import dss_rewards
+from step_state import StepState
+from step_solver import StepSolver
 data_path = os.getcwd()
 
 
 class LocalPV_Agent(gym.Env):
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, warm_start=False, skip_unchanged=False):
+        """
+        :param warm_start: reset() keeps the last solution as initial guess (no re-seed solve of the compiled circuit)
+        :param skip_unchanged: no power flow for steps with the kVAR setpoint + multipliers of the last solve
+        """
         super().__init__()
-        self.output_path = data_path + r'\data\train_agent_DQN.csv'
+        # folder of the recorded transition shards (dss_recorder.TransitionRecorder)
+        self.output_path = os.path.join(data_path, 'data', 'train_agent_DQN')
 
         # dss direct cmds to subclass (optional)
         self.Bus = dss.Bus
@@ -37,6 +48,15 @@ class LocalPV_Agent(gym.Env):
         self.max_step = 8640
         self.begin = True
         self.Terminated = False
+        self.compiled = False  # circuit is built on first reset(), later resets restore state only
+        self.reset_obs = None
+        self.reset_info = None
+        self.last_vpu = None  # PCC voltage of last observation, used to size kVAR adjustments
+        self.state = StepState(bus=self.mybus, pv_name=self.mypv)  # PCC voltage + PV powers, read once per step
+        self.stream = None  # ShapeStream of the circuit when its shapes are streamed (dss_circuit_34bus)
+        self.warm_start = warm_start
+        self.solver = StepSolver(skip_unchanged)  # Solve() + FinishTimeStep() of a step, solve statistics for info
+        self.kvar_setpoint = None  # PV kVAR setpoint of the next solve
 
         # sim limits on voltage, reactive power limits (set on PVSystem)
         self.Vpu_max = 1.05
@@ -46,7 +66,7 @@ class LocalPV_Agent(gym.Env):
         self.q_violation_count = 0
         self.Qpv_llim = -242.0
         self.Qpv_ulim = 242.0
-        # self.PV_kVAR_Setpoint_Start = self.PVsystems.kvar()
+        self.PV_kVAR_Setpoint_Start = 0.0
 
         # configure action and observation spaces
         self.actions = np.array([0,1,2])  # 0 = do nothing, 1 = lower kVAR setpoint, 2 = raise kVAR setpoint
@@ -58,17 +78,49 @@ class LocalPV_Agent(gym.Env):
 
     # dss solve params
     def sysFlatStart(self):
-        dss_circuit_34bus.run34busCircuit()
+        self.stream = dss_circuit_34bus.run34busCircuit()
 
 
-    def setSolutionParams(self):
-        self.Command('Set voltagebases=[69.0 24.9 4.16 0.48]')
-        self.Command('calc')
+    def setSolutionParams(self, voltage_bases=True):
+        if voltage_bases:
+            self.Command('Set voltagebases=[69.0 24.9 4.16 0.48]')
+            self.Command('calc')
         self.Command('Set mode=daily number=1')
         self.Solution.StepSizeMin(15)
         self.Command('Set hour=0')
 
 
+    def snapshotState(self):
+        """store mutable circuit state + initial observation after the first circuit build"""
+        state = self.state.update()
+        self.PV_kVAR_Setpoint_Start = state.q
+        self.kvar_setpoint = state.q
+        self.reset_obs = np.array([state.vpu]).flatten()
+        self.reset_info = self.get_info(*state.powersPu(3))
+        self.compiled = True
+
+
+    def restoreState(self):
+        """put back mutable state of the compiled circuit: PV setpoint, monitors, control queue, solution hour"""
+        self.PVSystemReset()
+        dss.Monitors.ResetAll()
+        dss.CtrlQueue.ClearQueue()
+        if self.warm_start:
+            # keep the last solution as initial guess of the first step (calc would solve at zero load)
+            self.setSolutionParams(voltage_bases=False)
+            self.state.update()
+            self.state.q = self.PV_kVAR_Setpoint_Start  # PV setpoint is only read back after a solve
+            return
+        # re-seed the solution with the snapshot solve (no PV, controls off) done when the circuit is built
+        self.Command('Set mode=snapshot')
+        self.Command('set ControlMode=OFF')
+        self.Command('PVSystem.' + self.mypv + '.enabled=no')
+        self.Command('solve')
+        self.Command('PVSystem.' + self.mypv + '.enabled=yes')
+        self.setSolutionParams()
+        self.state.update()  # PV setpoint is read back after a solve
+
+
     # observations
     def obsBusV(self):
         self.Circuit.SetActiveBus(self.mybus)
@@ -93,12 +145,13 @@ class LocalPV_Agent(gym.Env):
     # Apply actions
     def PVSystemReset(self):
         kvar_setpoint = self.PV_kVAR_Setpoint_Start
-        self.Circuit.SetActiveElement('PVSystem.pv890')
+        self.PVsystems.Name(self.mypv)
         self.PVsystems.kvar(kvar_setpoint)
+        self.kvar_setpoint = kvar_setpoint
 
 
     def applyAction(self, action):
-        vpu = self.Bus.PuVoltage()[0]
+        vpu = self.last_vpu
         if action == 0:
             pass
         elif action == 1:self.lowerkVAR(vpu)
@@ -106,58 +159,50 @@ class LocalPV_Agent(gym.Env):
 
 
     def lowerkVAR(self, Vpu):
-        self.PVsystems.Name(self.mypv)
-        current_setpoint = self.PVsystems.kvar()
+        current_setpoint = self.state.q  # setpoint of the last solve
         kVAR = (abs(Vpu - 1)) * 100
         new_setpoint = current_setpoint - kVAR
+        self.PVsystems.Name(self.mypv)
         self.PVsystems.kvar(new_setpoint)
+        self.kvar_setpoint = new_setpoint
 
 
     def raisekVAR(self, Vpu):
-        self.PVsystems.Name(self.mypv)
-        current_setpoint = self.PVsystems.kvar()
+        current_setpoint = self.state.q  # setpoint of the last solve
         kVAR = (abs(Vpu - 1)) * 100
         new_setpoint = current_setpoint + kVAR
+        self.PVsystems.Name(self.mypv)
         self.PVsystems.kvar(new_setpoint)
+        self.kvar_setpoint = new_setpoint
 
 
     # reward function(s)
     def checkQNameplate(self, s, p, q):
         """validate available Q_pv """
-        qlim = np.sqrt(s**2 - p**2)
-        penalty = 0 if abs(q) <= abs(qlim) else -1
-        return penalty
+        return float(dss_rewards.qNameplate(s, p, q))
 
 
     def checkQ1547(self, s, q):
         """validate Q_pv IEEE 1547 limits"""
-        qlim = 0.44 * s
-        penalty = 0 if abs(q) <= abs(qlim) else -1 * ((q - qlim)**2)
+        penalty = float(dss_rewards.q1547(s, q))
         if penalty < 0:
             self.q_violation_count += 1
-        else:
-            pass
         return penalty
 
 
     def checkBusVoltage(self, bus):
         """validate operational voltage limits"""
-        vbus = self.obsBusV()
-        dev_penalty = -1 * ((vbus - 1)**2)
-        if vbus > 1.05 or vbus < 0.95:
-            vlim_penalty = -1
+        vbus = self.state.vpu
+        if dss_rewards.voltageViolations(vbus):
             self.voltage_violation_count += 1
-        else:
-            vlim_penalty = 0
-        penalty = dev_penalty + vlim_penalty
-        return penalty
+        return float(dss_rewards.voltageDeviation(vbus) + dss_rewards.voltageBand(vbus))
 
 
     def reward(self):
-        """constraints with penalty-based reward"""
-        s, p, q, ppv_pu, qpv_pu = self.obsPVSysPowers()
-        nameplate_penalty = self.checkQNameplate(s, p, q)
-        stds_penalty = self.checkQ1547(s, q)
+        """constraints with penalty-based reward (measurements of self.state)"""
+        state = self.state
+        nameplate_penalty = self.checkQNameplate(state.s, state.p, state.q)
+        stds_penalty = self.checkQ1547(state.s, state.q)
         voltage_penalty = self.checkBusVoltage(self.mybus)
         # reward = nameplate_penalty + stds_penalty + voltage_penalty
         reward = voltage_penalty  # voltage reg only
@@ -166,11 +211,12 @@ class LocalPV_Agent(gym.Env):
 
     def step(self, action):
         self.applyAction(action)
-        self.Solution.Solve()
-        self.Solution.FinishTimeStep()
-        obs = np.array([self.obsBusV()]).flatten()
-        s, p, q, ppv_pu, qpv_pu = self.obsPVSysPowers()
-        info = self.get_info(ppv_pu, qpv_pu)  # pv power p.u. to dict
+        solve_info = self.solver.solve(self.kvar_setpoint)  # (streamed shapes) + Solve() + FinishTimeStep()
+        state = self.state.update()
+        obs = np.array([state.vpu]).flatten()
+        self.last_vpu = obs[0]
+        info = self.get_info(*state.powersPu(3))  # pv power p.u. to dict
+        info.update(solve_info)  # iterations, control_iterations, converged, solve_skipped
         reward = self.reward()
         if self.current_step == self.max_step:
             self.Terminated = True
@@ -180,13 +226,49 @@ class LocalPV_Agent(gym.Env):
         return obs, reward, self.Terminated, False, info  # no truncation
 
 
+    def runSchedule(self, kvar_schedule):
+        """
+        open-loop evaluation of a precomputed PV kVAR setpoint schedule (i.e. rule-based baseline) from the reset()
+        state, solved as one daily-mode batch run instead of a step() loop (see dss_batch.py)
+        ** ends the episode, reset() before stepping again **
+        :param kvar_schedule: PV kVAR setpoint of every step (up to max_step values)
+        :return: observations (steps x 1), rewards, info dict of arrays (pv power p.u. per step)
+        """
+        kvar_schedule = np.asarray(kvar_schedule, dtype=np.float64).flatten()[:self.max_step - self.current_step + 1]
+        vpu, p, q = dss_batch.solveSchedule(self.mypv, kvar_schedule, 'Bus890_voltage', 'PV_sys_power', self.mybus,
+                                            stream=self.stream)
+        self.PVsystems.Name(self.mypv)
+        s = self.PVsystems.kVARated()
+        # reward() terms per step, voltage reg only
+        self.q_violation_count += int(np.count_nonzero(dss_rewards.q1547(s, q) < 0))
+        self.voltage_violation_count += int(np.count_nonzero(dss_rewards.voltageViolations(vpu)))
+        rewards = dss_rewards.voltageDeviation(vpu) + dss_rewards.voltageBand(vpu)
+        info = self.get_info(np.round(p / s, 3), np.round(q / s, 3))  # measured pv terminal power p.u.
+        self.current_step += len(kvar_schedule) - 1
+        self.last_vpu = vpu[-1]
+        self.Terminated = True
+        return vpu.reshape(-1, 1), rewards, info
+
+
     def reset(self, seed=None, options=None):
+        """
+        build the circuit on the first call (or with options={'rebuild': True}), otherwise restore the
+        compiled circuit to its initial state without re-reading data or recompiling
+        """
+        super().reset(seed=seed)
         print('Resetting DSS environment')
-        self.sysFlatStart()
-        self.setSolutionParams()
-        obs = np.array([self.obsBusV()]).flatten()
-        s, p, q, ppv_pu, qpv_pu = self.obsPVSysPowers()
-        info = self.get_info(ppv_pu, qpv_pu)
+        rebuild = options is not None and options.get('rebuild', False)
+        if rebuild or not self.compiled:
+            self.sysFlatStart()
+            self.setSolutionParams()
+            self.snapshotState()
+            self.solver.bind(self.stream)
+        else:
+            self.restoreState()
+        self.solver.reset()
+        obs = self.reset_obs.copy()
+        info = dict(self.reset_info)
+        self.last_vpu = obs[0]
         self.current_step = 0
         self.Terminated = False
         self.begin = True
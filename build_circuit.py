@@ -5,12 +5,16 @@ Next, you may customize the circuit by adding components:
 --> add internal DSS controls to devices and objects
 --> add topology reconfigurations
 --> add additional real data (loadshapes, DER profiles, etc.)
+The circuit is declared in circuit_spec (circuit file, XY curves, loadshapes, DERs, monitors) and built lazily by
+LazyCircuit: a component is only created when an observation or action needs it (ensure()), after the components it
+depends on.  OpenDSSDirect and pandas are imported by the first build, so processes that only need the spaces
+(check_env of the spaces, policy loading, evaluation servers) neither load the DSS engine nor compile the circuit:
+--> spaces: size them from the spec (circuit.numDERs()), nothing is built
+--> reset: circuit.reset() + circuit.ensure('ders') recompiles the circuit with the components the env uses
+--> runCircuit() builds every component of the spec (eager build)
 ** Change all template file paths to correct paths on local machine **
 """
 
-from opendssdirect import dss
-import pandas as pd
-import numpy as np
 import os
 
 # set path to import additional time series profile data, profiles, and OpenDSS circuit file(s)
@@ -19,17 +23,43 @@ data_path = r'C:\Users\path\to\time_series_data\data.csv'  # change to correct p
 num_steps = 24  # 24 steps in simulation
 step_size = 60  # hourly step
 
-
-def loadcircuit():
+# declarative circuit, one entry per component (read by the build functions below)
+circuit_spec = {
+    'circuit': {'path': 'C:/Users/path/to/openDSS/Circuit_Master_file.dss',  # change to correct path
+                'control_mode': 'OFF'},  # disable or enable all default controls
+    # XY curves: name -> (x values, y values), i.e. PV efficiency curve (all PVs)
+    'xycurves': {'DER_eff': ([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0],
+                             [0.75, 0.78, 0.8, 0.83, 0.86, 0.89, 0.93, 0.95, 0.97, 1.0])},
+    # loadshapes: name -> csv file in data_path (num_steps rows of multipliers)
+    'loadshapes': {'myloadshape': 'Loadshape1.csv'},
+    # DERs: element -> DSS properties.  No inverter control implemented with THIS PV System
+    'ders': {'PVSystem.myPV': 'phases=3 bus1=bus_number kV=4.16 kVA=100 irradiance=1 Pmpp=95 conn=delta'
+                              ' temperature=25 effcurve=DER_eff P-TCurve=myPT Daily=irrad TDaily=myTemp'
+                              ' %cutin=0.01 %cutout=0.01 kvarMax=44 kvarMaxAbs=44'},
+    # monitors: element class -> monitor mode, one monitor per element (terminal 1), 1 = powers (all phases)
+    'monitors': {'Load': 1},
+}
+
+# component -> (build function, components built before it)
+components = {'circuit': ('loadcircuit', ()),
+              'xycurves': ('buildXYCurves', ('circuit',)),
+              'loadshapes': ('buildLoadshape', ('circuit',)),
+              'ders': ('buildDERs', ('xycurves', 'loadshapes')),
+              'monitors': ('buildMonitors', ('circuit',))}
+
+
+def loadcircuit(spec):
     """load desired IEEE circuit from dss file, set basic params"""
+    from opendssdirect import dss
     dss.Command('ClearAll')  # clears dss cache
-    dss.Command("Redirect 'C:/Users/path/to/openDSS/Circuit_Master_file.dss'")  # change to correct path
-    dss.Command('set ControlMode=OFF')  # disable or enable all default controls
+    dss.Command("Redirect '" + spec['circuit']['path'] + "'")
+    dss.Command('set ControlMode=' + spec['circuit']['control_mode'])
     dss.Command('solve')  # get ss power flow of circuit
 
 
 def importdata():
     """import additional data from csv or text file i.e load curves, PV irradiance/temp data, Wind output, etc"""
+    import pandas as pd
     mydata = pd.read_csv(data_path + r'\data.csv')
     mydata = mydata.reset_index(drop=True)  # convert time series idx
     column = 'Output'
@@ -39,63 +69,91 @@ def importdata():
 
 
 """
-Add helper functions to build additional circuit components using the imported data, such as:
+Add helper functions to build additional circuit components from the spec and the imported data, such as:
 -->  XY curves
 -->  Loadshapes
 -->  DERs
 -->  Monitors
 """
 
-def buildXYCurves():
+def buildXYCurves(spec):
     """ Add custom XY curves for temperature, efficiency, volt-VAR control, etc. See DSS manual for further info """
-    # PV efficiency curve (all PVs)
-    dss.Command('New XYCurve.DER_eff')
-    eff_xarr = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
-    eff_yarr = np.array([0.75, 0.78, 0.8, 0.83, 0.86, 0.89, 0.93, 0.95, 0.97, 1.0])
-    dss.XYCurves.Npts(10)
-    dss.XYCurves.XArray(eff_xarr)
-    dss.XYCurves.YArray(eff_yarr)
-
-
-def buildLoadshape():
-    """ add new loadshape to system """
-    loadshape1 = pd.read_csv(data_path + r'\Loadshape1.csv', parse_dates=True)
-    loadshape_1 = loadshape1.to_numpy()
-    # set new loadshape after resampling
-    dss.Command('New Loadshape.myloadshape')
-    dss.LoadShape.Npts(num_steps)
-    dss.LoadShape.MinInterval(step_size)
-    dss.LoadShape.PMult(loadshape_1)
-    dss.LoadShape.QMult(loadshape_1)
-
-
-def buildDERs():
+    from opendssdirect import dss
+    for name, (xarr, yarr) in spec['xycurves'].items():
+        dss.Command('New XYCurve.' + name)
+        dss.XYCurves.Npts(len(xarr))
+        dss.XYCurves.XArray(xarr)
+        dss.XYCurves.YArray(yarr)
+
+
+def buildLoadshape(spec):
+    """ add new loadshapes to system """
+    import pandas as pd
+    from dss_shapes import newLoadshape
+    for name, file in spec['loadshapes'].items():
+        loadshape = pd.read_csv(data_path + '\\' + file, parse_dates=True).to_numpy()
+        # set new loadshape after resampling, multipliers copied as float64 buffers (npts = num_steps rows)
+        newLoadshape(name, loadshape, loadshape, step_size)
+    # temperature shapes for PV TDaily the same way:  newTshape('myTemp', temp_array, step_size)
+
+
+def buildDERs(spec):
     """
     Add PV, Wind, or Storage elements
-    No inverter control implemented with THIS PV System.
     Inverters may be assigned to any DER in a separate function for extended control.  See DSS manual for further info.
     """
-    dss.Command('New PVSystem.myPV phases=3 bus1=bus_number kV=4.16 kVA=100 irradiance=1 Pmpp=95 conn=delta'
-                ' temperature=25 effcurve=DER_eff P-TCurve=myPT Daily=irrad TDaily=myTemp'
-                ' %cutin=0.01 %cutout=0.01 kvarMax=44 kvarMaxAbs=44')
+    from opendssdirect import dss
+    for element, properties in spec['ders'].items():
+        dss.Command('New ' + element + ' ' + properties)
 
 
-def buildMonitors():
+def buildMonitors(spec):
     """ add monitors to lines, loads, and circuit elements of choice """
-    for load in dss.Loads.AllNames():
-        dss.Command('New Monitor.' + load)
-        dss.Monitors.Element('Load.' + load)
-        dss.Monitors.Terminal(1)  # phase a
-        dss.Monitors.Mode(1)  # powers (all phases)
-        dss.Command('~ ppolar=no')
-
-
-def runCircuit():
-    loadcircuit()
-    buildXYCurves()
-    buildLoadshape()
-    buildDERs()
-    buildMonitors()
+    from opendssdirect import dss
+    for element_class, mode in spec['monitors'].items():
+        dss.Circuit.SetActiveClass(element_class)
+        for name in dss.ActiveClass.AllNames():
+            dss.Command('New Monitor.' + name)
+            dss.Monitors.Element(element_class + '.' + name)
+            dss.Monitors.Terminal(1)  # phase a
+            dss.Monitors.Mode(mode)
+            dss.Command('~ ppolar=no')
+
+
+class LazyCircuit:
+    def __init__(self, spec=None):
+        """
+        :param spec: circuit spec (default circuit_spec), nothing is built before ensure()
+        """
+        self.spec = circuit_spec if spec is None else spec
+        self.built = []  # components built since the last reset(), in build order
+
+    def ensure(self, *names):
+        """build the named components (and the components they depend on) not built yet"""
+        for name in names:
+            if name in self.built:
+                continue
+            builder, needs = components[name]
+            self.ensure(*needs)
+            globals()[builder](self.spec)  # looked up per build (dss_profiler times the build functions)
+            self.built.append(name)
+        return self
+
+    def reset(self):
+        """forget the built components, the next ensure() recompiles the circuit (ClearAll)"""
+        self.built = []
+
+    def numDERs(self):
+        """DERs of the spec (spaces without a build)"""
+        return len(self.spec['ders'])
+
+    def derNames(self):
+        return [element.split('.', 1)[1] for element in self.spec['ders']]
+
+
+def runCircuit(spec=None):
+    """build every component of the spec"""
+    return LazyCircuit(spec).ensure(*components)
 
 if __name__ == '__main__':
-    runCircuit()
\ No newline at end of file
+    runCircuit()
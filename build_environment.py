@@ -1,31 +1,38 @@
 """
 This file builds the Gymnasium Environment class around the constructed DSS circuit file build_circuit.py
 Follow the guidelines in https://gymnasium.farama.org/introduction/create_custom_env/
+The spaces are sized from the circuit spec (build_circuit.circuit_spec), OpenDSSDirect is attached and the circuit is
+built by the first reset(): constructing the env for its spaces only (policy loading, evaluation servers) takes
+milliseconds.
 """
+import numpy as np
 import gymnasium as gym
 from gymnasium.spaces import Discrete, Box, Dict  # gymnasium spaces
-import opendssdirect as dss
 import build_circuit
-from build_circuit import *  # or alternative globals
-import pandas as pd
-import csv
+import dss_rewards
 
 class myAgent(gym.Env):
     def __init__(self):
         super().__init__()
 
         # set output path to write to csv optional
-        self.output_path = data_path + r'\gym_env_training_data.csv'
+        self.output_path = build_circuit.data_path + r'\gym_env_training_data.csv'
 
-        # dss direct cmds (add if necessary)
-        self.Circuit = dss.Circuit
-        self.Command = dss.Text.Command
-        self.Storage = dss.Storages
-        self.Solution = dss.Solution
+        # circuit built lazily by reset(), components used by actions/observations (add 'monitors' if Helpers reads
+        # monitors, ensure() more components when a step first needs them)
+        self.circuit = build_circuit.LazyCircuit()
+        self.components = ['ders']
+
+        # dss direct cmds (add if necessary), bound by attachDSS() on the first reset()
+        self.Circuit = None
+        self.Command = None
+        self.Storage = None
+        self.Solution = None
+        self.state = None
 
         # simulation params
-        self.num_DERs = len(dss.Storages.AllNames())  # or PVsystems
-        self.buses = sorted(self.Circuit.AllBusNames(), key=int)  # bus ID list strings (all buses in network)
+        self.num_DERs = self.circuit.numDERs()  # from the spec, no circuit build
+        self.buses = None  # bus ID list strings (all buses in network), read after the circuit build
         self.Terminated = False
         self.max_step = 24  # fix num steps in sim before reset()
         self.current_step = 1
@@ -52,6 +59,23 @@ class myAgent(gym.Env):
 
 
 
+    def attachDSS(self):
+        """import OpenDSSDirect (loads the DSS engine) and set up the measurements, once"""
+        if self.state is not None:
+            return
+        import opendssdirect as dss
+        from step_state import StepState
+        self.Circuit = dss.Circuit
+        self.Command = dss.Text.Command
+        self.Storage = dss.Storages
+        self.Solution = dss.Solution
+
+        # measurements read once after each Solve(), shared by Observations, Reward and AdditionalInfo
+        # (StepState(bus=..., pv_name=...) for a single observed bus/PV, see step_state.py)
+        self.state = StepState()
+        self.state.addReader('voltages', self.Circuit.AllBusMagPu)  # example: all bus voltages p.u.
+        self.state.addReader('data', self.Helpers)  # example: data from helpers
+
     def DSSSolutionParams(self):
         """ Set dss Solution params:  https://opendss.epri.com/Solution1.html"""
         self.Command('Set voltagebases=[add voltage bases]')
@@ -72,6 +96,7 @@ class myAgent(gym.Env):
     def Observations(self):
         """
         Build observation vector or dict for agent to match defined space in __int__, import helpers or
+        measurements of self.state (read after the power flow, avoid reading the same DSS property twice per step)
         """
         observations = []
         observations = observations.flatten()  # may need to flatten this vector
@@ -94,15 +119,7 @@ class myAgent(gym.Env):
         :param voltages:
         :return: total reward
         """
-        v_reward = []
-        for voltage in voltages:
-            if  0.95 <= voltage <= 1.05:
-                volt_reward = 0.0
-                v_reward.append(volt_reward)
-            else:
-                volt_reward = -1.0
-                v_reward.append(volt_reward)
-        reward = sum(v_reward)
+        reward = float(np.sum(dss_rewards.voltageBand(voltages)))  # whole voltage array, see dss_rewards.py
         return reward
 
 
@@ -127,12 +144,13 @@ class myAgent(gym.Env):
         # print('action:', action)
         self.ApplyAction(action)
         self.Solution.Solve()  # load flow
+        state = self.state.update()  # read measurements once
 
         # get new state observations
         observation = self.Observations()
-        info = self.AdditionalInfo(data)  # feed in data from helpers
+        info = self.AdditionalInfo(state.data)  # feed in data from helpers
         # info = {}  use if no additional info
-        reward = self.Reward(voltages)  # custom reward function, feed in voltages from observations
+        reward = self.Reward(state.voltages)  # custom reward function, feed in voltages from observations
         if self.current_step == self.max_step:
             self.Terminated = True
         else:
@@ -149,9 +167,13 @@ class myAgent(gym.Env):
         :return: circuit steady state observations, info
         """
         print('resetting DSS environment')
-        build_circuit.runCircuit()  # reset circuit
+        self.attachDSS()
+        self.circuit.reset()  # reset circuit
+        self.circuit.ensure(*self.components)
+        self.buses = sorted(self.Circuit.AllBusNames(), key=int)
         self.DSSSolutionParams()
         self.current_step = 1
+        self.state.update()
         observation = self.Observations()
         info = {}  # add info or none to start sim
         self.Terminated = False
@@ -0,0 +1,81 @@
+"""
+DER bank of a compiled circuit: bulk setpoints and measurements of every PVSystem and Storage without name lookups.
+The PVSystems and Storages are read through AltDSS batches, so the measurements of a step cost a fixed number of calls
+whatever the number of DERs (the per-DER work is NumPy array arithmetic):
+--> apply(): PV kvar setpoints by collection index (no name lookup) + storage kW setpoints in one batch write
+--> update(): P, Q output of all DERs (TotalPowers of both batches, PV kvar output) + PCC voltage p.u. of all DERs
+    (one AllBusMagPu read sliced by the node index of each DER bus) after the power flow
+DERs are ordered PVSystems first, then Storages, each in collection (creation) order.  bind() the bank after every
+Compile/ClearAll (like StepSolver).
+
+    self.ders = DERBank()
+    self.ders.bind()  # after every circuit build
+    self.ders.apply(action * self.ders.rating)  # kvar of the PVs, kW (+ discharging) of the storages
+    self.Solution.Solve()
+    self.ders.update()  # self.ders.p, self.ders.q (kW, kvar output), self.ders.vpu
+"""
+
+import numpy as np
+import opendssdirect as dss
+
+
+def firstNode(bus1):
+    """node name of the first connection of a bus1 property (i.e. '65.2.3' -> '65.2', '47' -> '47.1')"""
+    parts = bus1.lower().split('.')
+    return parts[0] + '.' + (parts[1] if len(parts) > 1 else '1')
+
+
+class DERBank:
+    def __init__(self):
+        self.num_ders = 0  # no DERs before bind()
+
+    def bind(self):
+        """use the PVSystems + Storages of a newly compiled circuit"""
+        alt = dss.to_altdss()
+        self.pvs = alt.PVSystem.batch()
+        self.storages = alt.Storage.batch()
+        self.num_pvs = len(self.pvs)
+        self.num_storages = len(self.storages)
+        self.num_ders = self.num_pvs + self.num_storages
+        self.names = ['PVSystem.' + name for name in self.pvs.Name] + ['Storage.' + name for name in self.storages.Name]
+        self.is_pv = np.arange(self.num_ders) < self.num_pvs
+
+        # ratings: kVA of the PVs, kW rating of the storages (setpoint base), kvar limits
+        self.kva = np.concatenate([np.asarray(self.pvs.kVA), np.asarray(self.storages.kWRated)])
+        self.rating = self.kva.copy()
+        self.kvar_max = np.concatenate([np.asarray(self.pvs.kvarMax), np.asarray(self.storages.kvarMax)])
+
+        # position of the first node of every DER bus in AllNodeNames/AllBusMagPu
+        nodes = {name.lower(): k for k, name in enumerate(dss.Circuit.AllNodeNames())}
+        self.node_index = np.array([nodes[firstNode(bus1)] for bus1 in list(self.pvs.Bus1) + list(self.storages.Bus1)],
+                                   dtype=np.int64)
+        self.p = np.zeros(self.num_ders)  # kW output (+ generating/discharging)
+        self.q = np.zeros(self.num_ders)  # kvar output (+ injected)
+        self.vpu = np.zeros(self.num_ders)  # PCC voltage p.u. (first node magnitude)
+
+    def apply(self, setpoints):
+        """
+        write the setpoints of every DER, used by the next Solve
+        :param setpoints: kvar of the PVs followed by kW of the storages (+ discharging, - charging)
+        """
+        setpoints = np.asarray(setpoints, dtype=np.float64)
+        # PVSystems interface per index: a batch property write edits the PVs, which rebuilds the system Y matrix at
+        # the next Solve (costs more than this loop, even with 200 PVs)
+        for k, kvar in enumerate(setpoints[:self.num_pvs].tolist(), 1):
+            dss.PVsystems.Idx(k)
+            dss.PVsystems.kvar(kvar)
+        if self.num_storages:
+            self.storages.kW = setpoints[self.num_pvs:]
+
+    def setpoints(self):
+        """present kvar setpoints of the PVs followed by the kW setpoints of the storages"""
+        return np.concatenate([np.asarray(self.pvs.kvar), np.asarray(self.storages.kW)])
+
+    def update(self):
+        """read P, Q output and PCC voltage of every DER of the present solution"""
+        powers = np.concatenate([np.asarray(self.pvs.TotalPowers()), np.asarray(self.storages.TotalPowers())])
+        np.negative(powers.real, out=self.p)  # terminal powers are consumed, output = -consumed
+        np.negative(powers.imag, out=self.q)
+        self.q[:self.num_pvs] = np.asarray(self.pvs.kvar)  # PV kvar output after a solve (as PVsystems.kvar(), within limits)
+        np.take(np.asarray(dss.Circuit.AllBusMagPu()), self.node_index, out=self.vpu)
+        return self
@@ -0,0 +1,73 @@
+"""
+Stable Baselines3 adapter for multi-agent DSS-Gymnasium environments (one shared policy for all agents).
+SB3 is single-agent, AgentVecEnv presents the agents of a parallel environment (PettingZoo ParallelEnv API plus the
+array methods resetArray()/stepArray(), i.e. MultiDER_ParallelEnv) as the envs of a VecEnv:
+--> num_envs = number of agents, observation/action space = the space of one agent (all agents alike)
+--> one step of the VecEnv = one step of the parallel environment: the actions of the whole agent batch are applied
+    together and solved by one shared power flow, observations/rewards are the rows of the agent arrays
+--> episode end: every agent is done at once, its terminal observation is kept in its info and the feeder is reset
+
+    from dss_agent_vec_env import AgentVecEnv
+    env = AgentVecEnv(MultiDER_ParallelEnv(), seed=0)
+    model = PPO('MlpPolicy', env=env)  # shared policy, n_steps x num_agents samples per rollout
+
+** Parameter sharing: the agents are not told apart unless their observations differ (add an agent id feature) **
+"""
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+
+class AgentVecEnv(VecEnv):
+    def __init__(self, parallel_env, seed=None):
+        """
+        :param parallel_env: multi-agent environment with possible_agents, observation_space(agent),
+            action_space(agent), resetArray(seed, options), stepArray(actions)
+        :param seed: seed of the first reset
+        """
+        self.parallel_env = parallel_env
+        agent = parallel_env.possible_agents[0]
+        super().__init__(len(parallel_env.possible_agents), parallel_env.observation_space(agent),
+                         parallel_env.action_space(agent))
+        self.actions = None
+        self.reset_info = {}
+        if seed is not None:
+            self.seed(seed)
+
+    def reset(self):
+        obs, self.reset_info = self.parallel_env.resetArray(seed=self._seeds[0], options=self._options[0] or None)
+        self.reset_infos = [dict(self.reset_info) for _ in range(self.num_envs)]
+        self._reset_seeds()
+        self._reset_options()
+        return obs
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        obs, rewards, terminated, truncated, info = self.parallel_env.stepArray(self.actions)
+        done = terminated or truncated
+        infos = [dict(info) for _ in range(self.num_envs)]
+        if done:
+            for k, agent_info in enumerate(infos):
+                agent_info['TimeLimit.truncated'] = truncated and not terminated
+                agent_info['terminal_observation'] = obs[k]
+            obs, self.reset_info = self.parallel_env.resetArray()
+        return obs, np.asarray(rewards, dtype=np.float32), np.full(self.num_envs, done), infos
+
+    def close(self):
+        self.parallel_env.close()
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self.parallel_env, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self.parallel_env, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """called once on the shared environment, the result is repeated for every agent"""
+        result = getattr(self.parallel_env, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,241 @@
+"""
+asyncio environment pool for the DSS-Gymnasium environments.
+The environments are blocking (a solve holds the calling thread) and bound to the process-global OpenDSS engine, so
+AsyncEnvPool runs every environment in its own worker process (as make_dss_vec_env()) and exposes coroutines, a solve
+never stalls the event loop:
+--> await pool.step(env_id, action), await pool.reset(env_id, seed=None), await pool.call(env_id, 'runSchedule', ...)
+--> await pool.stepSequence(env_id, actions): several steps in one round trip (batched dispatch, stops at episode end)
+--> await pool.stepMany(env_ids, actions): one step on each env, sent to all workers before waiting for any reply
+--> backpressure: one request per env at a time (later requests of the same env wait their turn), and lease() hands out
+    idle env ids, so any number of episode tasks can be started and at most n_envs run at once
+
+    async def episode(pool, policy):
+        async with pool.lease() as env_id:
+            obs = await pool.reset(env_id)
+            done = False
+            while not done:
+                obs, reward, done, info = await pool.step(env_id, policy(obs))  # rlEnv (gym API)
+
+    async def evaluate(policy):
+        async with AsyncEnvPool(rlEnv, n_envs=8, seeds=0, env_kwargs={'SwitchOpenNoList': SwitchOpenNoList}) as pool:
+            await asyncio.gather(*[episode(pool, policy) for _ in range(1000)])
+
+Step and reset results are returned as the environment returns them (gymnasium 5-tuple, gym 4-tuple for rlEnv).  Worker
+replies are collected by one reader thread for the whole pool.  Errors raised in a worker are re-raised by the awaiting
+coroutine as RuntimeError with the worker traceback, the environment stays usable.
+** Worker processes re-import the main script with the spawn/forkserver start methods, run the event loop inside an
+if __name__ == '__main__': block **
+"""
+
+import asyncio
+import contextlib
+import multiprocessing as mp
+from multiprocessing.connection import wait
+import threading
+import traceback
+from dss_vec_env import DSSWorker, workerSeeds
+
+
+def isDone(result):
+    """episode end of a gymnasium (terminated, truncated) or gym (done) step result"""
+    return bool(result[2] or (len(result) == 5 and result[3]))
+
+
+def runCommand(env, cmd, data):
+    """execute one pool request on the worker env"""
+    if cmd == 'step':
+        return env.step(data)
+    if cmd == 'reset':
+        seed, options = data
+        if seed is None and options is None:
+            return env.reset()  # also old gym reset() without arguments (rlEnv)
+        return env.reset(seed=seed, options=options)
+    if cmd == 'steps':
+        results = []
+        for action in data:
+            results.append(env.step(action))
+            if isDone(results[-1]):
+                break
+        return results
+    if cmd == 'call':
+        name, args, kwargs = data
+        return getattr(env, name)(*args, **kwargs)
+    raise ValueError('unknown pool command ' + str(cmd))
+
+
+def poolWorker(remote, parent_remote, env_fn):
+    """worker process: build the env, answer ('ok', result) or ('error', traceback) to every request until 'close'"""
+    parent_remote.close()
+    try:
+        env = env_fn()
+        remote.send(('ok', (env.observation_space, env.action_space)))
+    except Exception:
+        remote.send(('error', traceback.format_exc()))
+        remote.close()
+        return
+    while True:
+        try:
+            cmd, data = remote.recv()
+        except EOFError:  # pool gone
+            break
+        if cmd == 'close':
+            env.close()
+            remote.send(('ok', None))
+            break
+        try:
+            reply = ('ok', runCommand(env, cmd, data))
+        except Exception:
+            reply = ('error', traceback.format_exc())
+        remote.send(reply)
+    remote.close()
+
+
+class AsyncEnvPool:
+    def __init__(self, env_cls, n_envs, seeds=None, env_kwargs=None, wrapper_cls=None, start_method=None):
+        """
+        :param env_cls: DSS-Gymnasium environment class (i.e. LocalPV_Agent, SinglePV_Agent, rlEnv)
+        :param n_envs: number of environments (worker processes)
+        :param seeds: int base seed (env i gets seeds + i), list of per-env seeds, or None
+        :param env_kwargs: keyword arguments passed to env_cls
+        :param wrapper_cls: wrapper applied to each worker env (optional, i.e. dss_profiler.profiledEnv)
+        :param start_method: multiprocessing start method, default forkserver (spawn where not available)
+        """
+        self.env_fns = [DSSWorker(env_cls, rank, seed, env_kwargs, None, wrapper_cls)
+                        for rank, seed in enumerate(workerSeeds(n_envs, seeds))]
+        self.n_envs = n_envs
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self.remotes = []
+        self.processes = []
+        self.locks = []  # one request per env at a time
+        self.waiting = {}  # remote -> (future, env id) of the request in flight
+        self.free = None  # idle env ids handed out by lease()
+        self.loop = None
+        self.reader = None
+        self.closed = True
+        self.observation_space = None
+        self.action_space = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # worker processes
+    async def start(self):
+        """start the worker processes and wait until every env is built"""
+        self.loop = asyncio.get_running_loop()
+        ctx = mp.get_context(self.start_method)
+        for env_fn in self.env_fns:
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(target=poolWorker, args=(work_remote, remote, env_fn), daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.locks = [asyncio.Lock() for _ in self.remotes]
+        self.free = asyncio.Queue()
+        ready = []
+        for env_id, remote in enumerate(self.remotes):
+            self.free.put_nowait(env_id)
+            await self.locks[env_id].acquire()
+            ready.append(self.loop.create_future())
+            self.waiting[remote] = (ready[-1], env_id)  # each worker sends its spaces once its env is built
+        self.closed = False
+        self.reader = threading.Thread(target=self.readReplies, daemon=True)
+        self.reader.start()
+        replies = await asyncio.gather(*ready)
+        errors = [result for status, result in replies if status == 'error']
+        if errors:
+            await self.close()
+            raise RuntimeError('env build failed:\n' + errors[0])
+        self.observation_space, self.action_space = replies[0][1]
+
+    async def close(self):
+        """close every env and stop the worker processes"""
+        if self.closed:
+            return
+        await asyncio.gather(*[self.request(env_id, 'close', None) for env_id in range(self.n_envs)],
+                             return_exceptions=True)
+        self.closed = True
+        await self.loop.run_in_executor(None, self.joinWorkers)
+
+    def joinWorkers(self):
+        self.reader.join()
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        for remote in self.remotes:
+            remote.close()
+
+    def readReplies(self):
+        """reader thread: receive worker replies, resolve the awaiting futures on the event loop"""
+        watched = list(self.remotes)
+        while watched and not self.closed:
+            for remote in wait(watched, timeout=0.1):
+                try:
+                    reply = remote.recv()
+                except (EOFError, OSError):
+                    watched.remove(remote)  # worker exited
+                    reply = ('error', 'worker process exited')
+                self.loop.call_soon_threadsafe(self.deliver, remote, reply)
+
+    def deliver(self, remote, reply):
+        request = self.waiting.pop(remote, None)
+        if request is None:
+            return
+        future, env_id = request
+        if not future.done():
+            future.set_result(reply)
+        self.locks[env_id].release()
+
+    async def request(self, env_id, cmd, data):
+        """send one request to env env_id once its previous request is answered, return the reply"""
+        await self.locks[env_id].acquire()  # released by deliver() when the reply arrives
+        remote = self.remotes[env_id]
+        future = self.loop.create_future()
+        self.waiting[remote] = (future, env_id)
+        try:
+            remote.send((cmd, data))
+        except Exception:
+            del self.waiting[remote]
+            self.locks[env_id].release()
+            raise
+        status, result = await asyncio.shield(future)  # a cancelled caller leaves the request running
+        if status == 'error':
+            raise RuntimeError('env %d %s failed:\n%s' % (env_id, cmd, result))
+        return result
+
+    # environment API
+    async def step(self, env_id, action):
+        """env.step(action) of env env_id"""
+        return await self.request(env_id, 'step', action)
+
+    async def reset(self, env_id, seed=None, options=None):
+        """env.reset() of env env_id (env.reset(seed=seed, options=options) if given)"""
+        return await self.request(env_id, 'reset', (seed, options))
+
+    async def stepSequence(self, env_id, actions):
+        """step env env_id through actions in one round trip, stopping at the episode end, returns the step results"""
+        return await self.request(env_id, 'steps', list(actions))
+
+    async def stepMany(self, env_ids, actions):
+        """one step on each of env_ids (all dispatched before waiting), results in env_ids order"""
+        return await asyncio.gather(*[self.step(env_id, action) for env_id, action in zip(env_ids, actions)])
+
+    async def call(self, env_id, name, *args, **kwargs):
+        """call method name of env env_id, i.e. await pool.call(0, 'runSchedule', kvar_schedule)"""
+        return await self.request(env_id, 'call', (name, args, kwargs))
+
+    @contextlib.asynccontextmanager
+    async def lease(self):
+        """check out an idle env id for the duration of an episode, waits while every env is in use"""
+        env_id = await self.free.get()
+        try:
+            yield env_id
+        finally:
+            self.free.put_nowait(env_id)
@@ -0,0 +1,165 @@
+"""
+Whole-episode (open-loop) batch solves for the DSS-Gymnasium PV environments.
+A precomputed reactive power schedule (kvar per step) is pushed into OpenDSS as the Qmult of a daily loadshape on a
+constant PQ injection that mirrors the PVSystem, then the episode runs as one daily-mode 'Solve' with number=N and the
+bus voltages/PV powers are read back from the existing Monitors in one call per channel:
+
+    from dss_batch import solveSchedule
+    vpu, pv_kw, kvar = solveSchedule('pv890', kvar, 'Bus890_voltage', 'PV_sys_power', '890')
+
+Time stepping follows env.step(): Solve() + FinishTimeStep() advance the clock by two step sizes per env step.
+PVSystem limits are applied to the schedule: kvar clipped to kvarMax/kvarMaxAbs, and steps where Q + available P
+exceed the kVA rating (var priority: P is curtailed) are re-solved individually with the PVSystem itself at that kvar.
+No state carries over between steps of these circuits (ControlMode=OFF, no storage), so open-loop results match a
+step() loop of the same setpoints to solver tolerance.
+"""
+
+import numpy as np
+import opendssdirect as dss
+
+schedule_prefix = 'qsched_'  # loadshape + load names: qsched_<pv name>
+
+
+def scheduleTimes(num_steps, stride=2):
+    """solution hour of every env step starting at the present solution time"""
+    step_hours = dss.Solution.StepSize() / 3600
+    return dss.Solution.DblHour() + (stride * np.arange(num_steps) + 1) * step_hours
+
+
+def shapeIndex(times, step_hours, num_points):
+    """0 based loadshape point used by OpenDSS at each solution hour (fixed interval shape, wraps around)"""
+    return (np.round(times / step_hours).astype(np.int64) - 1) % num_points
+
+
+def pvRatings(pv_name):
+    """kVA, kvarMax, kvarMaxAbs of a PVSystem"""
+    dss.Circuit.SetActiveElement('PVSystem.' + pv_name)
+    return tuple(float(dss.Properties.Value(prop)) for prop in ('kVA', 'kvarMax', 'kvarMaxAbs'))
+
+
+def buildScheduleLoad(pv_name):
+    """
+    constant PQ load at the PVSystem bus, following loadshape qsched_<pv> (Pmult: curtailed kW, Qmult: -kvar)
+    created once per compiled circuit (same length as the PV daily shape, one point per solution step), disabled
+    while the environment steps normally
+    """
+    name = schedule_prefix + pv_name
+    if name in dss.Loads.AllNames():
+        return name
+    dss.Circuit.SetActiveElement('PVSystem.' + pv_name)
+    bus1, phases, kv, conn, vmin, vmax, daily = [dss.Properties.Value(prop) for prop in
+                                                 ('Bus1', 'Phases', 'kV', 'Conn', 'VMinpu', 'VMaxpu', 'Daily')]
+    dss.LoadShape.Name(daily)
+    num_points = dss.LoadShape.Npts()
+    dss.Command('New Loadshape.' + name)
+    dss.LoadShape.Npts(num_points)
+    dss.LoadShape.MinInterval(dss.Solution.StepSize() / 60)
+    dss.LoadShape.PMult(np.zeros(num_points))  # multipliers must exist before a load references the shape
+    dss.LoadShape.QMult(np.zeros(num_points))
+    dss.Command('New Load.' + name + ' bus1=' + bus1 + ' phases=' + phases + ' kV=' + kv + ' conn=' + conn +
+                ' kW=1 kvar=1 model=1 status=exempt vminpu=' + vmin + ' vmaxpu=' + vmax + ' daily=' + name)
+    return name
+
+
+def setScheduleShape(name, index, kw, kvar):
+    """write kW (consumption) and kvar (injection) of every step to the schedule loadshape points"""
+    dss.LoadShape.Name(name)
+    pmult = np.zeros(dss.LoadShape.Npts())
+    qmult = np.zeros(dss.LoadShape.Npts())
+    pmult[index] = kw
+    qmult[index] = -kvar  # load convention: negative kvar is injected
+    dss.LoadShape.PMult(pmult)
+    dss.LoadShape.QMult(qmult)
+
+
+def monitorVoltagePu(monitor, bus):
+    """real part of the first node p.u. voltage (as Bus.PuVoltage()[0]) at every monitor sample"""
+    dss.Circuit.SetActiveBus(bus)
+    vbase = dss.Bus.kVBase() * 1000
+    dss.Monitors.Name(monitor)
+    vmag = np.asarray(dss.Monitors.Channel(1))
+    vang = np.deg2rad(np.asarray(dss.Monitors.Channel(2)))
+    return vmag * np.cos(vang) / vbase
+
+
+def monitorPower(monitor):
+    """total P (kW) output of the monitored element at every sample (mode 1 monitor, ppolar=no)"""
+    dss.Monitors.Name(monitor)
+    phases = dss.Monitors.NumChannels() // 2
+    return -sum(np.asarray(dss.Monitors.Channel(2 * ph + 1), dtype=np.float64) for ph in range(phases))
+
+
+def solveTimes(first_hour, num_steps, step_hours, stride):
+    """daily mode solves at first_hour, first_hour + stride x step size, ... (one Solve call)"""
+    dss.Solution.DblHour(first_hour - stride * step_hours)
+    dss.Solution.StepSize(stride * step_hours * 3600)
+    dss.Command('Set number=' + str(num_steps))
+    dss.Solution.Solve()
+    dss.Solution.StepSize(step_hours * 3600)
+    dss.Command('Set number=1')
+
+
+def solveSchedule(pv_name, kvar, voltage_monitor, power_monitor, bus, stride=2, stream=None):
+    """
+    run a whole episode with PVSystem pv_name following the kvar schedule, starting at the present solution time
+    ** the episode ends at the last step, reset() the environment before stepping again **
+    :param kvar: reactive power setpoint (kvar) of every env step
+    :param voltage_monitor: mode 0 monitor on the PVSystem terminal (i.e. 'Bus890_voltage')
+    :param power_monitor: mode 1 monitor on the PVSystem terminal (i.e. 'PV_sys_power')
+    :param bus: observed bus (i.e. '890')
+    :param stride: solution steps per env step (Solve + FinishTimeStep = 2)
+    :param stream: ShapeStream of the circuit shapes (optional), the episode is solved one loaded chunk at a time
+    :return: bus voltage p.u. (real part, as obsBusV), PV kW output, applied kvar of every step
+    """
+    if stream is not None:
+        kvar = np.asarray(kvar, dtype=np.float64)
+        parts = []
+        start = 0
+        while start < len(kvar):
+            stream.update()
+            steps = min(stream.stepsInChunk(stride), len(kvar) - start)
+            parts.append(solveSchedule(pv_name, kvar[start:start + steps], voltage_monitor, power_monitor, bus, stride))
+            start += steps
+        return tuple(np.concatenate(part) for part in zip(*parts))
+    kva, kvar_max, kvar_max_abs = pvRatings(pv_name)
+    kvar = np.clip(np.asarray(kvar, dtype=np.float64), -kvar_max_abs, kvar_max)
+    num_steps = len(kvar)
+    step_hours = dss.Solution.StepSize() / 3600
+    times = scheduleTimes(num_steps, stride)
+
+    name = buildScheduleLoad(pv_name)
+    dss.LoadShape.Name(name)
+    num_points = dss.LoadShape.Npts()
+    index = shapeIndex(times, step_hours, num_points)
+    dss.PVsystems.Name(pv_name)
+    dss.PVsystems.kvar(0.0)  # PV delivers available P only, Q comes from the schedule load
+    dss.Circuit.SetActiveElement('Load.' + name)
+    dss.CktElement.Enabled(True)
+    dss.Monitors.ResetAll()
+    chunk = max(num_points // stride, 1)  # episodes longer than the shape wrap around, one solve per shape period
+    for start in range(0, num_steps, chunk):
+        steps = slice(start, min(start + chunk, num_steps))
+        setScheduleShape(name, index[steps], 0.0, kvar[steps])
+        solveTimes(times[start], len(kvar[steps]), step_hours, stride)
+    vpu = monitorVoltagePu(voltage_monitor, bus)
+    pv_kw = monitorPower(power_monitor)
+
+    # var priority: P curtailed where available P + scheduled Q exceed the kVA rating, re-solve those steps on the PV
+    kw_limit = np.sqrt(np.maximum(kva**2 - kvar**2, 0.0))
+    curtailed = np.flatnonzero(pv_kw > kw_limit)
+    dss.Circuit.SetActiveElement('Load.' + name)
+    dss.CktElement.Enabled(False)
+    for k in curtailed:
+        dss.PVsystems.Name(pv_name)
+        dss.PVsystems.kvar(kvar[k])
+        dss.Solution.DblHour(times[k] - step_hours)
+        dss.Solution.Solve()
+        dss.Circuit.SetActiveBus(bus)
+        vpu[k] = dss.Bus.PuVoltage()[0]
+        pv_kw[k] = dss.PVsystems.kW()
+        kvar[k] = dss.PVsystems.kvar()
+
+    dss.PVsystems.Name(pv_name)
+    dss.PVsystems.kvar(kvar[-1])  # as left by the last step()
+    dss.Solution.DblHour(times[-1] + (stride - 1) * step_hours)
+    return vpu, pv_kw, kvar
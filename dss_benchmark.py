@@ -0,0 +1,356 @@
+"""
+Reproducible throughput benchmark of the DSS-Gymnasium environments, run offline on the .dss cases bundled with the repo:
+--> localpv: LocalPV_Agent, ieee34 bus (34Bus/ieee34Mod1.dss, time series data of 123Bus/)
+--> singlepv: SinglePV_Agent, ieee123 bus (123Bus/IEEE123Master.dss)
+--> singlepv_network: SinglePV_Agent observing the voltage of every node (obs_mode='network')
+--> multider: MultiDER_Agent, ieee123 bus with the PVs/storages of dss_circuit_123bus_multiDER (20 PVs by default)
+--> restoration: rlEnv, ieee123 bus with fault switches (RandomFaultTrainingCode/IEEE123MasterMultiSW.dss)
+--> template13: build_environment.myAgent template filled in for the ieee13 bus (13Bus/IEEE13Nodeckt.dss) + one BESS
+Each (case, policy, workers) run starts that many worker processes (one OpenDSS engine each, as make_dss_vec_env()),
+every worker builds its environment, resets it, then steps a random or fixed policy for a fixed number of steps
+(episodes ending on the way are reset and timed as resets).  Reported per run: steps/s (sum over workers), p50/p99 step
+latency, first reset (circuit build) and later reset latency, worker RSS.  Results are written to a JSON file tagged with
+the git commit, so that runs of two commits can be compared:
+
+    python dss_benchmark.py --cases localpv singlepv multider restoration template13 --workers 1 2 4 --steps 2000 --out bench.json
+    python dss_benchmark.py --workers 1 --out new.json --compare bench.json
+
+** The cases are copied to a temp folder where Redirect/BusCoords files written with a different case on Windows
+(i.e. IEEELinecodes.DSS) are also found on Linux/macOS.  Use --folder 34Bus=path/to/34Bus to benchmark another copy **
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import traceback
+from time import perf_counter
+import numpy as np
+import psutil
+import gymnasium as gym
+from gymnasium.spaces import Box
+import opendssdirect as dss
+from build_environment import myAgent
+from dss_vec_env import seedWorker
+from step_state import StepState
+
+repo_path = os.path.dirname(os.path.abspath(__file__))
+folders = {'13Bus': os.path.join(repo_path, '13Bus'),
+           '34Bus': os.path.join(repo_path, '34Bus'),
+           '123Bus': os.path.join(repo_path, '123Bus'),
+           'data': os.path.join(repo_path, '123Bus'),  # pv, temperature and loadshape csv files of the PV cases
+           'restoration': os.path.join(repo_path, 'Emergency_Restoration_Rdm_Fault_Training', 'RandomFaultTrainingCode')}
+include_pattern = re.compile(r'^\s*(?:redirect|compile|buscoords)\s+(\S+)', re.IGNORECASE | re.MULTILINE)
+staged_folders = []  # temp case folders of this process, removed when the worker ends
+
+
+def stageCase(folder, master):
+    """
+    copy a case folder to a temp folder, adding a copy under the referenced name of every included file found only
+    with a different case (Windows file names are case insensitive)
+    :return: path of the staged master .dss file
+    """
+    stage = tempfile.mkdtemp(prefix='dss_benchmark_')
+    staged_folders.append(stage)
+    for name in os.listdir(folder):
+        if os.path.isfile(os.path.join(folder, name)):
+            shutil.copy(os.path.join(folder, name), stage)
+    pending = [master]
+    while pending:
+        path = os.path.join(stage, pending.pop())
+        if not path.lower().endswith('.dss') or not os.path.isfile(path):
+            continue
+        with open(path, errors='ignore') as f:
+            text = f.read()
+        for name in include_pattern.findall(text):
+            name = name.strip('\'"')
+            if not os.path.exists(os.path.join(stage, name)):
+                match = [n for n in os.listdir(stage) if n.lower() == name.lower()]
+                if match:
+                    shutil.copy(os.path.join(stage, match[0]), os.path.join(stage, name))
+            pending.append(name)
+    return os.path.join(stage, master)
+
+
+class Template13Agent(myAgent):
+    """
+    myAgent template filled in for the ieee13 bus case: one 3 phase BESS at bus 675 dispatched every hour
+    (action = kW p.u. of rating, + discharging), observations = all node voltages p.u., template reward/info
+    """
+    def __init__(self, dss_path):
+        gym.Env.__init__(self)  # template __init__ is a skeleton (cost vector, integer bus names)
+        self.dss_path = dss_path
+        self.Circuit = dss.Circuit
+        self.Command = dss.Text.Command
+        self.Storage = dss.Storages
+        self.Solution = dss.Solution
+        self.kw_rated = 500.0
+        self.Terminated = False
+        self.max_step = 24
+        self.current_step = 1
+        self.buildCircuit()
+        self.num_DERs = len(self.Storage.AllNames())
+        self.state = StepState()
+        self.state.addReader('voltages', self.Circuit.AllBusMagPu)
+        self.state.addReader('data', self.Helpers)
+        self.action_space = Box(low=-1.0, high=1.0, shape=(self.num_DERs,), dtype=np.float64)
+        self.observation_space = Box(low=0.0, high=2.0, shape=(len(self.Circuit.AllBusMagPu()),), dtype=np.float64)
+
+    def buildCircuit(self):
+        self.Command('ClearAll')
+        self.Command("Redirect '" + self.dss_path + "'")
+        self.Command('New Storage.bess phases=3 bus1=675 kV=4.16 kWrated=%s kWhrated=2000 %%stored=50' % self.kw_rated)
+        self.Command('set ControlMode=OFF')
+
+    def DSSSolutionParams(self):
+        self.Command('Set voltagebases=[115, 4.16, .48]')
+        self.Command('calc')
+        self.Command('Set mode=daily number=1 stepsize=1h')
+        self.Command('Set hour=0')
+
+    def Observations(self):
+        return np.asarray(self.state.voltages, dtype=np.float64)
+
+    def ApplyAction(self, action):
+        self.Command('Storage.bess.kW=' + str(float(action[0]) * self.kw_rated))
+
+    def reset(self, seed=None, options=None):
+        gym.Env.reset(self, seed=seed)
+        self.buildCircuit()
+        self.DSSSolutionParams()
+        self.current_step = 1
+        self.state.update()
+        self.Terminated = False
+        return self.Observations(), {}
+
+
+# case factories, called inside the worker process
+def makeLocalPV(folders):
+    sys.path.append(os.path.join(repo_path, 'Local_PV_Q_Setpoint_Adj'))
+    import dss_circuit_34bus
+    from gymnasium_env_34bus import LocalPV_Agent
+    dss_circuit_34bus.dss_path = stageCase(folders['34Bus'], 'ieee34Mod1.dss')
+    dss_circuit_34bus.data_path = folders['data']
+    return LocalPV_Agent()
+
+
+def makeSinglePV(folders, obs_mode='bus'):
+    sys.path.append(os.path.join(repo_path, 'IEEE123bus_Single_PV_Agent'))
+    import dss_circuit_123bus_singlePV
+    from gymnasium_env_123bus_singlePV import SinglePV_Agent
+    dss_circuit_123bus_singlePV.dss_path = stageCase(folders['123Bus'], 'IEEE123Master.dss')
+    dss_circuit_123bus_singlePV.data_path = folders['data']
+    return SinglePV_Agent(obs_mode=obs_mode)
+
+
+def makeSinglePVNetwork(folders):
+    return makeSinglePV(folders, obs_mode='network')
+
+
+def makeMultiDER(folders):
+    sys.path.append(os.path.join(repo_path, 'IEEE123bus_Multi_DER_Agent'))
+    import dss_circuit_123bus_multiDER
+    from gymnasium_env_123bus_multiDER import MultiDER_Agent
+    dss_circuit_123bus_multiDER.feeder.dss_path = stageCase(folders['123Bus'], 'IEEE123Master.dss')
+    dss_circuit_123bus_multiDER.feeder.data_path = folders['data']
+    return MultiDER_Agent()
+
+
+def makeRestoration(folders):
+    sys.path.append(os.path.join(repo_path, 'Emergency_Restoration_Rdm_Fault_Training', 'RandomFaultTrainingCode'))
+    from IEEE123nodeRandomFaultSWpwrsENV0912 import rlEnv, SwitchOpenNoList
+    return rlEnv(SwitchOpenNoList, case_path=stageCase(folders['restoration'], 'IEEE123MasterMultiSW.dss'))
+
+
+def makeTemplate13(folders):
+    return Template13Agent(stageCase(folders['13Bus'], 'IEEE13Nodeckt.dss'))
+
+
+cases = {'localpv': {'make': makeLocalPV, 'fixed_action': 0},  # do nothing
+         'singlepv': {'make': makeSinglePV, 'fixed_action': np.array([0.0], dtype=np.float32)},
+         'singlepv_network': {'make': makeSinglePVNetwork, 'fixed_action': np.array([0.0], dtype=np.float32)},
+         'multider': {'make': makeMultiDER, 'fixed_action': 0.0},  # no kvar / kW on every DER
+         'restoration': {'make': makeRestoration, 'fixed_action': 0},  # no switch action
+         'template13': {'make': makeTemplate13, 'fixed_action': np.array([0.0])}}
+
+
+def resetEnv(env, seed=None):
+    """gymnasium reset(seed=...) or old gym reset() (rlEnv)"""
+    if isinstance(env, gym.Env):
+        return env.reset(seed=seed)
+    return env.reset()
+
+
+def benchWorker(case, policy, folders, steps, resets, seed, rank, barrier, queue):
+    """build + step one environment, put its raw timings on the queue"""
+    process = psutil.Process()
+    rss_start = process.memory_info().rss
+    stdout = sys.stdout
+    try:
+        sys.stdout = open(os.devnull, 'w')  # environments print on every reset
+        t = perf_counter()
+        env = cases[case]['make'](folders)
+        build_s = perf_counter() - t
+        seedWorker(env, seed + rank)  # random/np.random (random fault cases of rlEnv), env RNG, action space
+        t = perf_counter()
+        resetEnv(env, seed + rank)
+        first_reset_s = perf_counter() - t
+        rss_env = process.memory_info().rss
+        fixed_action = cases[case]['fixed_action']
+        step_s = np.empty(steps)
+        reset_s = []
+        barrier.wait()  # all workers step at the same time
+        t_start = perf_counter()
+        for k in range(steps):
+            action = env.action_space.sample() if policy == 'random' else fixed_action
+            t = perf_counter()
+            result = env.step(action)
+            step_s[k] = perf_counter() - t
+            if result[2] or (len(result) == 5 and result[3]):
+                t = perf_counter()
+                resetEnv(env)
+                reset_s.append(perf_counter() - t)
+        wall_s = perf_counter() - t_start
+        for _ in range(resets):
+            t = perf_counter()
+            resetEnv(env)
+            reset_s.append(perf_counter() - t)
+        env.close()
+        queue.put({'rank': rank, 'build_s': build_s, 'first_reset_s': first_reset_s, 'step_s': step_s,
+                   'reset_s': np.array(reset_s), 'wall_s': wall_s, 'rss_start': rss_start, 'rss_env': rss_env,
+                   'rss_end': process.memory_info().rss})
+    except BaseException:
+        barrier.abort()
+        queue.put({'rank': rank, 'error': traceback.format_exc()})
+    finally:
+        sys.stdout = stdout
+        for stage in staged_folders:
+            shutil.rmtree(stage, ignore_errors=True)
+
+
+def runCase(case, policy, workers, folders, steps, resets, seed=0, start_method='spawn'):
+    """run one benchmark configuration in worker processes, return its summary dict"""
+    ctx = mp.get_context(start_method)
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=benchWorker, args=(case, policy, folders, steps, resets, seed, rank, barrier, queue))
+             for rank in range(workers)]
+    for p in procs:
+        p.start()
+    outs = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    errors = [out['error'] for out in outs if 'error' in out]
+    if errors:
+        raise RuntimeError('%s benchmark worker failed:\n%s' % (case, errors[0]))
+    step_s = np.concatenate([out['step_s'] for out in outs])
+    reset_s = np.concatenate([out['reset_s'] for out in outs])
+    mb = 1.0 / 2**20
+    return {'case': case, 'policy': policy, 'workers': workers, 'steps_per_worker': steps,
+            'steps_per_s': sum(steps / out['wall_s'] for out in outs),  # workers step concurrently
+            'steps_per_s_worker': float(np.mean([steps / out['wall_s'] for out in outs])),
+            'step_mean_ms': 1e3 * float(np.mean(step_s)),
+            'step_p50_ms': 1e3 * float(np.percentile(step_s, 50)),
+            'step_p99_ms': 1e3 * float(np.percentile(step_s, 99)),
+            'build_s': float(np.mean([out['build_s'] for out in outs])),
+            'first_reset_ms': 1e3 * float(np.mean([out['first_reset_s'] for out in outs])),
+            'resets': len(reset_s),
+            'reset_p50_ms': 1e3 * float(np.percentile(reset_s, 50)) if len(reset_s) else None,
+            'reset_p99_ms': 1e3 * float(np.percentile(reset_s, 99)) if len(reset_s) else None,
+            'env_rss_mb': mb * float(np.mean([out['rss_env'] - out['rss_start'] for out in outs])),
+            'rss_mb': mb * max(out['rss_end'] for out in outs)}
+
+
+def gitCommit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo_path, capture_output=True, text=True)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_path,
+                               capture_output=True, text=True)
+        return commit.stdout.strip() or None, bool(dirty.stdout.strip())
+    except OSError:
+        return None, None
+
+
+def runInfo(args):
+    """machine, package versions and benchmark parameters stored with the results"""
+    commit, dirty = gitCommit()
+    return {'commit': commit, 'dirty': dirty, 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'opendss': dss.Basic.Version(), 'numpy': np.__version__,
+            'gymnasium': gym.__version__, 'args': vars(args)}
+
+
+def resultsTable(results):
+    lines = ['%-12s %-7s %7s %10s %10s %10s %12s %10s %8s' % ('case', 'policy', 'workers', 'steps/s', 'p50 ms',
+                                                             'p99 ms', 'reset1 ms', 'reset ms', 'rss MB')]
+    for r in results:
+        lines.append('%-12s %-7s %7d %10.1f %10.4f %10.4f %12.1f %10s %8.1f' % (
+            r['case'], r['policy'], r['workers'], r['steps_per_s'], r['step_p50_ms'], r['step_p99_ms'],
+            r['first_reset_ms'], '-' if r['reset_p50_ms'] is None else '%.2f' % r['reset_p50_ms'], r['rss_mb']))
+    return '\n'.join(lines)
+
+
+def compareTable(old, new):
+    """steps/s and p99 step latency of new vs old results (matched by case, policy, workers)"""
+    old_runs = {(r['case'], r['policy'], r['workers']): r for r in old['results']}
+    lines = ['old commit %s, new commit %s' % (old['info']['commit'], new['info']['commit']),
+             '%-12s %-7s %7s %12s %12s %8s %10s %10s' % ('case', 'policy', 'workers', 'old steps/s', 'new steps/s',
+                                                         'speedup', 'old p99', 'new p99')]
+    for r in new['results']:
+        o = old_runs.get((r['case'], r['policy'], r['workers']))
+        if o is None:
+            continue
+        lines.append('%-12s %-7s %7d %12.1f %12.1f %8.2f %10.4f %10.4f' % (
+            r['case'], r['policy'], r['workers'], o['steps_per_s'], r['steps_per_s'],
+            r['steps_per_s'] / o['steps_per_s'], o['step_p99_ms'], r['step_p99_ms']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DSS-Gymnasium environment throughput benchmark')
+    parser.add_argument('--cases', nargs='+', choices=list(cases), default=list(cases))
+    parser.add_argument('--policies', nargs='+', choices=['random', 'fixed'], default=['random', 'fixed'])
+    parser.add_argument('--workers', nargs='+', type=int, default=[1], help='worker process counts to run')
+    parser.add_argument('--steps', type=int, default=2000, help='steps per worker')
+    parser.add_argument('--resets', type=int, default=5, help='extra timed resets per worker after stepping')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-method', default='spawn', choices=mp.get_all_start_methods())
+    parser.add_argument('--folder', action='append', default=[], metavar='NAME=PATH',
+                        help='case folder override, NAME in %s' % ', '.join(folders))
+    parser.add_argument('--out', default='benchmark.json', help='results JSON file')
+    parser.add_argument('--compare', default=None, help='results JSON file of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    case_folders = dict(folders)
+    for item in args.folder:
+        name, path = item.split('=', 1)
+        if name not in case_folders:
+            parser.error('unknown folder %s' % name)
+        case_folders[name] = os.path.abspath(path)
+
+    results = []
+    for case in args.cases:
+        for policy in args.policies:
+            for workers in args.workers:
+                results.append(runCase(case, policy, workers, case_folders, args.steps, args.resets, args.seed,
+                                       args.start_method))
+                print(resultsTable(results[-1:]).splitlines()[-1], flush=True)
+    output = {'info': runInfo(args), 'results': results}
+    with open(args.out, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(resultsTable(results))
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print(compareTable(json.load(f), output))
+    return output
+
+
+if __name__ == '__main__':
+    main()
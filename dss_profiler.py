@@ -0,0 +1,355 @@
+"""
+Opt-in step/reset latency profiler for the DSS-Gymnasium environments.
+The profiler instruments an environment instance in place (the env keeps its class, so check_env, Monitor and SB3
+work unchanged) and times the phases of every step() and reset() call:
+--> step: action, solve, finish (FinishTimeStep), observe, reward, other (Python overhead = total - phases)
+--> reset: csv, compile, loadshapes, pv, monitors, restore, solve, ... (depends on the environment)
+Phase timings of each call are added to log spaced latency histograms, returned in info['profile'] (seconds) and
+logged to the SB3 logger by ProfilerCallback (profile/<phase>_mean_ms, _p99_ms of the steps between log dumps).
+close() prints the summary:
+
+    from dss_profiler import StepProfiler, ProfilerCallback
+    env = LocalPV_Agent()
+    profiler = StepProfiler(env, summary_path='profile.json')
+    model = DQN('MlpPolicy', env=env)
+    model.learn(total_timesteps=8640, callback=ProfilerCallback())
+    env.close()
+
+With make_dss_vec_env() pass wrapper_cls=profiledEnv, each worker profiles its own env and ProfilerCallback collects
+the timings from the step infos.  Only outermost phase calls are timed (a phase called inside another phase belongs to
+the outer one).  Overhead is 1-2 us per timed call (~9 us on the 0.1 ms LocalPV_Agent step).
+"""
+
+import json
+import sys
+import types
+from time import perf_counter
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+bins_per_decade = 10
+min_exponent = -7  # first bin edge 100 ns
+num_bins = 9 * bins_per_decade  # last bin edge 100 s
+bin_edges = 10.0 ** (min_exponent + np.arange(num_bins + 1) / bins_per_decade)
+
+# OpenDSS text commands timed by their first word (other commands are counted in the enclosing phase or 'other')
+command_phases = {'solve': 'solve', 'compile': 'compile', 'redirect': 'compile', 'clearall': 'compile'}
+
+# default phases of the repo environments: phase -> method of the env (dotted path) or 'module:function',
+# 'commands': text command functions split into command_phases
+phase_specs = {
+    'LocalPV_Agent': {
+        'step': {'action': 'applyAction', 'solve': 'solver.Solution.Solve',
+                 'finish': 'solver.Solution.FinishTimeStep',
+                 'observe': 'state.update', 'reward': 'reward'},
+        'reset': {'csv': 'dss_circuit_34bus:importPVData', 'compile': 'dss_circuit_34bus:load34bus',
+                  'xycurves': 'dss_circuit_34bus:buildXYs', 'loadshapes': 'dss_circuit_34bus:buildLoadshapes',
+                  'assign loadshapes': 'dss_circuit_34bus:assignLoadShapes',
+                  'temperature': 'dss_circuit_34bus:buildTempCurves', 'stream': 'dss_circuit_34bus:buildStream',
+                  'pv': 'dss_circuit_34bus:buildPV',
+                  'monitors': 'dss_circuit_34bus:buildMonitors', 'restore': 'restoreState',
+                  'solution params': 'setSolutionParams', 'snapshot': 'snapshotState'}},
+    'SinglePV_Agent': {
+        'step': {'action': 'applyQSetpoint', 'solve': 'solver.Solution.Solve',
+                 'finish': 'solver.Solution.FinishTimeStep',
+                 'observe': 'state.update', 'reward': 'reward'},
+        'reset': {'csv': 'dss_circuit_123bus_singlePV:importPVData',
+                  'compile': 'dss_circuit_123bus_singlePV:load123bus',
+                  'xycurves': 'dss_circuit_123bus_singlePV:buildXYs',
+                  'loadshapes': 'dss_circuit_123bus_singlePV:buildLoadshapes',
+                  'assign loadshapes': 'dss_circuit_123bus_singlePV:assignLoadShapes',
+                  'temperature': 'dss_circuit_123bus_singlePV:buildTempCurves',
+                  'stream': 'dss_circuit_123bus_singlePV:buildStream',
+                  'pv': 'dss_circuit_123bus_singlePV:buildPV', 'monitors': 'dss_circuit_123bus_singlePV:buildMonitors',
+                  'solution params': 'setSolutionParams', 'restore': 'restoreState', 'observe': 'state.update'}},
+    'MultiDER_Agent': {
+        'step': {'action': 'applySetpoints', 'solve': 'solver.Solution.Solve',
+                 'finish': 'solver.Solution.FinishTimeStep',
+                 'observe': 'ders.update', 'reward': 'reward'},
+        'reset': {'csv': 'dss_circuit_123bus_singlePV:importPVData',
+                  'compile': 'dss_circuit_123bus_singlePV:load123bus',
+                  'xycurves': 'dss_circuit_123bus_singlePV:buildXYs',
+                  'loadshapes': 'dss_circuit_123bus_singlePV:buildLoadshapes',
+                  'assign loadshapes': 'dss_circuit_123bus_singlePV:assignLoadShapes',
+                  'temperature': 'dss_circuit_123bus_singlePV:buildTempCurves',
+                  'stream': 'dss_circuit_123bus_singlePV:buildStream',
+                  'ders': 'dss_circuit_123bus_multiDER:buildDERs', 'der bank': 'ders.bind',
+                  'solution params': 'setSolutionParams'}},
+    'rlEnv': {
+        'step': {'action': 'SwitchAction', 'observe': 'measureOutcome', 'cache': 'cachedOutcome',
+                 'reuse': 'reuseOutcome'},
+        'reset': {'restore': 'restoreCircuit', 'snapshot': 'snapshotCircuit', 'observe': 'measureOutcome',
+                  'measurement layer': 'IEEE123nodeRandomFaultSWpwrsENV0912:MeasurementLayer',
+                  'topology index': 'IEEE123nodeRandomFaultSWpwrsENV0912:TopologyIndex'},
+        'commands': {'step': ['Command'],
+                     'reset': ['Command', 'IEEE123nodeRandomFaultSWpwrsENV0912:run_command']}},
+    'myAgent': {
+        'step': {'action': 'ApplyAction', 'solve': 'Solution.Solve', 'observe': 'Observations',
+                 'reward': 'Reward', 'info': 'AdditionalInfo'},
+        'reset': {'compile': 'build_circuit:loadcircuit', 'csv': 'build_circuit:importdata',
+                  'xycurves': 'build_circuit:buildXYCurves', 'loadshapes': 'build_circuit:buildLoadshape',
+                  'pv': 'build_circuit:buildDERs', 'monitors': 'build_circuit:buildMonitors',
+                  'solution params': 'DSSSolutionParams'},
+        'commands': {'step': ['Command'], 'reset': ['Command']}},
+}
+
+
+class LatencyHistogram:
+    """
+    log spaced latency histogram, 10 bins per decade from 100 ns to 100 s, plus count/total/max
+    samples are buffered and binned in bulk (flush_size samples at a time) to keep add() cheap
+    """
+    flush_size = 4096
+
+    def __init__(self):
+        self.counts = np.zeros(num_bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.pending = []
+
+    def add(self, seconds):
+        self.pending.append(seconds)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        samples, self.pending = self.pending, []
+        self.addMany(samples)
+
+    def addMany(self, samples):
+        if len(samples) == 0:
+            return
+        samples = np.asarray(samples, dtype=np.float64)
+        bins = np.floor((np.log10(np.maximum(samples, 1e-12)) - min_exponent) * bins_per_decade)
+        self.counts += np.bincount(np.clip(bins, 0, num_bins - 1).astype(np.int64), minlength=num_bins)
+        self.count += len(samples)
+        self.total += float(samples.sum())
+        self.max = max(self.max, float(samples.max()))
+
+    def percentile(self, q):
+        """upper bin edge of the q-th percentile (seconds), within 26% of the exact value"""
+        self.flush()
+        if self.count == 0:
+            return 0.0
+        b = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        return min(float(bin_edges[b + 1]), self.max)
+
+    def summary(self):
+        self.flush()
+        mean = self.total / self.count if self.count else 0.0
+        return {'count': self.count, 'mean_ms': mean * 1e3, 'p50_ms': self.percentile(50) * 1e3,
+                'p99_ms': self.percentile(99) * 1e3, 'max_ms': self.max * 1e3, 'total_s': self.total}
+
+
+def isSharedNamespace(obj):
+    """modules and OpenDSSDirect interfaces are shared by the whole process (and refuse attribute assignment)"""
+    return isinstance(obj, types.ModuleType) or type(obj).__module__.split('.')[0] == 'opendssdirect'
+
+
+class TimedNamespace:
+    """stand-in for a shared namespace (i.e. env.Solution = dss.Solution) timing some of its functions"""
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def __getattr__(self, name):
+        return getattr(self.namespace, name)
+
+
+class StepProfiler:
+    def __init__(self, env, specs=None, info_key='profile', summary_path=None, verbose=1):
+        """
+        instrument env.step(), env.reset(), env.close() and the phase methods of the env
+        :param env: environment instance (unwrapped)
+        :param specs: {'step': {phase: target}, 'reset': {phase: target}}, default from phase_specs by class name
+        :param info_key: info dict key of the per-call phase timings (None: not added to info)
+        :param summary_path: write the summary as json at close() (optional)
+        :param verbose: print the summary table at close()
+        """
+        self.env = getattr(env, 'unwrapped', env)
+        self.specs = specs if specs is not None else phase_specs.get(type(self.env).__name__, {})
+        self.info_key = info_key
+        self.summary_path = summary_path
+        self.verbose = verbose
+        self.histograms = {}  # 'step/solve' -> LatencyHistogram
+        self.pending = {'step': {}, 'reset': {}}  # context -> phase -> timings not yet added to the histograms
+        self.num_pending = 0
+        self.context = None  # 'step' or 'reset' while one of them runs
+        self.depth = 0
+        self.current = {}
+        self.patched = []  # (owner, attribute, original, owner had the attribute in its own __dict__)
+        for context in ('step', 'reset'):
+            for phase, target in self.specs.get(context, {}).items():
+                self.instrument(target, context, phase)
+            for target in self.specs.get('commands', {}).get(context, []):
+                self.instrument(target, context, None)
+        self.patch(self.env, 'step', self.profiled(self.env.step, 'step'))
+        self.patch(self.env, 'reset', self.profiled(self.env.reset, 'reset'))
+        self.patch(self.env, 'close', self.closing(self.env.close))
+        self.env.profiler = self
+
+    # instrumentation
+    def patch(self, owner, name, replacement):
+        self.patched.append((owner, name, getattr(owner, name), name in vars(owner)))
+        setattr(owner, name, replacement)
+
+    def instrument(self, target, context, phase):
+        """
+        replace a phase target by its timed version (phase None: text command function), targets missing from this
+        env are skipped
+        """
+        if ':' in target:
+            module_name, name = target.split(':')
+            owner = sys.modules.get(module_name)
+        else:
+            *path, name = target.split('.')
+            owner = self.env
+            for attr in path:
+                parent, owner = owner, getattr(owner, attr, None)
+                if isSharedNamespace(owner):  # i.e. dss.Solution, time through a stand-in
+                    owner = TimedNamespace(owner)
+                    self.patch(parent, attr, owner)
+        if owner is None or not callable(getattr(owner, name, None)):
+            return
+        self.patch(owner, name, self.timed(getattr(owner, name), context, phase))
+
+    def timed(self, fn, context, phase):
+        def wrapper(*args, **kwargs):
+            if self.context != context or self.depth:  # outside the profiled call or nested in another phase
+                return fn(*args, **kwargs)
+            name = phase
+            if name is None:
+                name = command_phases.get(str(args[0]).split(maxsplit=1)[0].lower() if args else '')
+                if name is None:
+                    return fn(*args, **kwargs)
+            self.depth = 1
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current = self.current
+                current[name] = current.get(name, 0.0) + perf_counter() - start
+                self.depth = 0
+        return wrapper
+
+    def profiled(self, fn, context):
+        def wrapper(*args, **kwargs):
+            if self.context is not None:  # i.e. rlEnv.reset() calls step(0)
+                return fn(*args, **kwargs)
+            self.context, self.current = context, {}
+            start = perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                total = perf_counter() - start
+                self.context = None
+            current = self.current
+            current['other'] = max(total - sum(current.values()), 0.0)
+            current['total'] = total
+            pending = self.pending[context]
+            for phase, seconds in current.items():
+                if phase in pending:
+                    pending[phase].append(seconds)
+                else:
+                    pending[phase] = [seconds]
+            self.num_pending += 1
+            if self.num_pending >= LatencyHistogram.flush_size:
+                self.flush()
+            if self.info_key is not None and isinstance(result, tuple) and isinstance(result[-1], dict):
+                result[-1][self.info_key] = self.current  # step: info is last, gymnasium reset: (obs, info)
+            return result
+        return wrapper
+
+    def closing(self, fn):
+        def wrapper(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            self.report()
+            return result
+        return wrapper
+
+    def remove(self):
+        """undo the instrumentation"""
+        for owner, name, original, own in reversed(self.patched):
+            if own:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
+        self.patched = []
+
+    # results
+    def flush(self):
+        """add the pending phase timings to the histograms (one numpy pass per phase)"""
+        for context, phases in self.pending.items():
+            for phase, values in phases.items():
+                key = context + '/' + phase
+                if key not in self.histograms:
+                    self.histograms[key] = LatencyHistogram()
+                self.histograms[key].addMany(values)
+            phases.clear()
+        self.num_pending = 0
+
+    def summary(self):
+        """{'step/solve': {'count', 'mean_ms', 'p50_ms', 'p99_ms', 'max_ms', 'total_s'}, ...}"""
+        self.flush()
+        return {key: hist.summary() for key, hist in sorted(self.histograms.items())}
+
+    def report(self):
+        summary = self.summary()
+        if self.summary_path is not None:
+            with open(self.summary_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+        if self.verbose:
+            print(summaryTable(summary))
+        return summary
+
+
+def summaryTable(summary):
+    lines = ['%-28s %8s %10s %10s %10s %10s' % ('phase', 'count', 'mean ms', 'p50 ms', 'p99 ms', 'max ms')]
+    for key, s in summary.items():
+        lines.append('%-28s %8d %10.4f %10.4f %10.4f %10.4f' % (key, s['count'], s['mean_ms'], s['p50_ms'],
+                                                               s['p99_ms'], s['max_ms']))
+    return '\n'.join(lines)
+
+
+def profiledEnv(env, **kwargs):
+    """wrapper_cls for make_dss_vec_env(): profile the worker env, return it unchanged"""
+    StepProfiler(env, **kwargs)
+    return env
+
+
+class ProfilerCallback(BaseCallback):
+    """
+    SB3 callback collecting info['profile'] of every env (also across SubprocVecEnv workers) and recording
+    profile/<phase>_mean_ms and profile/<phase>_p99_ms to the logger at each rollout end
+    ** values are of the steps since the last logger dump (histograms cleared once the logger wrote them: DQN every
+    log_interval episodes, not every train_freq rollout), a regression or speedup during training shows up in the
+    logged curves, the StepProfiler summary at close() covers the whole run **
+    """
+    def __init__(self, info_key='profile', verbose=0):
+        super().__init__(verbose)
+        self.info_key = info_key
+        self.histograms = {}
+        self.logged_key = None  # a key recorded at the last rollout end, cleared from the logger by its next dump
+
+    def clearDumped(self):
+        """start new histograms once the logger has written (and cleared) the values recorded last"""
+        if self.logged_key is not None and self.logged_key not in self.logger.name_to_value:
+            self.histograms = {}
+            self.logged_key = None
+
+    def _on_step(self) -> bool:
+        self.clearDumped()
+        for info in self.locals.get('infos', []):
+            for phase, seconds in info.get(self.info_key, {}).items():
+                if phase not in self.histograms:
+                    self.histograms[phase] = LatencyHistogram()
+                self.histograms[phase].add(seconds)
+        return True
+
+    def _on_rollout_end(self) -> None:
+        self.clearDumped()  # off-policy algorithms dump inside the rollout
+        for phase, hist in sorted(self.histograms.items()):
+            s = hist.summary()
+            self.logger.record('profile/' + phase + '_mean_ms', s['mean_ms'])
+            self.logger.record('profile/' + phase + '_p99_ms', s['p99_ms'])
+            self.logged_key = 'profile/' + phase + '_p99_ms'
@@ -0,0 +1,195 @@
+"""
+Offline transition dataset of the DSS-Gymnasium environments.
+Every power flow solved during training is kept: TransitionRecorder wraps an environment and streams each transition
+(obs, action, reward, next_obs, terminated, truncated, info) to a folder of compressed column shards, so that replay
+buffers can be pre-filled and agents trained offline without re-running the power flows:
+--> write buffer of shard_size transitions (preallocated arrays, bounded memory), written as one compressed .npz shard
+    (shard_00000.npz, ...) when full and on flush()/close(), new shards are added after the shards already in the folder
+--> columns: obs, action, reward, next_obs, terminated, truncated + info_<key> for the numeric info values (pv powers,
+    solve iterations, ...)
+--> loading: iterShards() decompresses one shard at a time, loadTransitions() concatenates the columns (i.e. reward
+    relabeling with dss_rewards.py), fillReplayBuffer() copies the shards into an SB3 ReplayBuffer
+
+    env = TransitionRecorder(LocalPV_Agent())  # shards in env.output_path, or TransitionRecorder(env, path)
+    ...
+    env.close()  # writes the last (partial) shard
+    model = DQN('MlpPolicy', env=LocalPV_Agent(), learning_starts=0)
+    fillReplayBuffer(model.replay_buffer, path)  # pre-filled replay, then model.learn()
+
+With make_dss_vec_env(..., record_dir=path) every worker records to its own folder path/<rank>.
+** Zip members of a compressed shard can not be memory-mapped, a shard is decompressed when it is read (bounded by
+shard_size transitions), the loaders never hold more than one shard besides their output **
+"""
+
+import glob
+import os
+import numpy as np
+import gymnasium as gym
+
+columns = ('obs', 'action', 'reward', 'next_obs', 'terminated', 'truncated')
+shard_pattern = 'shard_%05d.npz'
+
+
+def isNumeric(value):
+    return isinstance(value, (bool, int, float, np.bool_, np.number))
+
+
+class TransitionWriter:
+    def __init__(self, path, shard_size=10000, info_keys=None):
+        """
+        :param path: folder of the shards (created if missing)
+        :param shard_size: transitions per shard = size of the write buffer
+        :param info_keys: info values recorded as info_<key> columns, None: the numeric values of the first info
+        """
+        self.path = path
+        self.shard_size = shard_size
+        self.info_keys = None if info_keys is None else list(info_keys)
+        os.makedirs(path, exist_ok=True)
+        self.shard = len(glob.glob(os.path.join(path, 'shard_*.npz')))  # next shard, after the shards of earlier runs
+        self.buffer = None  # column -> array of shard_size rows, allocated by the first transition
+        self.count = 0  # transitions in the buffer
+        self.total = 0  # transitions written by this writer
+
+    def allocate(self, obs, action, info):
+        if self.info_keys is None:
+            self.info_keys = [key for key, value in info.items() if isNumeric(value)]
+        obs, action = np.asarray(obs), np.asarray(action)
+        self.buffer = {'obs': np.zeros((self.shard_size,) + obs.shape, dtype=obs.dtype),
+                       'action': np.zeros((self.shard_size,) + action.shape, dtype=action.dtype),
+                       'reward': np.zeros(self.shard_size),
+                       'next_obs': np.zeros((self.shard_size,) + obs.shape, dtype=obs.dtype),
+                       'terminated': np.zeros(self.shard_size, dtype=bool),
+                       'truncated': np.zeros(self.shard_size, dtype=bool)}
+        for key in self.info_keys:
+            self.buffer['info_' + key] = np.zeros(self.shard_size)
+
+    def add(self, obs, action, reward, next_obs, terminated, truncated, info):
+        """buffer one transition, write the shard when the buffer is full"""
+        if self.buffer is None:
+            self.allocate(obs, action, info)
+        row, buffer = self.count, self.buffer
+        buffer['obs'][row] = obs
+        buffer['action'][row] = action
+        buffer['reward'][row] = reward
+        buffer['next_obs'][row] = next_obs
+        buffer['terminated'][row] = terminated
+        buffer['truncated'][row] = truncated
+        for key in self.info_keys:
+            value = info.get(key, np.nan)
+            buffer['info_' + key][row] = value if isNumeric(value) else np.nan
+        self.count += 1
+        if self.count == self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """write the buffered transitions as the next shard"""
+        if not self.count:
+            return
+        shard = {key: values[:self.count] for key, values in self.buffer.items()}
+        np.savez_compressed(os.path.join(self.path, shard_pattern % self.shard), **shard)
+        self.shard += 1
+        self.total += self.count
+        self.count = 0
+
+
+class TransitionRecorder(gym.Wrapper):
+    def __init__(self, env, path=None, shard_size=10000, info_keys=None):
+        """
+        :param env: DSS-Gymnasium environment
+        :param path: folder of the shards, None: env.output_path
+        :param shard_size: transitions per shard = size of the write buffer
+        :param info_keys: info values recorded as info_<key> columns, None: the numeric values of the first step info
+        """
+        super().__init__(env)
+        if path is None:
+            path = getattr(env.unwrapped, 'output_path', None)
+            if path is None:
+                raise ValueError('%s has no output_path, pass the shard folder path' % type(env.unwrapped).__name__)
+        self.writer = TransitionWriter(path, shard_size, info_keys)
+        self.last_obs = None
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.last_obs = np.array(obs)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.writer.add(self.last_obs, action, reward, obs, terminated, truncated, info)
+        self.last_obs = np.array(obs)
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.flush()
+        return self.env.close()
+
+
+def workerOrder(name):
+    """sort key of the worker sub folders: ranks in numeric order (2 before 10), other names after them"""
+    return (0, int(name), '') if name.isdigit() else (1, 0, name)
+
+
+def shardFiles(path):
+    """shard files of a folder in write order, then those of each worker sub folder (rank order)"""
+    files = sorted(glob.glob(os.path.join(path, 'shard_*.npz')))
+    if not os.path.isdir(path):
+        return files
+    folders = [name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
+    for folder in sorted(folders, key=workerOrder):
+        files += sorted(glob.glob(os.path.join(path, folder, 'shard_*.npz')))
+    return files
+
+
+def iterShards(path, keys=None):
+    """columns (dict key -> array) of every shard, one shard decompressed at a time"""
+    for file in shardFiles(path):
+        with np.load(file) as shard:
+            yield {key: shard[key] for key in (shard.files if keys is None else keys)}
+
+
+def loadTransitions(path, keys=None):
+    """all transitions of a folder, dict column -> concatenated array"""
+    shards = list(iterShards(path, keys))
+    if not shards:
+        raise ValueError('no transition shards in %s' % path)
+    return {key: np.concatenate([shard[key] for shard in shards]) for key in shards[0]}
+
+
+def fillReplayBuffer(replay_buffer, path, limit=None):
+    """
+    copy recorded transitions into an SB3 ReplayBuffer (single env, n_envs = 1), the last buffer_size ones are kept
+    :param replay_buffer: i.e. model.replay_buffer of DQN, SAC, TD3
+    :param path: shard folder
+    :param limit: maximum number of transitions copied
+    :return: number of transitions copied
+    """
+    if replay_buffer.n_envs != 1:
+        raise ValueError('recorded transitions fill a single env replay buffer, got n_envs=%d' % replay_buffer.n_envs)
+    size = replay_buffer.buffer_size
+    copied = 0
+    for shard in iterShards(path, columns):
+        n = len(shard['reward']) if limit is None else min(len(shard['reward']), limit - copied)
+        if n <= 0:
+            break
+        done = shard['terminated'][:n] | shard['truncated'][:n]
+        timeout = shard['truncated'][:n] & ~shard['terminated'][:n]  # SB3: TimeLimit.truncated
+        if replay_buffer.optimize_memory_usage:
+            # next observation shares the observation array, add() keeps it consistent
+            for k in range(n):
+                replay_buffer.add(shard['obs'][k:k + 1], shard['next_obs'][k:k + 1], shard['action'][k:k + 1],
+                                  shard['reward'][k:k + 1], done[k:k + 1], [{'TimeLimit.truncated': timeout[k]}])
+        else:
+            first = max(n - size, 0)  # rows overwritten in this copy anyway
+            rows = (replay_buffer.pos + np.arange(first, n)) % size
+            obs_shape = (-1,) + replay_buffer.obs_shape
+            replay_buffer.observations[rows, 0] = shard['obs'][first:n].reshape(obs_shape)
+            replay_buffer.next_observations[rows, 0] = shard['next_obs'][first:n].reshape(obs_shape)
+            replay_buffer.actions[rows, 0] = shard['action'][first:n].reshape(-1, replay_buffer.action_dim)
+            replay_buffer.rewards[rows, 0] = shard['reward'][first:n]
+            replay_buffer.dones[rows, 0] = done[first:]
+            if replay_buffer.handle_timeout_termination:
+                replay_buffer.timeouts[rows, 0] = timeout[first:]
+            replay_buffer.full = replay_buffer.full or replay_buffer.pos + n >= size
+            replay_buffer.pos = (replay_buffer.pos + n) % size
+        copied += n
+    return copied
@@ -0,0 +1,93 @@
+"""
+Vectorized reward terms for the DSS-Gymnasium environments.
+Every term takes whole arrays (one value per bus node or DER, with any leading batch axes, i.e. (envs, nodes) or
+(steps, DERs) of recorded transitions) and returns the reward of every element, no Python loop over the elements:
+--> voltageBand: -1 per voltage outside the operational band [vmin, vmax]
+--> voltageDeviation: -(v - vref)**2
+--> q1547: -(q - 0.44 s)**2 where |q| exceeds the IEEE 1547 Q limit 0.44 s
+--> qNameplate: -1 where |q| exceeds the Q headroom sqrt(s**2 - p**2) of the nameplate
+--> servedLoad: served load normalized by a reference load (rlEnv: load restored by the human switching sequence)
+RewardFunction composes weighted terms from a config, i.e. for the voltage reward of a full network observation:
+
+    reward = RewardFunction([('voltage_band', 1.0), ('voltage_deviation', 1.0, {'vref': 1.0})])
+    r = reward(v=voltages)  # sum over the last axis: float for (nodes,), (envs,) for (envs, nodes)
+    terms = reward.terms(v=voltages)  # per term sums (logging, reward relabeling)
+"""
+
+import numpy as np
+
+
+def voltageViolations(v, vmin=0.95, vmax=1.05):
+    """mask of the voltages outside [vmin, vmax]"""
+    v = np.asarray(v)
+    return (v > vmax) | (v < vmin)
+
+
+def voltageBand(v, vmin=0.95, vmax=1.05, penalty=-1.0):
+    """penalty of every voltage outside [vmin, vmax], 0 inside"""
+    return np.where(voltageViolations(v, vmin, vmax), penalty, 0.0)
+
+
+def voltageDeviation(v, vref=1.0):
+    """squared deviation of every voltage from vref (negative)"""
+    return -1 * ((np.asarray(v) - vref)**2)
+
+
+def q1547(s, q, limit=0.44):
+    """squared excess of Q over the IEEE 1547 limit (limit x kVA rating) of every DER, 0 within the limit"""
+    s, q = np.asarray(s), np.asarray(q)
+    qlim = limit * s
+    return np.where(np.abs(q) > np.abs(qlim), -1 * ((q - qlim)**2), 0.0)
+
+
+def qNameplate(s, p, q, penalty=-1.0):
+    """penalty of every DER whose |Q| exceeds the nameplate headroom sqrt(s**2 - p**2), 0 within it"""
+    s, p, q = np.asarray(s), np.asarray(p), np.asarray(q)
+    qlim = np.sqrt(np.maximum(s**2 - p**2, 0.0))
+    return np.where(np.abs(q) > qlim, penalty, 0.0)
+
+
+def servedLoad(served, reference):
+    """served load normalized by the reference load (1.0 = reference restored)"""
+    return np.asarray(served) / np.asarray(reference)
+
+
+# term name -> (function, measurements it reads)
+reward_terms = {'voltage_band': (voltageBand, ('v',)),
+                'voltage_deviation': (voltageDeviation, ('v',)),
+                'q_1547': (q1547, ('s', 'q')),
+                'q_nameplate': (qNameplate, ('s', 'p', 'q')),
+                'served_load': (servedLoad, ('served', 'reference'))}
+
+
+class RewardFunction:
+    def __init__(self, config):
+        """
+        :param config: list of (term, weight) or (term, weight, keyword arguments of the term), term in reward_terms
+        """
+        self.config = []
+        for entry in config:
+            name, weight = entry[0], entry[1]
+            if name not in reward_terms:
+                raise ValueError('unknown reward term %r, expected one of %s' % (name, list(reward_terms)))
+            self.config.append((name, weight, dict(entry[2]) if len(entry) > 2 else {}))
+
+    def elements(self, **measurements):
+        """weighted reward of every element (all terms on arrays of the same shape)"""
+        return sum(weight * self.term(name, kwargs, measurements) for name, weight, kwargs in self.config)
+
+    def term(self, name, kwargs, measurements):
+        function, inputs = reward_terms[name]
+        return function(*[measurements[key] for key in inputs], **kwargs)
+
+    def terms(self, **measurements):
+        """weighted sum of every term over the last axis (scalar terms as they are), dict term -> reward"""
+        sums = {}
+        for name, weight, kwargs in self.config:
+            values = self.term(name, kwargs, measurements)
+            sums[name] = weight * (np.sum(values, axis=-1) if np.ndim(values) else values)
+        return sums
+
+    def __call__(self, **measurements):
+        """total reward: weighted terms summed over the last axis"""
+        return sum(self.terms(**measurements).values())
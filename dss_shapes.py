@@ -0,0 +1,69 @@
+"""
+Loadshape and Tshape construction for the DSS-Gymnasium circuits without string round-trips.
+Passing a time series in a DSS command (temp=[...] / mult=[...]) turns every value into text which the DSS parser has to
+tokenize again on each circuit build (8640 values per shape in the example circuits).  Instead:
+--> newLoadshape(): PMult/QMult copied from contiguous float64 buffers (LoadShape interface)
+--> newTshape(): temperatures copied from a contiguous float64 buffer (AltDSS TShape, OpenDSSDirect has no Tshape interface)
+--> loadshapeFromFile() / tshapeFromFile(): read by OpenDSS from binary files (.dbl float64, .sng float32, else text)
+    written once with writeShapeFile()
+
+    from dss_shapes import newLoadshape, newTshape
+    newLoadshape('lshape_1', loadshape_1, loadshape_1, minterval=15)  # P and Q multipliers
+    newTshape('Temp', pv_temp, minterval=15)
+"""
+
+import os
+import numpy as np
+import opendssdirect as dss
+
+
+def shapeBuffer(values):
+    """contiguous float64 vector of a (steps,) or (steps, 1) array, list or DataFrame column (no copy if already one)"""
+    return np.ascontiguousarray(values, dtype=np.float64).reshape(-1)
+
+
+def newLoadshape(name, pmult, qmult=None, minterval=60):
+    """
+    add Loadshape.<name>, npts = length of pmult
+    :param pmult: real power multipliers
+    :param qmult: reactive power multipliers (optional, may be the pmult array)
+    :param minterval: interval between points (minutes)
+    """
+    pbuffer = shapeBuffer(pmult)
+    dss.Command('New Loadshape.' + name)
+    dss.LoadShape.Npts(len(pbuffer))
+    dss.LoadShape.MinInterval(minterval)
+    dss.LoadShape.PMult(pbuffer)
+    if qmult is not None:
+        dss.LoadShape.QMult(pbuffer if qmult is pmult else shapeBuffer(qmult))
+
+
+def newTshape(name, temp, minterval=60):
+    """add Tshape.<name> (i.e. PV TDaily temperatures), npts = length of temp"""
+    tbuffer = shapeBuffer(temp)
+    dss.to_altdss().TShape.new(name, NPts=len(tbuffer), MInterval=minterval, Temp=tbuffer)
+
+
+def writeShapeFile(path, values):
+    """save a shape as raw float64 (.dbl) or float32 (.sng) values for loadshapeFromFile() / tshapeFromFile()"""
+    dtype = np.float32 if os.path.splitext(path)[1].lower() == '.sng' else np.float64
+    shapeBuffer(values).astype(dtype).tofile(path)
+
+
+def shapeFile(path):
+    """DSS array-from-file value of a shape file, format by extension"""
+    key = {'.dbl': 'dblfile', '.sng': 'sngfile'}.get(os.path.splitext(path)[1].lower(), 'file')
+    return '(%s="%s")' % (key, path)
+
+
+def loadshapeFromFile(name, npts, path, qpath=None, minterval=60):
+    """add Loadshape.<name> with multipliers read by OpenDSS from path (and qpath for Q)"""
+    command = 'New Loadshape.%s npts=%d minterval=%s mult=%s' % (name, npts, minterval, shapeFile(path))
+    if qpath is not None:
+        command += ' qmult=' + shapeFile(qpath)
+    dss.Command(command)
+
+
+def tshapeFromFile(name, npts, path, minterval=60):
+    """add Tshape.<name> with temperatures read by OpenDSS from path"""
+    dss.Command('New Tshape.%s npts=%d minterval=%s temp=%s' % (name, npts, minterval, shapeFile(path)))
@@ -0,0 +1,85 @@
+"""
+Vectorized DSS-Gymnasium environments for Stable Baselines3.
+OpenDSSDirect drives one process-global OpenDSS engine, so two environment instances in the same process overwrite
+each other's circuit.  make_dss_vec_env() runs every environment copy in its own worker process (one OpenDSS engine
+per worker) and returns an SB3 SubprocVecEnv, allowing training to scale across cores:
+
+    from dss_vec_env import make_dss_vec_env
+    env = make_dss_vec_env(LocalPV_Agent, n_envs=8, seeds=0)
+    model = DQN('MlpPolicy', env=env)
+
+** Call from inside an  if __name__ == '__main__':  block, worker processes re-import the training script **
+"""
+
+import os
+import random
+import numpy as np
+from gymnasium.utils import seeding
+
+
+def workerSeeds(n_envs, seeds=None):
+    """per-worker seeds: list of n_envs seeds, consecutive seeds from an int base seed, or None (unseeded)"""
+    if seeds is None:
+        return [None] * n_envs
+    if isinstance(seeds, (int, np.integer)):
+        return [int(seeds) + rank for rank in range(n_envs)]
+    seeds = [None if s is None else int(s) for s in seeds]
+    if len(seeds) != n_envs:
+        raise ValueError('expected %d worker seeds, got %d' % (n_envs, len(seeds)))
+    return seeds
+
+
+def seedWorker(env, seed):
+    """seed global python/numpy RNGs of the worker process plus the environment RNG and action space"""
+    if seed is None:
+        return
+    random.seed(seed)  # envs drawing from the random module (i.e. random fault cases)
+    np.random.seed(seed)
+    env.unwrapped.np_random, _ = seeding.np_random(seed)  # i.e. random episode starting point
+    env.action_space.seed(seed)
+
+
+class DSSWorker:
+    """picklable env constructor, called once inside each worker process"""
+    def __init__(self, env_cls, rank, seed, env_kwargs=None, monitor_dir=None, wrapper_cls=None, record_dir=None):
+        self.env_cls = env_cls
+        self.rank = rank
+        self.seed = seed
+        self.env_kwargs = env_kwargs or {}
+        self.monitor_dir = monitor_dir
+        self.wrapper_cls = wrapper_cls
+        self.record_dir = record_dir
+
+    def __call__(self):
+        env = self.env_cls(**self.env_kwargs)  # env builds/compiles its circuit in this process' engine
+        seedWorker(env, self.seed)
+        if self.monitor_dir is not None:
+            from stable_baselines3.common.monitor import Monitor
+            os.makedirs(self.monitor_dir, exist_ok=True)
+            env = Monitor(env, os.path.join(self.monitor_dir, str(self.rank)))
+        if self.wrapper_cls is not None:
+            env = self.wrapper_cls(env)
+        if self.record_dir is not None:
+            from dss_recorder import TransitionRecorder
+            env = TransitionRecorder(env, os.path.join(self.record_dir, str(self.rank)))
+        return env
+
+
+def make_dss_vec_env(env_cls, n_envs, seeds=None, env_kwargs=None, monitor_dir=None, wrapper_cls=None,
+                     start_method=None, record_dir=None):
+    """
+    build an SB3 SubprocVecEnv of n_envs copies of env_cls, each with its own OpenDSS engine (worker process)
+    :param env_cls: DSS-Gymnasium environment class (i.e. LocalPV_Agent, SinglePV_Agent)
+    :param n_envs: number of worker processes
+    :param seeds: int base seed (worker i gets seeds + i), list of per-worker seeds, or None
+    :param env_kwargs: keyword arguments passed to env_cls
+    :param monitor_dir: write one SB3 Monitor log per worker to this folder (optional)
+    :param wrapper_cls: additional wrapper applied to each worker env (optional)
+    :param start_method: multiprocessing start method, default is SB3's (forkserver, or spawn on Windows)
+    :param record_dir: record the transitions of each worker to the shard folder record_dir/<rank> (dss_recorder.py)
+    :return: SubprocVecEnv
+    """
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    env_fns = [DSSWorker(env_cls, rank, seed, env_kwargs, monitor_dir, wrapper_cls, record_dir)
+               for rank, seed in enumerate(workerSeeds(n_envs, seeds))]
+    return SubprocVecEnv(env_fns, start_method=start_method)
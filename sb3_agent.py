@@ -14,6 +14,20 @@ import os
 gym_env = myAgent()
 check_env(gym_env, warn=True)  # print warnings
 
+# parallel training (one OpenDSS engine per worker process), build inside  if __name__ == '__main__':
+# from dss_vec_env import make_dss_vec_env
+# gym_env = make_dss_vec_env(myAgent, n_envs=4, seeds=0)
+
+# step/reset phase timings (info['profile'], profile/* logger keys, summary table printed at close())
+# from dss_profiler import StepProfiler, ProfilerCallback, profiledEnv
+# StepProfiler(gym_env)  # or make_dss_vec_env(..., wrapper_cls=profiledEnv)
+# model.learn(..., callback=ProfilerCallback())
+
+# keep every transition (obs, action, reward, next_obs, done, info) as compressed shards for offline RL
+# from dss_recorder import TransitionRecorder, fillReplayBuffer
+# gym_env = TransitionRecorder(gym_env, os.path.join(os.getcwd(), 'transitions'))  # vec env: record_dir=
+# fillReplayBuffer(model.replay_buffer, path)  # pre-fill the replay of an off-policy model (DQN, SAC, TD3)
+
 # set params for training
 # set your local path for logging training data, saving model
 log_path = os.getcwd()
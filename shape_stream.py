@@ -0,0 +1,102 @@
+"""
+Streaming time series shapes for the DSS-Gymnasium circuits.
+Instead of building the loadshapes of the whole simulated period up front (i.e. 8640 points of a 30 or 90 day slice),
+every shape holds chunk_steps points, refilled from the full series (year or multi-year csv data, memory-mapped by
+timeseries_cache.loadSeries) whenever the solution time enters another chunk:
+--> fixed interval shapes wrap around, solution step n reads point (n - 1) mod chunk_steps of the shape, which is point
+    n - 1 of the series once the chunk of step n is loaded
+--> the solution clock runs over the whole series (episodes may start anywhere), memory stays one chunk per shape
+--> series shorter than the solution time wrap around to their first point
+
+    stream = ShapeStream(chunk_steps=2016, minterval=5)  # one week of 5 min points
+    stream.addLoadshape('lshape_1', load_1, load_1)
+    stream.addTshape('Temp', temp)
+    stream.build()  # creates the shapes, before the elements using them
+    stream.seek(start_step)  # episode start: solution time + chunk
+    ...
+    stream.update()  # before every Solve()
+    self.Solution.Solve()
+
+** The solution step size must equal minterval **
+"""
+
+import numpy as np
+import opendssdirect as dss
+from dss_shapes import newLoadshape, newTshape
+
+
+class ShapeStream:
+    def __init__(self, chunk_steps, minterval):
+        """
+        :param chunk_steps: points per shape (i.e. 2016 = one week of 5 min steps)
+        :param minterval: time step of the series and of the solution (minutes)
+        """
+        self.chunk_steps = chunk_steps
+        self.minterval = minterval
+        self.shapes = []  # (kind, name, series, q series or None)
+        self.total_steps = None  # points of the shortest series
+        self.chunk = None  # chunk loaded in the shapes
+
+    def addLoadshape(self, name, pmult, qmult=None):
+        """stream Loadshape.<name> from the pmult (and qmult, may be the pmult array) series"""
+        self.addSeries('loadshape', name, pmult, qmult)
+
+    def addTshape(self, name, temp):
+        """stream Tshape.<name> from the temp series"""
+        self.addSeries('tshape', name, temp, None)
+
+    def addSeries(self, kind, name, series, qseries):
+        same = qseries is series
+        series = np.asarray(series).reshape(-1)  # (steps, 1) arrays/memmaps without copy
+        if qseries is not None:
+            qseries = series if same else np.asarray(qseries).reshape(-1)
+        self.shapes.append((kind, name, series, qseries))
+        self.total_steps = len(series) if self.total_steps is None else min(self.total_steps, len(series))
+
+    def chunkData(self, series, chunk):
+        """chunk_steps points of a series starting at chunk x chunk_steps (wrapping around the series end)"""
+        return series[np.arange(chunk * self.chunk_steps, (chunk + 1) * self.chunk_steps) % self.total_steps]
+
+    def build(self):
+        """create the shapes filled with the first chunk"""
+        for kind, name, series, qseries in self.shapes:
+            data = self.chunkData(series, 0)
+            if kind == 'tshape':
+                newTshape(name, data, self.minterval)
+            else:
+                qdata = data if qseries is series else None if qseries is None else self.chunkData(qseries, 0)
+                newLoadshape(name, data, qdata, self.minterval)
+        self.chunk = 0
+
+    def load(self, chunk):
+        """refill every shape with the given chunk of its series"""
+        for kind, name, series, qseries in self.shapes:
+            data = self.chunkData(series, chunk)
+            if kind == 'tshape':
+                dss.to_altdss().TShape[name].Temp = data
+            else:
+                dss.LoadShape.Name(name)
+                dss.LoadShape.PMult(data)
+                if qseries is not None:
+                    dss.LoadShape.QMult(data if qseries is series else self.chunkData(qseries, chunk))
+        self.chunk = chunk
+
+    def nextPoint(self):
+        """series point read by the next solution step (daily mode Solve advances the clock before solving)"""
+        return int(round(dss.Solution.DblHour() * 60 / self.minterval))
+
+    def update(self):
+        """load the chunk of the next solution step if another chunk is loaded"""
+        chunk = self.nextPoint() // self.chunk_steps
+        if chunk != self.chunk:
+            self.load(chunk)
+
+    def seek(self, step):
+        """set the solution time to step (next solve reads series point step) and load its chunk"""
+        dss.Solution.DblHour(step * self.minterval / 60)
+        self.update()
+
+    def stepsInChunk(self, stride=1):
+        """solves left in the loaded chunk, stride solution steps apart (i.e. 2 per env step)"""
+        end = (self.chunk + 1) * self.chunk_steps
+        return max(-(-(end - self.nextPoint()) // stride), 0)
@@ -0,0 +1,108 @@
+"""
+Warm-started daily-mode step solves for the DSS-Gymnasium PV environments.
+A daily-mode Solve() starts from the voltages of the previous solution, so consecutive env steps only need a few
+Newton iterations.  StepSolver runs the Solve() + FinishTimeStep() of an env step and adds:
+--> solve statistics for info: 'iterations', 'control_iterations', 'converged', 'solve_skipped'
+--> skip_unchanged: no power flow when the control setpoint and every load/PV multiplier (Loadshapes and Tshapes at the
+    next solution time) equal those of the last solve (i.e. night hours at zero irradiance with flat loads), the
+    clock advances and monitors sample the previous solution as Solve() would
+The environments keep the last solution as initial guess of the next episode with warm_start=True (reset() restores
+the compiled circuit without the flat start solves).
+
+    self.solver = StepSolver(skip_unchanged=True)
+    self.solver.bind(stream)  # after every circuit build, stream = ShapeStream or None
+    self.solver.reset()  # episode start
+    ...
+    solve_info = self.solver.solve(setpoint)  # replaces stream.update() + Solve() + FinishTimeStep()
+    info.update(solve_info)
+"""
+
+import numpy as np
+import opendssdirect as dss
+from dss_batch import shapeIndex
+
+
+class ShapeMultipliers:
+    def __init__(self):
+        """read the multipliers of every Loadshape (P and Q) and Tshape of the circuit"""
+        self.shapes = []  # (values, interval hours)
+        self.fixed = True  # False if a shape has variable intervals (multipliers not compared)
+        for name in dss.LoadShape.AllNames():
+            dss.LoadShape.Name(name)
+            interval = dss.LoadShape.HrInterval()
+            self.fixed = self.fixed and interval > 0
+            self.shapes.append((np.asarray(dss.LoadShape.PMult()), interval))
+            if len(dss.LoadShape.QMult()) == dss.LoadShape.Npts():
+                self.shapes.append((np.asarray(dss.LoadShape.QMult()), interval))
+        tshapes = dss.to_altdss().TShape
+        for temp, minterval in zip(tshapes.Temp, tshapes.MInterval):
+            self.fixed = self.fixed and minterval > 0
+            self.shapes.append((np.asarray(temp), minterval / 60))
+
+    def at(self, hour):
+        """multiplier of every shape at solution hour, None if not comparable"""
+        if not self.fixed:
+            return None
+        return np.array([values[shapeIndex(hour, interval, len(values))] for values, interval in self.shapes])
+
+
+class StepSolver:
+    def __init__(self, skip_unchanged=False):
+        """
+        :param skip_unchanged: skip the power flow of steps with the setpoint + multipliers of the last solve
+        """
+        self.skip_unchanged = skip_unchanged
+        self.Solution = dss.Solution  # solve calls (timed by dss_profiler through solver.Solution)
+        self.stream = None
+        self.shapes = None
+        self.chunk = None  # stream chunk of the multipliers read in shapes
+        self.last_setpoint = None
+        self.last_values = None  # multipliers of the last solve
+        self.converged = False
+
+    def bind(self, stream=None):
+        """use the shapes of a newly built circuit (streamed shapes are re-read when another chunk is loaded)"""
+        self.stream = stream
+        self.shapes = ShapeMultipliers() if self.skip_unchanged else None
+        self.chunk = None if stream is None else stream.chunk
+        self.reset()
+
+    def reset(self):
+        """forget the last solve, the next step is solved"""
+        self.last_setpoint = None
+        self.last_values = None
+
+    def multipliers(self, hour):
+        if self.stream is not None and self.stream.chunk != self.chunk:
+            self.shapes = ShapeMultipliers()
+            self.chunk = self.stream.chunk
+        return self.shapes.at(hour)
+
+    def solve(self, setpoint=None):
+        """
+        one env step: Solve() + FinishTimeStep(), or the clock advance only if nothing changed since the last solve
+        :param setpoint: control setpoint of the step (i.e. PV kvar), None counts as changed
+        :return: dict of iterations, control_iterations, converged, solve_skipped
+        """
+        if self.stream is not None:
+            self.stream.update()  # next chunk of the streamed shapes
+        values = None
+        skipped = False
+        if self.skip_unchanged:
+            hour = self.Solution.DblHour() + self.Solution.StepSize() / 3600  # Solve() advances the clock first
+            values = self.multipliers(hour)
+            skipped = (values is not None and self.last_values is not None and self.converged and
+                       setpoint is not None and setpoint == self.last_setpoint and
+                       np.array_equal(values, self.last_values))
+        if skipped:
+            self.Solution.DblHour(hour)
+            dss.Monitors.SampleAll()
+            iterations, control_iterations = 0, 0
+        else:
+            self.Solution.Solve()
+            iterations, control_iterations = self.Solution.Iterations(), self.Solution.ControlIterations()
+            self.converged = self.Solution.Converged()
+            self.last_setpoint, self.last_values = setpoint, values
+        self.Solution.FinishTimeStep()
+        return {'iterations': iterations, 'control_iterations': control_iterations, 'converged': self.converged,
+                'solve_skipped': skipped}
@@ -0,0 +1,128 @@
+"""
+Per-step state snapshot for the DSS-Gymnasium environments.
+Every quantity the environment needs after a power flow (bus voltage, PV powers, custom measurements) is read from
+OpenDSS once, right after Solve(), then shared by the observation, reward, info and violation counting of that step:
+
+    self.state = StepState(bus='890', pv_name='pv890')
+    ...
+    self.Solution.Solve()
+    state = self.state.update()
+    obs = np.array([state.vpu])
+
+Custom environments (build_environment.myAgent) register extra measurements with addReader(), each reader is called
+once per update() and its result is available as an attribute of the snapshot.
+
+NodeVoltages observes the p.u. voltage magnitude of every node of the network (or of a subset) with one AllBusMagPu
+read per step (AltDSS, returned as a NumPy array): the node order index (AllNodeNames -> bus name, phase) is built once
+by bind() after the circuit is compiled, so observing ~280 nodes costs about as much as reading one bus.  The size of
+the observation is known before the circuit is compiled when the node names of the feeder are given (circuit_nodes):
+
+    self.network = NodeVoltages(nodes=['71', '72.1'], circuit_nodes=node_names)  # None: every node, bus: all phases
+    self.network.bind()  # after every circuit build
+    self.state.addReader('node_vpu', self.network.read)  # float32 array, order of self.network.names
+"""
+
+import numpy as np
+import opendssdirect as dss
+
+
+class StepState:
+    def __init__(self, bus=None, pv_name=None):
+        """
+        :param bus: observed bus, first node p.u. voltage (real part) read as state.vpu
+        :param pv_name: PVSystem read as state.s (kVA rating), state.p (kW), state.q (kvar)
+        """
+        self.bus = bus
+        self.pv_name = pv_name
+        self.readers = {}  # name -> callable, custom measurements
+        self.vpu = None
+        self.s = None
+        self.p = None
+        self.q = None
+
+    def addReader(self, name, reader):
+        """register a measurement read once per step (reader() -> value), available as state.<name>"""
+        self.readers[name] = reader
+        setattr(self, name, None)
+
+    def update(self):
+        """read every quantity of the present solution"""
+        if self.bus is not None:
+            dss.Circuit.SetActiveBus(self.bus)
+            self.vpu = dss.Bus.PuVoltage()[0]
+        if self.pv_name is not None:
+            dss.PVsystems.Name(self.pv_name)
+            self.s = dss.PVsystems.kVARated()
+            self.p = dss.PVsystems.kW()
+            self.q = dss.PVsystems.kvar()
+        for name, reader in self.readers.items():
+            setattr(self, name, reader())
+        return self
+
+    def powersPu(self, ndigits):
+        """PV p, q on PV rating base (NOT SYSTEM BASE!!), rounded"""
+        return round(self.p / self.s, ndigits), round(self.q / self.s, ndigits)
+
+
+class NodeVoltages:
+    def __init__(self, nodes=None, dtype=np.float32, circuit_nodes=None):
+        """
+        :param nodes: observed subset, node names ('71.1') and/or bus names ('71' = every phase of the bus), None: all
+        :param dtype: dtype of the observation
+        :param circuit_nodes: node names of the circuit (AllNodeNames order) known before it is compiled, i.e. from the
+            feeder definition: the observed nodes (size) are set without compiling, bind() checks them on the circuit
+        """
+        self.nodes = None if nodes is None else [str(node).lower() for node in nodes]
+        self.dtype = dtype
+        self.circuit = None  # AltDSS circuit of bind()
+        self.index = None  # position of the observed nodes in AllNodeNames/AllBusMagPu, None: all nodes
+        self.names = []
+        self.buses = []
+        self.phases = []
+        self.size = 0
+        self.fixed = circuit_nodes is not None  # observed nodes chosen from circuit_nodes, not by bind()
+        if self.fixed:
+            self.select([name.lower() for name in circuit_nodes])
+
+    def select(self, all_names):
+        """choose the observed nodes among the node names of a circuit, return their positions"""
+        if self.nodes is None:
+            index = list(range(len(all_names)))
+        else:
+            positions = {name: k for k, name in enumerate(all_names)}
+            index = []
+            for node in self.nodes:
+                if node in positions:
+                    index.append(positions[node])
+                    continue
+                bus_nodes = [k for k, name in enumerate(all_names) if name.split('.')[0] == node]
+                if not bus_nodes:
+                    raise ValueError('observed node %r not found in the circuit' % node)
+                index.extend(bus_nodes)
+        self.names = [all_names[k] for k in index]
+        self.buses = [name.split('.')[0] for name in self.names]
+        self.phases = np.array([int(name.split('.')[1]) for name in self.names], dtype=np.int64)
+        self.size = len(self.names)
+        return index
+
+    def bind(self):
+        """build the node order index of a newly compiled circuit"""
+        self.circuit = dss.to_altdss()
+        all_names = [name.lower() for name in dss.Circuit.AllNodeNames()]
+        if self.fixed:
+            positions = {name: k for k, name in enumerate(all_names)}
+            missing = [name for name in self.names if name not in positions]
+            if missing:
+                raise ValueError('observed nodes %s not found in the compiled circuit' % missing[:5])
+            index = [positions[name] for name in self.names]
+        else:
+            index = self.select(all_names)
+        self.index = None if index == list(range(len(all_names))) else np.array(index, dtype=np.int64)
+        return self
+
+    def read(self):
+        """p.u. voltage magnitude of the observed nodes of the present solution"""
+        vpu = self.circuit.BusVMagPU()  # AllBusMagPu, node order
+        if self.index is not None:
+            vpu = vpu[self.index]
+        return vpu.astype(self.dtype)
@@ -0,0 +1,90 @@
+"""
+On-disk cache for preprocessed time series data (loadshapes, PV output, temperature profiles).
+Hourly csv data is resampled, interpolated, sliced, and (optionally) normalized once, then stored as a binary .npy
+file next to the source csv.  Later calls memory-map the stored array, so circuit rebuilds and new worker processes
+skip pandas parsing altogether.
+--> cache key: source file hash + resolution + date slice + normalization
+--> a cached array is invalidated (rebuilt) when the source csv changes
+"""
+
+import hashlib
+import os
+import glob
+import numpy as np
+
+cache_folder = '__tscache__'  # created next to the source csv files
+_file_hashes = {}  # (path, mtime, size) -> content hash, avoids re-hashing within one process
+
+
+def fileHash(csv_path):
+    """sha1 of source file contents (memoized on file path, modification time and size)"""
+    stat = os.stat(csv_path)
+    key = (os.path.abspath(csv_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        with open(csv_path, 'rb') as f:
+            _file_hashes[key] = hashlib.sha1(f.read()).hexdigest()
+    return _file_hashes[key]
+
+
+def paramHash(**params):
+    """hash of the preprocessing parameters applied to the source data"""
+    text = repr(sorted(params.items()))
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def resampleSeries(csv_path, resolution, start=None, end=None, columns=None, normalize=False):
+    """
+    read hourly csv data indexed by 'LocalTime', resample to resolution (i.e. '15min') w/ linear interpolation,
+    slice the date range [start:end] and normalize each column by its max absolute value (optional)
+    :return: 2D float64 array (time steps x columns)
+    """
+    import pandas as pd  # only needed on a cache miss
+    df = pd.read_csv(csv_path)
+    df['LocalTime'] = pd.to_datetime(df['LocalTime'])
+    df.set_index('LocalTime', inplace=True)
+    if columns is not None:
+        df = df[list(columns)]
+    df = df.resample(resolution).asfreq()
+    df = df.interpolate(method='linear')
+    df = df[start:end]
+    df = df.reset_index(drop=True)
+    if normalize:
+        df = df / df.abs().max()
+    return df.to_numpy(dtype=np.float64)
+
+
+def loadSeries(csv_path, resolution, start=None, end=None, columns=None, normalize=False, cache_dir=None):
+    """
+    return resampleSeries() output as a read-only memory-mapped array, building the cache file on a miss
+    Paths which are not local files (i.e. urls) are processed without caching.
+    """
+    params = dict(resolution=resolution, start=start, end=end, normalize=normalize,
+                  columns=None if columns is None else tuple(columns))
+    if not os.path.isfile(csv_path):
+        return resampleSeries(csv_path, **params)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), cache_folder)
+    stem = os.path.splitext(os.path.basename(csv_path))[0] + '.' + paramHash(**params)
+    cache_file = os.path.join(cache_dir, stem + '.' + fileHash(csv_path)[:16] + '.npy')
+    if not os.path.isfile(cache_file):
+        data = resampleSeries(csv_path, **params)
+        os.makedirs(cache_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(glob.escape(cache_dir), glob.escape(stem) + '.*.npy')):
+            if os.path.abspath(stale) == os.path.abspath(cache_file):
+                continue  # just built by another worker, which may be loading it
+            try:
+                os.remove(stale)  # same params, older version of the source csv
+            except OSError:
+                pass  # still mapped by another process (Windows), left for a later miss
+        tmp_file = cache_file[:-4] + '.%d.tmp' % os.getpid()
+        with open(tmp_file, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_file, cache_file)  # atomic, safe with several workers building the same file
+    return np.load(cache_file, mmap_mode='r')
+
+
+def clearCache(cache_dir):
+    """remove all cached arrays from cache_dir"""
+    for cached in glob.glob(os.path.join(glob.escape(cache_dir), '*.npy')):
+        os.remove(cached)